@@ -1,7 +1,9 @@
 from fastapi import APIRouter
 
-from app.api.routes import note_router, ping_router
+from app.api.routes import metrics_router, note_router, ping_router, ready_router
 
 api_router = APIRouter()
 api_router.include_router(ping_router.router, prefix="/ping", tags=["ping"])
+api_router.include_router(ready_router.router, prefix="/ready", tags=["ready"])
+api_router.include_router(metrics_router.router, prefix="/metrics", tags=["metrics"])
 api_router.include_router(note_router.router, prefix="/v1/note", tags=["notes"])
@@ -0,0 +1,32 @@
+import logging
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.core.cache import note_cache
+from app.core.change_feed import change_feed
+from app.core.db import engine_pool_metrics
+from app.core.log import log_metrics
+from app.core.metrics import metrics, metrics_store, scrape
+from app.core.partitions import partition_runway
+from app.core.singleflight import note_flights, note_list_flights
+from app.service.note_service import note_create_queue
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+metrics.register(engine_pool_metrics)
+metrics.register(partition_runway.metrics)
+metrics.register(lambda: note_cache.metrics("note_cache"))
+metrics.register(log_metrics)
+metrics.register(change_feed.metrics)
+metrics.register(lambda: note_flights.metrics("note_flights"))
+metrics.register(lambda: note_list_flights.metrics("note_list_flights"))
+metrics.register(lambda: note_create_queue.metrics("note_write_behind"))
+
+
+@router.get(path="", response_class=PlainTextResponse, status_code=200)
+async def get_metrics() -> PlainTextResponse:
+    logger.debug("get_metrics")
+
+    return PlainTextResponse(scrape(metrics, metrics_store), media_type="text/plain; version=0.0.4")
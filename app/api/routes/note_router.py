@@ -1,63 +1,358 @@
+import asyncio
+import contextlib
+import json
 import logging
+import time
 import uuid
+from collections.abc import AsyncGenerator, AsyncIterator
+from datetime import datetime
+from typing import Literal
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Request, Response, WebSocket, status
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.db import get_db
-from app.schemas.note_schema import NoteCreateDTO, NoteDTO, NoteSummaryDTO, NoteUpdateDTO
-from app.service.note_service import NoteService
+from app.core.change_feed import ChangeEvent, SubscriptionClosedError
+from app.core.compression import negotiate
+from app.core.db import get_db, get_read_db, mark_write, read_coalescing
+from app.core.etag import NotModified, etag_matches
+from app.core.profiling import record_timing
+from app.core.settings import settings
+from app.schemas.note_schema import (
+    NoteAcceptedDTO,
+    NoteBulkResultDTO,
+    NoteBulkUpdateDTO,
+    NoteCreateDTO,
+    NoteDTO,
+    NotePageDTO,
+    NoteSearchPageDTO,
+    NoteUpdateDTO,
+    note_accepted_adapter,
+    note_adapter,
+    note_bulk_result_list_adapter,
+    note_list_adapter,
+    note_page_adapter,
+    note_search_page_adapter,
+)
+from app.service.note_service import ANY_VERSION, NoteService, if_match_version, page_etag
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 note_service = NoteService()
 
+SSE_HEARTBEAT = b": heartbeat\n\n"
 
-@router.get("", status_code=status.HTTP_200_OK, response_model=list[NoteSummaryDTO])
+
+def _expected_version(note_id: uuid.UUID, if_match: str | None) -> int | None:
+    if if_match is None:
+        return None
+    if if_match.strip() == "*":
+        return ANY_VERSION
+
+    version = if_match_version(if_match, note_id)
+    if version is None:
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Note version does not match")
+    return version
+
+
+def _respond[T](
+    response: Response,
+    value: T,
+    adapter: TypeAdapter[T],
+    status_code: int = status.HTTP_200_OK,
+) -> T | Response:
+    """
+    With fast_json_responses on, dump the already validated value straight to JSON bytes instead of
+    letting FastAPI validate and serialize it a second time through the route's response_model.
+    """
+    if not settings.fast_json_responses:
+        return value
+
+    start = time.perf_counter()
+    body = adapter.dump_json(value)
+    record_timing("serialize", time.perf_counter() - start)
+
+    raw = Response(body, status_code=status_code, media_type="application/json")
+    raw.headers.raw.extend(response.headers.raw)
+    return raw
+
+
+@router.get("", status_code=status.HTTP_200_OK, response_model=NotePageDTO)
 async def list_notes(
-    db: AsyncSession = Depends(get_db),
-) -> list[NoteSummaryDTO]:
+    response: Response,
+    limit: int = Query(settings.page_size_default, ge=1, le=settings.page_size_max),
+    cursor: str | None = Query(None),
+    if_none_match: str | None = Header(None),
+    db: AsyncSession = Depends(get_read_db),
+    coalesce: bool = Depends(read_coalescing),
+) -> NotePageDTO | Response:
     logger.debug("list_notes")
 
-    return await note_service.list_notes(db)
+    page = await note_service.list_notes(db, limit, cursor, coalesce)
+    etag = page_etag(page)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
+    return _respond(response, page, note_page_adapter)
+
+
+@router.get("/search", status_code=status.HTTP_200_OK, response_model=NoteSearchPageDTO)
+async def search_notes(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=256),
+    limit: int = Query(settings.page_size_default, ge=1, le=settings.page_size_max),
+    cursor: str | None = Query(None),
+    db: AsyncSession = Depends(get_read_db),
+) -> NoteSearchPageDTO | Response:
+    logger.debug("search_notes")
+
+    return _respond(response, await note_service.search_notes(db, q, limit, cursor), note_search_page_adapter)
+
+
+@router.get("/export", status_code=status.HTTP_200_OK, response_class=StreamingResponse)
+async def export_notes(
+    fmt: Literal["ndjson", "json"] = Query("ndjson", alias="format"),
+    full: bool = Query(False),
+    updated_since: datetime | None = Query(None),
+    updated_until: datetime | None = Query(None),
+    db: AsyncSession = Depends(get_read_db),
+) -> StreamingResponse:
+    logger.debug("export_notes")
+
+    return StreamingResponse(
+        note_service.export_notes(db, fmt, full, updated_since, updated_until),
+        media_type="application/x-ndjson" if fmt == "ndjson" else "application/json",
+    )
+
+
+def _resume_point(since: datetime | None, last_event_id: str | None) -> datetime | None:
+    # EventSource sends the id of the last event it saw when reconnecting, which is that change's time
+    if since is not None or last_event_id is None:
+        return since
+
+    try:
+        return datetime.fromisoformat(last_event_id)
+
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Last-Event-ID") from None
+
+
+async def _sse(changes: AsyncGenerator[ChangeEvent | None]) -> AsyncIterator[bytes]:
+    async with contextlib.aclosing(changes):
+        try:
+            async for event in changes:
+                yield SSE_HEARTBEAT if event is None else event.sse
+
+        except SubscriptionClosedError as exc:
+            # the client should reconnect with Last-Event-ID, or `since`, to resume
+            yield f"event: reset\ndata: {json.dumps({'reason': str(exc)})}\n\n".encode()
+
+
+async def _wait_disconnect(websocket: WebSocket) -> None:
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+@router.get("/changes", status_code=status.HTTP_200_OK, response_class=StreamingResponse)
+async def note_changes(
+    since: datetime | None = Query(None),
+    last_event_id: str | None = Header(None),
+    db: AsyncSession = Depends(get_read_db),
+) -> StreamingResponse:
+    logger.debug("note_changes")
+
+    changes = note_service.note_changes(db, _resume_point(since, last_event_id))
+    return StreamingResponse(
+        _sse(changes),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/changes/ws")
+async def note_changes_ws(
+    websocket: WebSocket,
+    since: datetime | None = Query(None),
+    db: AsyncSession = Depends(get_read_db),
+) -> None:
+    """
+    The change feed as one JSON text message per change. Refusals close the socket with 4000 plus the HTTP
+    status, e.g. 4410 when `since` is past retention; a feed reset closes it with 1013 (try again later).
+    """
+    logger.debug("note_changes_ws")
+
+    await websocket.accept()
+    try:
+        changes = note_service.note_changes(db, since)
+
+    except HTTPException as exc:
+        await websocket.close(code=4000 + exc.status_code, reason=str(exc.detail))
+        return
+
+    disconnected = asyncio.create_task(_wait_disconnect(websocket))
+    async with contextlib.aclosing(changes):
+        try:
+            async for event in changes:
+                # heartbeats send nothing, but bound how long a closed socket keeps its subscription
+                if disconnected.done():
+                    break
+                if event is not None:
+                    await websocket.send_text(event.data)
+
+        except SubscriptionClosedError as exc:
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason=str(exc))
+
+        finally:
+            disconnected.cancel()
+
+
+@router.post(
+    "/bulk", status_code=status.HTTP_201_CREATED, response_model=list[NoteDTO], dependencies=[Depends(mark_write)]
+)
+async def bulk_create_notes(
+    response: Response,
+    notes: list[NoteCreateDTO] = Body(..., min_length=1, max_length=settings.bulk_max_items),
+    db: AsyncSession = Depends(get_db),
+) -> list[NoteDTO] | Response:
+    logger.debug("bulk_create_notes")
+
+    created = await note_service.bulk_create_notes(db, notes)
+    return _respond(response, created, note_list_adapter, status.HTTP_201_CREATED)
+
+
+@router.patch(
+    "/bulk", status_code=status.HTTP_200_OK, response_model=list[NoteBulkResultDTO], dependencies=[Depends(mark_write)]
+)
+async def bulk_update_notes(
+    response: Response,
+    notes: list[NoteBulkUpdateDTO] = Body(..., min_length=1, max_length=settings.bulk_max_items),
+    db: AsyncSession = Depends(get_db),
+) -> list[NoteBulkResultDTO] | Response:
+    logger.debug("bulk_update_notes")
+
+    return _respond(response, await note_service.bulk_update_notes(db, notes), note_bulk_result_list_adapter)
+
+
+@router.delete(
+    "/bulk", status_code=status.HTTP_200_OK, response_model=list[NoteBulkResultDTO], dependencies=[Depends(mark_write)]
+)
+async def bulk_delete_notes(
+    response: Response,
+    note_ids: list[uuid.UUID] = Body(..., min_length=1, max_length=settings.bulk_max_items),
+    db: AsyncSession = Depends(get_db),
+) -> list[NoteBulkResultDTO] | Response:
+    logger.debug("bulk_delete_notes")
+
+    return _respond(response, await note_service.bulk_delete_notes(db, note_ids), note_bulk_result_list_adapter)
 
 
 @router.get("/{note_id}", status_code=status.HTTP_200_OK, response_model=NoteDTO)
 async def get_note_by_id(
     note_id: uuid.UUID,
-    db: AsyncSession = Depends(get_db),
-) -> NoteDTO:
+    if_none_match: str | None = Header(None),
+    accept_encoding: str | None = Header(None),
+    db: AsyncSession = Depends(get_read_db),
+    coalesce: bool = Depends(read_coalescing),
+) -> Response:
     logger.debug("get_note_by_id")
 
-    return await note_service.get_note_by_id(db, note_id)
+    encoding = negotiate(accept_encoding)
+    note = await note_service.get_note_by_id(db, note_id, if_none_match, encoding, coalesce)
+    if isinstance(note, NotModified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": note.etag})
+
+    if encoding is not None and encoding in note.encoded:
+        # precompressed, so CompressionMiddleware passes it through
+        headers = {"ETag": note.etag, "Content-Encoding": encoding, "Vary": "Accept-Encoding"}
+        return Response(note.encoded[encoding], media_type="application/json", headers=headers)
+
+    return Response(note.body, media_type="application/json", headers={"ETag": note.etag})
 
 
-@router.post("", status_code=status.HTTP_201_CREATED, response_model=NoteDTO)
+@router.get("/{note_id}/content", status_code=status.HTTP_200_OK, response_class=StreamingResponse)
+async def get_note_content(
+    note_id: uuid.UUID,
+    if_none_match: str | None = Header(None),
+    db: AsyncSession = Depends(get_read_db),
+) -> Response:
+    logger.debug("get_note_content")
+
+    content = await note_service.get_note_content(db, note_id, if_none_match)
+    if isinstance(content, NotModified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": content.etag})
+
+    etag, size, chunks = content
+    return StreamingResponse(
+        chunks,
+        media_type="text/plain; charset=utf-8",
+        headers={"ETag": etag, "Content-Length": str(size)},
+    )
+
+
+@router.post(
+    "",
+    status_code=status.HTTP_201_CREATED,
+    response_model=NoteDTO,
+    responses={status.HTTP_202_ACCEPTED: {"model": NoteAcceptedDTO}},
+    dependencies=[Depends(mark_write)],
+)
 async def create_note(
+    request: Request,
+    response: Response,
     note: NoteCreateDTO,
+    prefer: str | None = Header(None),
     db: AsyncSession = Depends(get_db),
-) -> NoteDTO:
+) -> NoteDTO | Response:
+    """
+    With write-behind enabled, the note is written in a batch with other creates and the response waits for the
+    batch's commit. With `write_behind_respond_async` also on, `Prefer: respond-async` returns 202 with the new id
+    as soon as it is queued. That 202 is not durable: the note is lost if its write still fails after retries or
+    the process dies first, and only the error log records its id.
+    """
     logger.debug("create_note")
 
-    return await note_service.create_note(db, note)
+    if not settings.write_behind_enabled:
+        return _respond(response, await note_service.create_note(db, note), note_adapter, status.HTTP_201_CREATED)
+
+    note_id, written = await note_service.enqueue_note(note)
+    if settings.write_behind_respond_async and prefer is not None and "respond-async" in prefer:
+        accepted = Response(
+            note_accepted_adapter.dump_json(NoteAcceptedDTO(id=note_id)),
+            status_code=status.HTTP_202_ACCEPTED,
+            media_type="application/json",
+            headers={"Location": f"{request.url.path}/{note_id}", "Preference-Applied": "respond-async"},
+        )
+        # keeps what dependencies set, such as mark_write's read-your-writes header and cookie
+        accepted.headers.raw.extend(response.headers.raw)
+        return accepted
+
+    return _respond(response, await written, note_adapter, status.HTTP_201_CREATED)
 
 
-@router.patch("/{note_id}", status_code=status.HTTP_200_OK, response_model=NoteDTO)
+@router.patch("/{note_id}", status_code=status.HTTP_200_OK, response_model=NoteDTO, dependencies=[Depends(mark_write)])
 async def update_note(
+    response: Response,
     note_id: uuid.UUID,
     note: NoteUpdateDTO,
+    if_match: str | None = Header(None),
     db: AsyncSession = Depends(get_db),
-) -> NoteDTO:
+) -> NoteDTO | Response:
     logger.debug("update_note")
 
-    return await note_service.update_note(db, note_id, note)
+    updated, etag = await note_service.update_note(db, note_id, note, _expected_version(note_id, if_match))
+    # lets the client chain its next If-Match without reading the note again
+    response.headers["ETag"] = etag
+    return _respond(response, updated, note_adapter)
 
 
-@router.delete("/{note_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete("/{note_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(mark_write)])
 async def delete_note(
     note_id: uuid.UUID,
+    if_match: str | None = Header(None),
     db: AsyncSession = Depends(get_db),
 ) -> None:
     logger.debug("delete_note")
 
-    return await note_service.delete_note(db, note_id)
+    return await note_service.delete_note(db, note_id, _expected_version(note_id, if_match))
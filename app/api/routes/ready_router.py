@@ -0,0 +1,47 @@
+import asyncio
+import logging
+from datetime import timedelta
+
+from fastapi import APIRouter, Depends, Response, status
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.db import get_db, pool_metrics
+from app.core.lifecycle import lifecycle
+from app.core.partitions import partition_runway
+from app.core.settings import settings
+from app.schemas.health_schema import ReadinessDTO
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+@router.get(path="", status_code=status.HTTP_200_OK, response_model=ReadinessDTO)
+async def ready(response: Response, db: AsyncSession = Depends(get_db)) -> ReadinessDTO:
+    logger.debug("ready")
+
+    database = "skipped"
+    runway = None
+    if lifecycle.started and not lifecycle.draining:
+        try:
+            async with asyncio.timeout(settings.readiness_timeout_seconds):
+                await db.execute(text("SELECT 1"))
+                # reported rather than failing readiness, which would take every instance out at once
+                runway = await partition_runway.refresh(await db.connection())
+            database = "ok"
+
+        except (TimeoutError, OSError, SQLAlchemyError) as exc:
+            database = f"error: {type(exc).__name__}"
+
+    is_ready = database == "ok"
+    if not is_ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+
+    return ReadinessDTO(
+        status="ready" if is_ready else "unavailable",
+        database=database,
+        draining=lifecycle.draining,
+        pool=pool_metrics(),
+        partition_runway_days=None if runway is None else runway / timedelta(days=1),
+    )
@@ -0,0 +1,160 @@
+import hashlib
+import importlib
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Protocol
+
+from app.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# token bucket kept in a Redis hash; TIME keeps every worker on the server's clock
+_REDIS_TOKEN_BUCKET = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = tonumber(state[1]) or burst
+local at = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - at) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class RateLimiter(Protocol):
+    async def acquire(self, key: str, rate: float, burst: float) -> float:
+        """
+        Take a token from `key`'s bucket, refilled at `rate` per second up to `burst`. Returns 0 when the
+        request may proceed, otherwise the seconds until a token is available.
+        """
+        ...
+
+    async def close(self) -> None: ...
+
+
+class InMemoryRateLimiter:
+    """
+    Token buckets in this process. Each worker enforces the full limit on its own, so a client whose requests
+    are spread over N workers can get up to N times the configured rate. The least recently used buckets are
+    dropped beyond `max_keys`, which only forgives their clients' past requests.
+    """
+
+    def __init__(self, max_keys: int) -> None:
+        self._max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def acquire(self, key: str, rate: float, burst: float) -> float:
+        return self.take(key, rate, burst, time.monotonic())
+
+    def take(self, key: str, rate: float, burst: float, now: float) -> float:
+        tokens, at = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + max(0.0, now - at) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self._max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+    async def close(self) -> None:
+        self._buckets.clear()
+
+
+class RedisRateLimiter:
+    """
+    Token buckets shared by every worker and instance through Redis. `client` is anything with the
+    `redis.asyncio` `eval` method, so tests and local setups can pass a stub. When Redis fails, requests are
+    limited by the in-process `fallback` until it recovers.
+    """
+
+    def __init__(self, client: Any, fallback: InMemoryRateLimiter, prefix: str = "rate_limit:") -> None:
+        self._client = client
+        self._fallback = fallback
+        self._prefix = prefix
+        self._failing = False
+
+    async def acquire(self, key: str, rate: float, burst: float) -> float:
+        try:
+            wait = await self._client.eval(_REDIS_TOKEN_BUCKET, 1, self._prefix + key, rate, burst)
+
+        except Exception as exc:  # OSError or redis.RedisError, without importing the optional package
+            if not self._failing:
+                self._failing = True
+                logger.warning("Shared rate limiter failed, limiting per worker: %s", exc)
+            return await self._fallback.acquire(key, rate, burst)
+
+        if self._failing:
+            self._failing = False
+            logger.info("Shared rate limiter recovered")
+        return float(wait)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+class ConcurrencyLimiter:
+    """
+    Counts requests in flight per key, refusing new ones once a key reaches its limit.
+    """
+
+    def __init__(self) -> None:
+        self._in_flight: dict[str, int] = {}
+
+    def try_acquire(self, key: str, limit: int) -> bool:
+        count = self._in_flight.get(key, 0)
+        if count >= limit:
+            return False
+        self._in_flight[key] = count + 1
+        return True
+
+    def release(self, key: str) -> None:
+        count = self._in_flight[key] - 1
+        if count:
+            self._in_flight[key] = count
+        else:
+            del self._in_flight[key]
+
+
+def client_key(api_key: str | None, client_host: str | None) -> str:
+    """
+    Bucket key for a client: its API key when it sent one, hashed so keys are not kept in memory or Redis,
+    otherwise its address.
+    """
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:32]
+    return f"ip:{client_host or 'unknown'}"
+
+
+def retry_after(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+
+def create_rate_limiter() -> RateLimiter:
+    fallback = InMemoryRateLimiter(settings.rate_limit_max_keys)
+    if settings.rate_limit_backend == "memory":
+        return fallback
+
+    if settings.rate_limit_redis_url is None:
+        raise ValueError("RATE_LIMIT_REDIS_URL is required for the redis rate limit backend")
+
+    # the redis package is optional; only deployments sharing limits across instances need it
+    redis = importlib.import_module("redis.asyncio")
+    return RedisRateLimiter(redis.from_url(settings.rate_limit_redis_url), fallback)
+
+
+rate_limiter = create_rate_limiter()
+concurrency_limiter = ConcurrencyLimiter()
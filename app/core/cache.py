@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterable, Mapping
+from dataclasses import dataclass, field
+
+from app.core.notify import notify_listener
+from app.core.settings import settings
+from app.core.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class CachedResponse:
+    etag: str
+    body: bytes
+    # compressed copies of `body` by Content-Encoding, added as clients ask for them
+    encoded: Mapping[str, bytes] = field(default_factory=dict)
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(body) for body in self.encoded.values())
+
+
+class LRUCache[V]:
+    """
+    Bounded LRU cache of serialized values with a per-entry TTL.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        ttl_seconds: float,
+        sizeof: Callable[[V], int],
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._sizeof = sizeof
+        self._entries: OrderedDict[Hashable, tuple[float, V]] = OrderedDict()
+        self._bytes = 0
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def generation(self) -> int:
+        """
+        Bumped on every invalidation; pass it back to `set` to drop fills that raced a write.
+        """
+        return self._generation
+
+    def get(self, key: Hashable) -> V | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: V, generation: int | None = None) -> None:
+        if generation is not None and generation != self._generation:
+            return
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= self._sizeof(evicted)
+            self.evictions += 1
+
+    def invalidate(self, keys: Iterable[Hashable]) -> None:
+        self._generation += 1
+        for key in keys:
+            self._remove(key)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+        self._bytes = 0
+
+    def metrics(self, prefix: str) -> dict[str, float]:
+        return {
+            f"{prefix}_entries": len(self._entries),
+            f"{prefix}_bytes": self._bytes,
+            f"{prefix}_hits_total": self.hits,
+            f"{prefix}_misses_total": self.misses,
+            f"{prefix}_evictions_total": self.evictions,
+        }
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= self._sizeof(entry[1])
+
+
+class CacheInvalidationListener:
+    """
+    Applies note ids published on a Postgres NOTIFY channel to the local cache, so that writes
+    handled by other workers or replicas evict entries here too.
+
+    Notifications missed while the shared LISTEN connection is down cannot be replayed, so the cache and the
+    in-flight reads of `flights` are dropped when it is lost and again once it is back.
+    """
+
+    def __init__(self, cache: LRUCache[CachedResponse], channel: str, flights: Iterable[SingleFlight] = ()) -> None:
+        self._cache = cache
+        self._channel = channel
+        self._flights = list(flights)
+
+    async def start(self) -> None:
+        await notify_listener.listen(self._channel, self._on_notify, self._reset, self._reset)
+
+    async def stop(self) -> None:
+        await notify_listener.unlisten(self._channel)
+
+    def _reset(self) -> None:
+        self._cache.clear()
+        for flights in self._flights:
+            flights.forget_all()
+
+    def _on_notify(self, payload: str) -> None:
+        try:
+            self._cache.invalidate(uuid.UUID(key) for key in payload.split(","))
+
+        except ValueError:
+            logger.warning("Ignoring malformed cache invalidation payload: %s", payload)
+
+
+note_cache: LRUCache[CachedResponse] = LRUCache(
+    max_entries=settings.note_cache_max_entries,
+    max_bytes=settings.note_cache_max_bytes,
+    ttl_seconds=settings.note_cache_ttl_seconds,
+    sizeof=lambda entry: entry.size,
+)
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+
+from app.core.lifecycle import lifecycle
+from app.core.notify import notify_listener
+from app.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# published by the notes_change_feed trigger, see the notes change feed migration
+CHANGE_FEED_CHANNEL = "note_changes"
+
+PRUNE_INTERVAL_SECONDS = 3600.0
+
+
+@dataclass(frozen=True, slots=True)
+class ChangeEvent:
+    # JSON object as sent to WebSocket clients
+    data: str
+    # the same event framed for Server-Sent Events, with its change time as the event id
+    sse: bytes
+
+    @classmethod
+    def build(cls, data: str, op: str, updated_at: str) -> ChangeEvent:
+        return cls(data, f"id: {updated_at}\nevent: {op}\ndata: {data}\n\n".encode())
+
+    @classmethod
+    def from_json(cls, data: str) -> ChangeEvent:
+        fields = json.loads(data)
+        return cls.build(data, fields["op"], fields["updatedAt"])
+
+
+class SubscriptionClosedError(Exception):
+    """
+    The feed cut this subscriber off; it should reconnect and resume from the last change it saw.
+    """
+
+
+class Subscription:
+    def __init__(self, max_size: int) -> None:
+        self.reason: str | None = None
+        self._queue: asyncio.Queue[ChangeEvent | None] = asyncio.Queue(max_size)
+
+    def put(self, event: ChangeEvent) -> bool:
+        try:
+            self._queue.put_nowait(event)
+
+        except asyncio.QueueFull:
+            return False
+
+        return True
+
+    def close(self, reason: str) -> None:
+        # undelivered events are dropped; the client resumes from the last one it did receive
+        self.reason = reason
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    async def get(self, timeout: float) -> ChangeEvent | None:
+        """
+        Next event, or None when nothing arrived within `timeout` seconds.
+        """
+        try:
+            event = await asyncio.wait_for(self._queue.get(), timeout)
+
+        except TimeoutError:
+            return None
+
+        if event is None:
+            raise SubscriptionClosedError(self.reason)
+        return event
+
+
+class ChangeFeed:
+    """
+    Fans note changes out from the worker's shared LISTEN connection to any number of subscribers.
+
+    Each subscriber has a bounded queue. One that falls behind is closed rather than allowed to buffer without
+    limit, and so is every subscriber when the connection drops, since events may have been missed.
+    """
+
+    def __init__(self, channel: str, queue_size: int) -> None:
+        self.events = 0
+        self.overflows = 0
+        self._channel = channel
+        self._queue_size = queue_size
+        self._subscribers: set[Subscription] = set()
+        self._maintenance: asyncio.Task[None] | None = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return notify_listener.listening(self._channel) and not self._stopping
+
+    async def start(self) -> None:
+        self._stopping = False
+        await notify_listener.listen(self._channel, self._on_notify, self._on_lost)
+        if self._close_subscribers not in lifecycle.drain_callbacks:
+            lifecycle.drain_callbacks.append(self._close_subscribers)
+        self._maintenance = asyncio.create_task(self._maintain())
+
+    async def stop(self) -> None:
+        self._stopping = True
+        self._close_subscribers("shutdown")
+        if self._maintenance is not None:
+            self._maintenance.cancel()
+            await asyncio.gather(self._maintenance, return_exceptions=True)
+            self._maintenance = None
+        await notify_listener.unlisten(self._channel)
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self._queue_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+
+    def publish(self, event: ChangeEvent) -> None:
+        self.events += 1
+        for subscription in list(self._subscribers):
+            if not subscription.put(event):
+                self.overflows += 1
+                self._subscribers.discard(subscription)
+                subscription.close("overflow")
+
+    def metrics(self) -> dict[str, float]:
+        return {
+            "change_feed_subscribers": len(self._subscribers),
+            "change_feed_events_total": self.events,
+            "change_feed_overflows_total": self.overflows,
+        }
+
+    def _close_subscribers(self, reason: str = "shutdown") -> None:
+        # ends every open stream, so clients reconnect, to another worker when this one is draining
+        for subscription in self._subscribers:
+            subscription.close(reason)
+        self._subscribers.clear()
+
+    def _on_notify(self, payload: str) -> None:
+        try:
+            self.publish(ChangeEvent.from_json(payload))
+
+        except (ValueError, KeyError):
+            logger.warning("Ignoring malformed change payload: %s", payload)
+
+    def _on_lost(self) -> None:
+        if not self._stopping:
+            self._close_subscribers("reconnect")
+
+    async def _maintain(self) -> None:
+        while True:
+            try:
+                await self._prune()
+
+            except Exception as exc:  # asyncpg errors share no narrower base with OSError
+                logger.warning("Change feed maintenance failed: %s", exc)
+
+            await asyncio.sleep(PRUNE_INTERVAL_SECONDS)
+
+    async def _prune(self) -> None:
+        # tombstones only serve resumes, which are refused once older than the retention window
+        await notify_listener.execute(
+            "DELETE FROM note_tombstones WHERE deleted_at < now() - make_interval(secs => $1)",
+            settings.change_feed_retention_seconds,
+        )
+
+
+change_feed = ChangeFeed(CHANGE_FEED_CHANNEL, settings.change_feed_queue_size)
@@ -0,0 +1,151 @@
+import asyncio
+import importlib
+import zlib
+from collections.abc import Callable
+from types import ModuleType
+from typing import Protocol
+
+from app.core.settings import settings
+
+
+def _optional(name: str) -> ModuleType | None:
+    try:
+        return importlib.import_module(name)
+
+    except ImportError:
+        return None
+
+
+# zstd ships with the standard library from Python 3.14, brotli only with the third-party package
+_zstd = _optional("compression.zstd")
+_brotli = _optional("brotli")
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+# streamed event by event; buffering inside a compressor would hold events back
+UNCOMPRESSIBLE_TYPES = ("text/event-stream",)
+
+
+class StreamCompressor(Protocol):
+    def compress(self, data: bytes) -> bytes: ...
+
+    def flush(self) -> bytes: ...
+
+
+class _FlushingCompressor:
+    """
+    Emits everything compressed so far on each chunk, so streamed responses keep flowing.
+    """
+
+    def __init__(self, compress: Callable[[bytes], bytes], sync: Callable[[], bytes], finish: Callable[[], bytes]):
+        self._compress = compress
+        self._sync = sync
+        self._finish = finish
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compress(data) + self._sync()
+
+    def flush(self) -> bytes:
+        return self._finish()
+
+
+def _gzip_stream() -> StreamCompressor:
+    compressor = zlib.compressobj(settings.compression_gzip_level, zlib.DEFLATED, 31)
+    return _FlushingCompressor(
+        compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), lambda: compressor.flush(zlib.Z_FINISH)
+    )
+
+
+def _zstd_stream() -> StreamCompressor:
+    assert _zstd is not None
+    compressor = _zstd.ZstdCompressor(settings.compression_zstd_level)
+    return _FlushingCompressor(
+        compressor.compress,
+        lambda: compressor.flush(compressor.FLUSH_BLOCK),
+        lambda: compressor.flush(compressor.FLUSH_FRAME),
+    )
+
+
+def _brotli_stream() -> StreamCompressor:
+    assert _brotli is not None
+    compressor = _brotli.Compressor(quality=settings.compression_brotli_quality)
+    return _FlushingCompressor(compressor.process, compressor.flush, compressor.finish)
+
+
+def _gzip(data: bytes) -> bytes:
+    compressor = zlib.compressobj(settings.compression_gzip_level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _zstd_compress(data: bytes) -> bytes:
+    assert _zstd is not None
+    return bytes(_zstd.compress(data, settings.compression_zstd_level))
+
+
+def _brotli_compress(data: bytes) -> bytes:
+    assert _brotli is not None
+    return bytes(_brotli.compress(data, quality=settings.compression_brotli_quality))
+
+
+_CODECS: dict[str, tuple[Callable[[bytes], bytes], Callable[[], StreamCompressor]]] = {"gzip": (_gzip, _gzip_stream)}
+if _zstd is not None:
+    _CODECS["zstd"] = (_zstd_compress, _zstd_stream)
+if _brotli is not None:
+    _CODECS["br"] = (_brotli_compress, _brotli_stream)
+
+# server preference order, restricted to the codecs importable here
+available_encodings = [name for name in settings.compression_encodings if name in _CODECS]
+
+
+def negotiate(accept_encoding: str | None) -> str | None:
+    """
+    The preferred available encoding that `accept_encoding` allows, or None to send the body as is.
+    Ties between the client's q-values are broken by the server's preference order.
+    """
+    if not accept_encoding or not settings.compression_enabled:
+        return None
+
+    accepted: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        quality = 1.0
+        key, _, value = params.strip().partition("=")
+        if key.strip() == "q":
+            try:
+                quality = float(value)
+
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    wildcard = accepted.get("*", 0.0)
+    best: str | None = None
+    best_quality = 0.0
+    for name in available_encodings:
+        quality = accepted.get(name, wildcard)
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def compressible(content_type: str | None) -> bool:
+    if not content_type:
+        return False
+    return content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith(UNCOMPRESSIBLE_TYPES)
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    return _CODECS[encoding][0](data)
+
+
+async def compress_async(data: bytes, encoding: str) -> bytes:
+    """
+    Compress `data`, in a worker thread when it is large enough to hold up the event loop; zlib, zstd and
+    brotli all release the GIL while compressing.
+    """
+    if len(data) < settings.compression_thread_min_bytes:
+        return compress(data, encoding)
+    return await asyncio.to_thread(compress, data, encoding)
+
+
+def stream_compressor(encoding: str) -> StreamCompressor:
+    return _CODECS[encoding][1]()
@@ -1,29 +1,409 @@
 from __future__ import annotations
 
-from collections.abc import AsyncGenerator
+import asyncio
+import itertools
+import math
+import time
+import uuid
+from collections.abc import AsyncGenerator, AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import partial
+from typing import Any
 
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-from sqlalchemy.orm import declarative_base
+from fastapi import Response
+from fastapi.requests import HTTPConnection
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection, ExceptionContext, ExecutionContext
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, SessionTransaction, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry, PoolProxiedConnection
 
+from app.core.metrics import metrics
+from app.core.profiling import record_timing
 from app.core.settings import settings
 
-engine = create_async_engine(
-    settings.database_url,
-    pool_pre_ping=settings.database_pool_pre_ping,
-    future=True,
-    echo=settings.database_echo,
-)
+LAST_WRITE_COOKIE = "last_write"
+LAST_WRITE_HEADER = "X-Last-Write"
 
-async_session_factory = async_sessionmaker(
-    bind=engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
-)
+# recent checkout waits decay with this time constant, so shedding stops soon after the pool recovers
+RECENT_WAIT_DECAY_SECONDS = 1.0
+RECENT_WAIT_WEIGHT = 0.2
+
+_STATEMENT_OPERATIONS = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "BEGIN", "COMMIT", "ROLLBACK"})
+
+# Postgres errors raised when statement_timeout or lock_timeout fires
+DEADLINE_SQLSTATES = frozenset({"57014", "55P03"})
+
+# route template of the request whose session checks out a connection, labelling how long it holds it
+_checkout_route: ContextVar[str] = ContextVar("checkout_route", default="<none>")
+
+
+@dataclass
+class PoolStats:
+    checkouts: int = 0
+    checkout_timeouts: int = 0
+    checkout_wait_seconds: float = 0.0
+    checkout_wait_seconds_max: float = 0.0
+    _recent_wait: float = 0.0
+    _recent_wait_at: float = 0.0
+
+    def observe_wait(self, wait: float, now: float) -> None:
+        self._recent_wait = self.recent_wait(now) * (1 - RECENT_WAIT_WEIGHT) + wait * RECENT_WAIT_WEIGHT
+        self._recent_wait_at = now
+
+    def recent_wait(self, now: float) -> float:
+        """
+        Moving average of checkout waits, decayed by the time since the last checkout.
+        """
+        return self._recent_wait * math.exp(-(now - self._recent_wait_at) / RECENT_WAIT_DECAY_SECONDS)
+
+
+# the primary pool's; each replica pool keeps its own
+pool_stats = PoolStats()
+
+
+class MeasuredQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that records how long each checkout waits for a connection in its `stats`.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def recreate(self) -> MeasuredQueuePool:
+        pool = super().recreate()
+        assert isinstance(pool, MeasuredQueuePool)
+        pool.stats = self.stats
+        return pool
+
+    def connect(self) -> PoolProxiedConnection:
+        stats = self.stats
+        start = time.perf_counter()
+        try:
+            return super().connect()
+
+        except PoolTimeoutError:
+            stats.checkout_timeouts += 1
+            raise
+
+        finally:
+            wait = time.perf_counter() - start
+            stats.checkouts += 1
+            stats.checkout_wait_seconds += wait
+            stats.checkout_wait_seconds_max = max(stats.checkout_wait_seconds_max, wait)
+            stats.observe_wait(wait, time.monotonic())
+            record_timing("db-checkout", wait)
+            if settings.metrics_enabled:
+                metrics.observe("db_pool_checkout_wait_seconds", wait)
+
+
+def _connect_args() -> dict[str, Any]:
+    server_settings = {"application_name": settings.database_application_name}
+    if settings.database_statement_timeout_ms is not None:
+        server_settings["statement_timeout"] = str(settings.database_statement_timeout_ms)
+    if settings.database_lock_timeout_ms is not None:
+        server_settings["lock_timeout"] = str(settings.database_lock_timeout_ms)
+
+    if settings.database_pgbouncer:
+        # transaction pooling cannot keep named prepared statements across checkouts
+        return {
+            "server_settings": server_settings,
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+
+    return {
+        "server_settings": server_settings,
+        "statement_cache_size": settings.database_statement_cache_size,
+        "prepared_statement_cache_size": settings.database_statement_cache_size,
+    }
+
+
+def _before_cursor_execute(
+    conn: Connection,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: ExecutionContext | None,
+    executemany: bool,
+) -> None:
+    conn.info.setdefault("statement_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(
+    conn: Connection,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: ExecutionContext | None,
+    executemany: bool,
+) -> None:
+    elapsed = time.perf_counter() - conn.info["statement_start"].pop()
+    words = statement.lstrip()[:10].split(None, 1)
+    operation = words[0].upper() if words else ""
+    if operation not in _STATEMENT_OPERATIONS:
+        operation = "OTHER"
+    metrics.observe("db_statement_duration_seconds", elapsed, operation=operation)
+    record_timing("db", elapsed)
+
+
+def _handle_error(context: ExceptionContext) -> None:
+    # a failed statement never reaches after_cursor_execute, so drop its start time here
+    starts = context.connection.info.get("statement_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+def _checkout(dbapi_connection: Any, record: ConnectionPoolEntry, proxy: PoolProxiedConnection) -> None:
+    record.info["checked_out"] = (time.perf_counter(), _checkout_route.get())
+
+
+def _checkin(dbapi_connection: Any, record: ConnectionPoolEntry) -> None:
+    checked_out = record.info.pop("checked_out", None)
+    if checked_out is not None:
+        start, route = checked_out
+        metrics.observe("db_connection_held_seconds", time.perf_counter() - start, route=route)
+
+
+def instrument_engine(async_engine: AsyncEngine) -> None:
+    """
+    Time every statement run on `async_engine` into the db_statement_duration_seconds histogram and the
+    profiled request's "db" phase, and every pooled connection from checkout to checkin into
+    db_connection_held_seconds.
+    """
+    event.listen(async_engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(async_engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(async_engine.sync_engine, "handle_error", _handle_error)
+    event.listen(async_engine.sync_engine, "checkout", _checkout)
+    event.listen(async_engine.sync_engine, "checkin", _checkin)
+
+
+def _create_engine(url: str, stats: PoolStats | None = None) -> AsyncEngine:
+    async_engine = create_async_engine(
+        url,
+        poolclass=MeasuredQueuePool,
+        pool_size=settings.database_pool_size,
+        max_overflow=settings.database_pool_max_overflow,
+        pool_timeout=settings.database_pool_timeout,
+        pool_recycle=settings.database_pool_recycle,
+        pool_pre_ping=settings.database_pool_pre_ping,
+        connect_args=_connect_args(),
+        future=True,
+        echo=settings.database_echo,
+    )
+    if stats is not None:
+        assert isinstance(async_engine.pool, MeasuredQueuePool)
+        async_engine.pool.stats = stats
+
+    if settings.metrics_enabled or settings.profiling_enabled:
+        instrument_engine(async_engine)
+
+    return async_engine
+
+
+def _create_session_factory(bind: AsyncEngine | None = None) -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(
+        bind=bind,
+        class_=AsyncSession,
+        expire_on_commit=False,
+    )
+
+
+# bound by get_engine(), so importing this module does not load the driver or build pools
+async_session_factory = _create_session_factory()
+replica_engines: list[AsyncEngine] = []
+replica_session_factories: list[async_sessionmaker[AsyncSession]] = []
+_engine: AsyncEngine | None = None
+_replica_counter = itertools.count()
+
+
+def get_engine() -> AsyncEngine:
+    """
+    Primary engine, created together with the replica engines on first use. The lifespan calls this at
+    startup, which under the pre-fork server runs in each worker rather than in the parent.
+    """
+    global _engine
+
+    if _engine is None:
+        _engine = _create_engine(settings.database_url, pool_stats)
+        async_session_factory.configure(bind=_engine)
+        replica_engines.extend(_create_engine(url) for url in settings.database_replica_urls)
+        replica_session_factories.extend(_create_session_factory(e) for e in replica_engines)
+    return _engine
 
 
 Base = declarative_base()
 
 
-async def get_db() -> AsyncGenerator[AsyncSession]:
-    async with async_session_factory() as db_session:
+def pool_metrics(bind: AsyncEngine | None = None) -> dict[str, float]:
+    """
+    Gauges and checkout stats of the pool of `bind`, the primary engine by default.
+    """
+    pool = (bind or get_engine()).pool
+    assert isinstance(pool, MeasuredQueuePool)
+
+    return {
+        "db_pool_size": pool.size(),
+        "db_pool_in_use": pool.checkedout(),
+        "db_pool_idle": pool.checkedin(),
+        "db_pool_overflow": pool.overflow(),
+        "db_pool_checkouts_total": pool.stats.checkouts,
+        "db_pool_checkout_timeouts_total": pool.stats.checkout_timeouts,
+        "db_pool_checkout_wait_seconds_total": pool.stats.checkout_wait_seconds,
+        "db_pool_checkout_wait_seconds_max": pool.stats.checkout_wait_seconds_max,
+    }
+
+
+def engine_pool_metrics() -> dict[str, float]:
+    """
+    `pool_metrics` of the primary and of every replica, labelled by engine.
+    """
+    engines = {"primary": get_engine(), **{f"replica{i}": bind for i, bind in enumerate(replica_engines)}}
+    return {
+        f'{name}{{engine="{label}"}}': value
+        for label, bind in engines.items()
+        for name, value in pool_metrics(bind).items()
+    }
+
+
+def _checked_out(bind: AsyncEngine) -> int:
+    pool = bind.pool
+    return pool.checkedout() if isinstance(pool, MeasuredQueuePool) else 0
+
+
+def _pick_replica() -> async_sessionmaker[AsyncSession]:
+    if settings.database_replica_strategy == "least_connections":
+        index = min(range(len(replica_engines)), key=lambda i: _checked_out(replica_engines[i]))
+    else:
+        index = next(_replica_counter) % len(replica_engines)
+    return replica_session_factories[index]
+
+
+def _wrote_recently(request: HTTPConnection) -> bool:
+    marker = request.headers.get(LAST_WRITE_HEADER) or request.cookies.get(LAST_WRITE_COOKIE)
+    if not marker:
+        return False
+
+    try:
+        return time.time() - float(marker) < settings.database_read_your_writes_seconds
+
+    except ValueError:
+        return False
+
+
+def read_coalescing(request: HTTPConnection) -> bool:
+    """
+    Whether a read may share another request's in-flight query: not when the client wrote recently and needs
+    read-your-writes, nor when it asks to bypass caches.
+    """
+    return "no-cache" not in request.headers.get("Cache-Control", "") and not _wrote_recently(request)
+
+
+def _set_deadline(
+    deadline: float,
+    session: Session,
+    transaction: SessionTransaction,
+    connection: Connection,
+) -> None:
+    remaining_ms = max(1, int((deadline - time.monotonic()) * 1000))
+    statement_ms = min(remaining_ms, settings.database_statement_timeout_ms or remaining_ms)
+    lock_ms = min(remaining_ms, settings.database_lock_timeout_ms or remaining_ms)
+    # transaction-local, so the pooled connection is back to its defaults afterwards, with PgBouncer too
+    connection.execute(
+        text("SELECT set_config('statement_timeout', :statement, true), set_config('lock_timeout', :lock, true)"),
+        {"statement": str(statement_ms), "lock": str(lock_ms)},
+    )
+
+
+def apply_deadline(db_session: AsyncSession, deadline: float) -> None:
+    """
+    Bound every transaction of `db_session` by the time left until `deadline`, a `time.monotonic()` value, as
+    its statement_timeout and lock_timeout. Postgres then cancels queries that would outlive the request.
+    """
+    event.listen(db_session.sync_session, "after_begin", partial(_set_deadline, deadline))
+
+
+@asynccontextmanager
+async def _request_session(
+    factory: async_sessionmaker[AsyncSession], request: HTTPConnection
+) -> AsyncIterator[AsyncSession]:
+    deadline = getattr(request.state, "deadline", None)
+    token = _checkout_route.set(getattr(request.scope.get("route"), "path", "<unmatched>"))
+    try:
+        async with factory() as db_session:
+            if deadline is not None:
+                apply_deadline(db_session, deadline)
+            yield db_session
+
+    finally:
+        _checkout_route.reset(token)
+
+
+async def get_db(request: HTTPConnection) -> AsyncGenerator[AsyncSession]:
+    get_engine()
+    async with _request_session(async_session_factory, request) as db_session:
         yield db_session
+
+
+async def get_read_db(request: HTTPConnection) -> AsyncGenerator[AsyncSession]:
+    """
+    Session for read-only routes, served by a replica unless the client wrote recently.
+    """
+    get_engine()
+    factory = async_session_factory
+    if replica_session_factories and not _wrote_recently(request):
+        factory = _pick_replica()
+
+    async with _request_session(factory, request) as db_session:
+        yield db_session
+
+
+async def warm_up_pool(connections: int, prepare: Callable[[AsyncSession], Awaitable[None]]) -> None:
+    """
+    Open up to `connections` pooled connections per engine before traffic arrives, running `prepare` on each so
+    connection setup, type introspection and statement preparation are not paid by the first requests.
+    """
+    get_engine()
+    count = min(connections, settings.database_pool_size)
+    for factory in (async_session_factory, *replica_session_factories):
+        # every session holds its own connection until closed, so the pool ends up with `count` idle ones
+        sessions = [factory() for _ in range(count)]
+        try:
+            await asyncio.gather(*(prepare(session) for session in sessions))
+
+        finally:
+            await asyncio.gather(*(session.close() for session in sessions))
+
+
+async def dispose_engines() -> None:
+    global _engine
+
+    if _engine is None:
+        return
+
+    await asyncio.gather(_engine.dispose(), *(e.dispose() for e in replica_engines))
+    _engine = None
+    replica_engines.clear()
+    replica_session_factories.clear()
+
+
+def mark_write(response: Response) -> None:
+    """
+    Stamp write responses so follow-up reads stick to the primary while replicas catch up.
+    """
+    if not settings.database_replica_urls:
+        return
+
+    now = f"{time.time():.6f}"
+    response.headers[LAST_WRITE_HEADER] = now
+    response.set_cookie(
+        LAST_WRITE_COOKIE,
+        now,
+        max_age=max(1, round(settings.database_read_your_writes_seconds)),
+        httponly=True,
+    )
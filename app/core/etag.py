@@ -0,0 +1,55 @@
+from dataclasses import dataclass
+
+# content-codings that may suffix a strong ETag, as in "<tag>-gzip"
+CONTENT_CODINGS = frozenset({"gzip", "br", "zstd", "deflate"})
+
+
+@dataclass(frozen=True, slots=True)
+class NotModified:
+    """
+    Outcome of a conditional read whose If-None-Match names the current version, carrying that version's ETag.
+    """
+
+    etag: str
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """
+    ETag of the `encoding` content-coding of the representation tagged `etag`, which must differ from the
+    identity one when strong.
+    """
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def _without_coding(tag: str) -> str:
+    base, separator, coding = tag.rpartition("-")
+    return base if separator and coding in CONTENT_CODINGS else tag
+
+
+def parse_etags(header: str | None) -> list[tuple[bool, str]]:
+    """
+    Split an If-Match / If-None-Match header into (weak, opaque-tag) pairs. Content-coding suffixes are
+    dropped, so a tag received with a compressed response still names the version it was served from.
+    """
+    if not header:
+        return []
+
+    tags = []
+    for raw in header.split(","):
+        tag = raw.strip()
+        weak = tag.startswith("W/")
+        if weak:
+            tag = tag[2:]
+        tags.append((weak, _without_coding(tag.strip('"'))))
+    return tags
+
+
+def etag_matches(header: str | None, etag: str) -> bool:
+    """
+    Weak comparison, as used for If-None-Match.
+    """
+    if header and header.strip() == "*":
+        return True
+
+    opaque = etag.removeprefix("W/").strip('"')
+    return any(tag == opaque for _, tag in parse_etags(header))
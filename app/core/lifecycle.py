@@ -0,0 +1,25 @@
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+
+@dataclass
+class Lifecycle:
+    """
+    Process state reported by the readiness probe: not ready until the lifespan has warmed up, and not ready
+    again once shutdown has begun.
+    """
+
+    started: bool = False
+    draining: bool = False
+    # run once when draining begins, e.g. to end long-lived streams that would otherwise hold up shutdown
+    drain_callbacks: list[Callable[[], None]] = field(default_factory=list)
+
+    def start_draining(self) -> None:
+        if self.draining:
+            return
+        self.draining = True
+        for callback in self.drain_callbacks:
+            callback()
+
+
+lifecycle = Lifecycle()
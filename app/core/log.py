@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import copy
+import json
+import logging
+import os
+import queue
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Literal
+
+request_id_var: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+_exception_formatter = logging.Formatter()
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Stamps every record with the id of the request being served, so it survives the hop to the listener thread.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get() or "-"
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc_info"] = record.exc_text
+        return json.dumps(payload, default=str)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Hands records to a QueueListener thread, leaving the formatters and file I/O off the event loop.
+
+    When the queue is full, the "drop" policy discards the record and counts it, while "block" waits for room.
+    """
+
+    def __init__(self, log_queue: queue.Queue[logging.LogRecord], policy: Literal["drop", "block"]) -> None:
+        super().__init__(log_queue)
+        self.log_queue = log_queue
+        self.policy = policy
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Merge the message with its args and render the traceback now, as the stdlib handler does: by the time
+        the listener thread gets to the record, mutable args may have changed and the frames may be gone. The
+        listener's formatters still lay out the result.
+        """
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.policy == "block":
+            self.log_queue.put(record)
+            return
+
+        try:
+            self.log_queue.put_nowait(record)
+
+        except queue.Full:
+            self.dropped += 1
+
+
+queue_handler: BoundedQueueHandler | None = None
+queue_listener: QueueListener | None = None
+
+
+def start_queue_logging(
+    handlers: list[logging.Handler],
+    max_size: int,
+    policy: Literal["drop", "block"],
+) -> BoundedQueueHandler:
+    global queue_handler, queue_listener
+
+    log_queue: queue.Queue[logging.LogRecord] = queue.Queue(maxsize=max_size)
+    queue_handler = BoundedQueueHandler(log_queue, policy)
+    queue_handler.addFilter(RequestIdFilter())
+    queue_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    queue_listener.start()
+    return queue_handler
+
+
+def stop_queue_logging() -> None:
+    """
+    Flushes queued records and stops the listener thread.
+    """
+    global queue_listener
+
+    if queue_listener is not None:
+        queue_listener.stop()
+        queue_listener = None
+
+
+def _restart_after_fork() -> None:
+    """
+    The listener thread does not survive fork, so each pre-forked worker gets its own queue and listener.
+    """
+    global queue_listener
+
+    if queue_handler is None or queue_listener is None:
+        return
+
+    log_queue: queue.Queue[logging.LogRecord] = queue.Queue(maxsize=queue_handler.log_queue.maxsize)
+    queue_handler.queue = queue_handler.log_queue = log_queue
+    queue_listener = QueueListener(log_queue, *queue_listener.handlers, respect_handler_level=True)
+    queue_listener.start()
+
+
+os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def log_metrics() -> dict[str, float]:
+    return {
+        "log_records_dropped_total": queue_handler.dropped if queue_handler else 0,
+        "log_queue_size": queue_handler.log_queue.qsize() if queue_handler else 0,
+    }
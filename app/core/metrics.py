@@ -0,0 +1,291 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import fcntl
+import json
+import logging
+import math
+import os
+from bisect import bisect_left
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from typing import Any
+
+from app.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152, 8388608)
+
+type Collector = Callable[[], dict[str, float]]
+
+
+def _labels(**labels: str) -> str:
+    return ",".join(f'{key}="{value}"' for key, value in labels.items())
+
+
+def _sample(name: str, *labels: str) -> str:
+    joined = ",".join(label for label in labels if label)
+    return f"{name}{{{joined}}}" if joined else name
+
+
+class MetricsRegistry:
+    """
+    Per-process counters, gauges and histograms.
+
+    Updates are plain dict and list operations from the event loop thread, so nothing takes a lock on the request
+    path. With a multiprocess directory, each worker writes its own snapshot there and a scrape sums them all.
+    """
+
+    def __init__(self) -> None:
+        self.counters: dict[str, dict[str, float]] = {}
+        self.gauges: dict[str, dict[str, float]] = {}
+        self.histograms: dict[str, tuple[tuple[float, ...], dict[str, list[float]]]] = {}
+        self.collectors: list[Collector] = []
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        series = self.counters.setdefault(name, {})
+        key = _labels(**labels)
+        series[key] = series.get(key, 0.0) + value
+
+    def add(self, name: str, value: float, **labels: str) -> None:
+        series = self.gauges.setdefault(name, {})
+        key = _labels(**labels)
+        series[key] = series.get(key, 0.0) + value
+
+    def histogram(self, name: str, buckets: tuple[float, ...]) -> None:
+        self.histograms.setdefault(name, (buckets, {}))
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """
+        Record `value` in a histogram declared with `histogram`. Each series holds per-bucket counts, with the
+        overflow bucket last, followed by the running sum.
+        """
+        buckets, series = self.histograms[name]
+        key = _labels(**labels)
+        counts = series.get(key)
+        if counts is None:
+            counts = series[key] = [0.0] * (len(buckets) + 2)
+        counts[bisect_left(buckets, value)] += 1
+        counts[-1] += value
+
+    def register(self, collector: Collector) -> None:
+        """
+        Add a callable whose flat `{name: value}` dict is sampled at snapshot time. Names ending in `_total` are
+        counters, the rest gauges; a name may carry its labels, as in `name{engine="primary"}`.
+        """
+        self.collectors.append(collector)
+
+    def snapshot(self) -> dict[str, Any]:
+        counters = {name: dict(series) for name, series in self.counters.items()}
+        gauges = {name: dict(series) for name, series in self.gauges.items()}
+        for collector in self.collectors:
+            for sample, value in collector().items():
+                name, _, labels = sample.partition("{")
+                series = (counters if name.endswith("_total") else gauges).setdefault(name, {})
+                series[labels.removesuffix("}")] = float(value)
+
+        return {
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": {
+                name: {"buckets": list(buckets), "series": {key: list(counts) for key, counts in series.items()}}
+                for name, (buckets, series) in self.histograms.items()
+            },
+        }
+
+
+def merge_snapshots(snapshots: list[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Sum snapshots from several workers; gauges named `*_max` keep the largest value instead.
+    """
+    merged: dict[str, Any] = {"counters": {}, "gauges": {}, "histograms": {}}
+    for snapshot in snapshots:
+        for kind in ("counters", "gauges"):
+            for name, series in snapshot[kind].items():
+                target = merged[kind].setdefault(name, {})
+                for key, value in series.items():
+                    if kind == "gauges" and name.endswith("_max"):
+                        target[key] = max(target.get(key, value), value)
+                    else:
+                        target[key] = target.get(key, 0.0) + value
+
+        for name, histogram in snapshot["histograms"].items():
+            target = merged["histograms"].setdefault(name, {"buckets": histogram["buckets"], "series": {}})
+            for key, counts in histogram["series"].items():
+                existing = target["series"].get(key)
+                target["series"][key] = counts if existing is None else [a + b for a, b in zip(existing, counts)]
+
+    return merged
+
+
+def render(snapshot: dict[str, Any]) -> str:
+    lines = []
+    for kind, type_name in (("counters", "counter"), ("gauges", "gauge")):
+        for name, series in sorted(snapshot[kind].items()):
+            lines.append(f"# TYPE {name} {type_name}")
+            lines.extend(f"{_sample(name, key)} {value}" for key, value in series.items())
+
+    for name, histogram in sorted(snapshot["histograms"].items()):
+        lines.append(f"# TYPE {name} histogram")
+        bounds = [*histogram["buckets"], math.inf]
+        for key, counts in histogram["series"].items():
+            cumulative = 0.0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == math.inf else f'le="{float(bound)!r}"'
+                lines.append(f"{_sample(f'{name}_bucket', key, le)} {cumulative}")
+            lines.append(f"{_sample(f'{name}_sum', key)} {counts[-1]}")
+            lines.append(f"{_sample(f'{name}_count', key)} {cumulative}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+
+    except ProcessLookupError:
+        return False
+
+    except PermissionError:
+        return True
+
+    return True
+
+
+class MultiprocessStore:
+    """
+    Directory of per-worker snapshots (`metrics_<pid>.json`), replaced atomically on every flush.
+
+    When a worker exits, its counters and histograms are folded into `retired.json` and its snapshot deleted,
+    so totals never go backwards, the directory does not grow with recycled workers and a reused pid starts from
+    zero. Its gauges are dropped because they describe a process that no longer exists.
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def path(self) -> Path:
+        # resolved per call, since pre-forked workers inherit this store from the parent
+        return self.directory / f"metrics_{os.getpid()}.json"
+
+    @property
+    def retired_path(self) -> Path:
+        return self.directory / "retired.json"
+
+    def write(self, snapshot: dict[str, Any]) -> None:
+        self._replace(self.path, snapshot)
+
+    def retire(self, pid: int) -> None:
+        """
+        Fold the snapshot of exited worker `pid` into the retired totals. The supervisor calls this when it reaps a
+        worker; scrapes also retire snapshots left by processes that are gone.
+        """
+        with self._locked():
+            self._retire(pid)
+
+    def read_all(self) -> list[dict[str, Any]]:
+        # locked, so a worker retired concurrently is counted exactly once
+        with self._locked():
+            live = []
+            for path in self.directory.glob("metrics_*.json"):
+                pid = int(path.stem.removeprefix("metrics_"))
+                if pid == os.getpid() or _pid_alive(pid):
+                    live.append(path)
+                else:
+                    self._retire(pid)
+
+            snapshots = [self._read(path) for path in (self.retired_path, *live)]
+
+        return [snapshot for snapshot in snapshots if snapshot is not None]
+
+    def _retire(self, pid: int) -> None:
+        path = self.directory / f"metrics_{pid}.json"
+        snapshot = self._read(path)
+        if snapshot is not None:
+            snapshot["gauges"] = {}
+            retired = self._read(self.retired_path)
+            self._replace(self.retired_path, merge_snapshots([snapshot] if retired is None else [retired, snapshot]))
+        path.unlink(missing_ok=True)
+
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[None]:
+        with (self.directory / ".lock").open("a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read(self, path: Path) -> dict[str, Any] | None:
+        try:
+            snapshot: dict[str, Any] = json.loads(path.read_text())
+
+        except FileNotFoundError:
+            return None
+
+        except (OSError, ValueError) as exc:
+            logger.warning("Skipping unreadable metrics snapshot %s: %s", path, exc)
+            return None
+
+        return snapshot
+
+    def _replace(self, path: Path, snapshot: dict[str, Any]) -> None:
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(snapshot))
+        tmp.replace(path)
+
+
+class MetricsFlusher:
+    """
+    Periodically writes this worker's snapshot to the multiprocess store, so a scrape served by any worker
+    sees recent numbers from all of them.
+    """
+
+    def __init__(self, registry: MetricsRegistry, store: MultiprocessStore, interval_seconds: float) -> None:
+        self._registry = registry
+        self._store = store
+        self._interval_seconds = interval_seconds
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._store.write(self._registry.snapshot())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval_seconds)
+            self._store.write(self._registry.snapshot())
+
+
+def scrape(registry: MetricsRegistry, store: MultiprocessStore | None) -> str:
+    """
+    Prometheus text for this worker, or for all workers when a multiprocess store is configured.
+    """
+    if store is None:
+        return render(registry.snapshot())
+
+    store.write(registry.snapshot())
+    return render(merge_snapshots(store.read_all()))
+
+
+metrics = MetricsRegistry()
+metrics.histogram("http_request_duration_seconds", LATENCY_BUCKETS)
+metrics.histogram("http_response_size_bytes", SIZE_BUCKETS)
+metrics.histogram("db_statement_duration_seconds", LATENCY_BUCKETS)
+metrics.histogram("db_pool_checkout_wait_seconds", LATENCY_BUCKETS)
+metrics.histogram("db_connection_held_seconds", LATENCY_BUCKETS)
+
+metrics_store = MultiprocessStore(settings.metrics_multiproc_dir) if settings.metrics_multiproc_dir else None
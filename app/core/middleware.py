@@ -0,0 +1,479 @@
+import asyncio
+import random
+import re
+import secrets
+import threading
+import time
+import uuid
+
+from sqlalchemy.exc import DBAPIError
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.admission import (
+    ConcurrencyLimiter,
+    RateLimiter,
+    client_key,
+    concurrency_limiter,
+    rate_limiter,
+    retry_after,
+)
+from app.core.compression import StreamCompressor, compress_async, compressible, negotiate, stream_compressor
+from app.core.db import DEADLINE_SQLSTATES, pool_stats
+from app.core.etag import encoded_etag
+from app.core.log import request_id_var
+from app.core.metrics import metrics
+from app.core.profiling import StackSampler, profile_path, request_timings, server_timing, write_profile
+from app.core.settings import settings
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
+
+# cancelling a write could interrupt its commit, leaving the client unsure whether it happened
+_CANCELLABLE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class RequestIdMiddleware:
+    """
+    Binds an X-Request-ID (taken from the client when well-formed, generated otherwise) to the request's logs.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = Headers(scope=scope).get(REQUEST_ID_HEADER)
+        if not request_id or not _VALID_REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+
+        async def send_with_request_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append(REQUEST_ID_HEADER, request_id)
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+
+        finally:
+            request_id_var.reset(token)
+
+
+def _vary_on_encoding(headers: MutableHeaders) -> None:
+    if "accept-encoding" not in headers.get("Vary", "").lower():
+        headers.add_vary_header("Accept-Encoding")
+
+
+def _tag_encoding(headers: MutableHeaders, encoding: str) -> None:
+    # weak tags already allow byte-level differences between representations
+    etag = headers.get("ETag")
+    if etag is not None and not etag.startswith("W/"):
+        headers["ETag"] = encoded_etag(etag, encoding)
+
+
+def _tag_not_modified(headers: MutableHeaders, if_none_match: str | None, encoding: str) -> None:
+    # a 304 names the representation the client holds, which was compressed when its tag says so
+    etag = headers.get("ETag")
+    if etag is None or etag.startswith("W/"):
+        return
+    encoded = encoded_etag(etag, encoding)
+    if any(tag.strip().removeprefix("W/") == encoded for tag in (if_none_match or "").split(",")):
+        headers["ETag"] = encoded
+
+
+class CompressionMiddleware:
+    """
+    Compresses JSON and text responses of at least `compression_min_size` bytes with the best encoding the
+    client accepts. Streamed responses are compressed chunk by chunk. Responses that already carry a
+    Content-Encoding, such as precompressed cache entries, pass through as they are.
+
+    Compressed responses get their own strong ETag, suffixed with the encoding, and every response that could
+    have been compressed, including 304s, carries Vary: Accept-Encoding.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        encoding = negotiate(request_headers.get("Accept-Encoding"))
+        start_message: Message | None = None
+        compressor: StreamCompressor | None = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                content_encoding = headers.get("Content-Encoding")
+                not_modified = message["status"] == 304
+                negotiable = not_modified or content_encoding is not None or compressible(headers.get("Content-Type"))
+                if negotiable:
+                    _vary_on_encoding(headers)
+                if content_encoding is not None:
+                    _tag_encoding(headers, content_encoding)
+                elif not_modified and encoding is not None:
+                    _tag_not_modified(headers, request_headers.get("If-None-Match"), encoding)
+
+                if encoding is None or not negotiable or not_modified or content_encoding is not None:
+                    passthrough = True
+                    await send(message)
+                else:
+                    # held until the first body chunk shows whether the response is worth compressing
+                    start_message = message
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if start_message is not None:
+                start, start_message = start_message, None
+                if not more_body and len(body) < settings.compression_min_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+
+                # only held when an encoding was negotiated
+                assert encoding is not None
+                headers = MutableHeaders(scope=start)
+                headers["Content-Encoding"] = encoding
+                _tag_encoding(headers, encoding)
+                if not more_body:
+                    body = await compress_async(body, encoding)
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+
+                del headers["Content-Length"]
+                compressor = stream_compressor(encoding)
+                await send(start)
+
+            assert compressor is not None
+            if len(body) >= settings.compression_thread_min_bytes:
+                chunk = await asyncio.to_thread(compressor.compress, body)
+            else:
+                chunk = compressor.compress(body) if body else b""
+            if not more_body:
+                chunk += compressor.flush()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+def _match_route(scope: Scope) -> BaseRoute | None:
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route
+    return None
+
+
+class AdmissionMiddleware:
+    """
+    Decides whether a request may run before it reaches its route: sheds load with 503 while connection pool
+    checkouts back up, rate limits each client with 429, and caps the requests in flight per route with 503.
+    Every refusal carries Retry-After. Exempt paths, such as the health checks, are always admitted.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        limiter: RateLimiter = rate_limiter,
+        concurrency: ConcurrencyLimiter = concurrency_limiter,
+    ) -> None:
+        self.app = app
+        self.limiter = limiter
+        self.concurrency = concurrency
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith(tuple(settings.admission_exempt_paths)):
+            await self.app(scope, receive, send)
+            return
+
+        route = _match_route(scope)
+        path = getattr(route, "path", None)
+        name = f"{scope['method']} {path}" if path is not None else None
+
+        threshold = settings.shed_pool_wait_seconds
+        if threshold is not None:
+            wait = pool_stats.recent_wait(time.monotonic())
+            # shed a growing share of requests as the wait climbs from the threshold to twice the threshold
+            if wait > threshold and random.random() < (wait - threshold) / threshold:
+                await self._reject(scope, receive, send, route, 503, "overloaded", wait)
+                return
+
+        rate = settings.rate_limit_routes.get(name) if name is not None else None
+        client = scope.get("client")
+        key = client_key(Headers(scope=scope).get(settings.rate_limit_key_header), client[0] if client else None)
+        if rate is not None:
+            key = f"{key} {name}"
+        else:
+            rate = settings.rate_limit_per_second
+        if rate is not None:
+            wait = await self.limiter.acquire(key, rate, max(1.0, rate * settings.rate_limit_burst_seconds))
+            if wait > 0:
+                await self._reject(scope, receive, send, route, 429, "rate_limited", wait)
+                return
+
+        limit = settings.concurrency_limits.get(name) if name is not None else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        assert name is not None
+        if not self.concurrency.try_acquire(name, limit):
+            await self._reject(scope, receive, send, route, 503, "concurrency", 1.0)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+
+        finally:
+            self.concurrency.release(name)
+
+    @staticmethod
+    async def _reject(
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+        route: BaseRoute | None,
+        status: int,
+        reason: str,
+        wait: float,
+    ) -> None:
+        if route is not None:
+            # lets the metrics middleware label the refusal with the route it was meant for
+            scope["route"] = route
+        metrics.inc("http_requests_rejected_total", reason=reason, route=getattr(route, "path", "<unmatched>"))
+        detail = "Too many requests" if status == 429 else "Service overloaded, retry later"
+        response = JSONResponse({"detail": detail}, status_code=status, headers={"Retry-After": retry_after(wait)})
+        await response(scope, receive, send)
+
+
+def _expects_body(scope: Scope) -> bool:
+    headers = Headers(scope=scope)
+    return headers.get("Content-Length", "0") != "0" or "Transfer-Encoding" in headers
+
+
+class DeadlineMiddleware:
+    """
+    Stops work nobody will see. A read still unanswered at its deadline gets 504, and, with
+    `request_cancel_on_disconnect`, a read whose client disconnects before the response is complete is
+    cancelled, which makes asyncpg cancel its running query. Writes are never cancelled here.
+    The deadline is also published as `request.state.deadline` for the database sessions to enforce, which
+    bounds writes by statement_timeout and lock_timeout instead.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = _match_route(scope)
+        path = getattr(route, "path", None)
+        seconds = settings.request_deadline_seconds
+        if path is not None:
+            seconds = settings.route_deadlines.get(f"{scope['method']} {path}", seconds)
+        cancellable = scope["method"] in _CANCELLABLE_METHODS
+        cancel_on_disconnect = settings.request_cancel_on_disconnect and cancellable
+        if seconds is None and not cancel_on_disconnect:
+            await self.app(scope, receive, send)
+            return
+
+        deadline = None if seconds is None else time.monotonic() + seconds
+        if deadline is not None:
+            scope.setdefault("state", {})["deadline"] = deadline
+
+        started = False
+        completed = False
+        reason: str | None = None
+        disconnected = asyncio.Event()
+        read_ahead: list[Message] = []
+        watcher: asyncio.Task[None] | None = None
+
+        def cancel(why: str) -> None:
+            nonlocal reason
+            if reason is None and not app_task.done():
+                reason = why
+                app_task.cancel()
+
+        async def watch_disconnect() -> None:
+            # only started once the body is read, so what comes next is the disconnect
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+            if not completed:
+                cancel("disconnect")
+
+        def start_watching() -> None:
+            nonlocal watcher
+            if cancel_on_disconnect and watcher is None:
+                watcher = asyncio.create_task(watch_disconnect())
+
+        async def receive_body() -> Message:
+            if read_ahead:
+                return read_ahead.pop(0)
+            if watcher is not None:
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+
+            message = await receive()
+            if message["type"] == "http.request" and not message.get("more_body", False):
+                start_watching()
+            return message
+
+        async def send_response(message: Message) -> None:
+            nonlocal started, completed
+            if message["type"] == "http.response.start":
+                started = True
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                completed = True
+            await send(message)
+
+        if not _expects_body(scope):
+            # the empty body is already there, so disconnects can be watched for from the start
+            read_ahead.append(await receive())
+            while read_ahead[-1]["type"] == "http.request" and read_ahead[-1].get("more_body", False):
+                read_ahead.append(await receive())
+            start_watching()
+
+        def expire() -> None:
+            # streamed responses run on once started, though their queries are still bounded by the deadline
+            if not started:
+                cancel("deadline")
+
+        app_task: asyncio.Task[None] = asyncio.ensure_future(self.app(scope, receive_body, send_response))
+        timer = None if seconds is None or not cancellable else asyncio.get_running_loop().call_later(seconds, expire)
+        try:
+            await asyncio.wait({app_task})
+
+        except asyncio.CancelledError:
+            app_task.cancel()
+            raise
+
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if watcher is not None:
+                watcher.cancel()
+
+        if not app_task.cancelled():
+            exc = app_task.exception()
+            if exc is None:
+                return
+            # Postgres may enforce the deadline a moment before the timer does
+            timed_out = isinstance(exc, DBAPIError) and getattr(exc.orig, "sqlstate", None) in DEADLINE_SQLSTATES
+            if started or not timed_out:
+                raise exc
+            reason = "deadline"
+
+        metrics.inc("http_requests_cancelled_total", reason=reason or "cancelled", route=path or "<unmatched>")
+        if reason == "deadline" and not started:
+            response = JSONResponse({"detail": "Request deadline exceeded"}, status_code=504)
+            await response(scope, receive_body, send)
+
+
+class MetricsMiddleware:
+    """
+    Records request counts, latency and response sizes per route template, plus the number of requests in flight.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        size = 0
+
+        async def send_with_metrics(message: Message) -> None:
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        start = time.perf_counter()
+        metrics.add("http_requests_in_flight", 1)
+        try:
+            await self.app(scope, receive, send_with_metrics)
+
+        finally:
+            metrics.add("http_requests_in_flight", -1)
+            elapsed = time.perf_counter() - start
+            # the matched route's template keeps label cardinality bounded; unmatched paths share one series
+            route = getattr(scope.get("route"), "path", "<unmatched>")
+            method = scope["method"]
+            metrics.inc("http_requests_total", method=method, route=route, status=str(status))
+            metrics.observe("http_request_duration_seconds", elapsed, method=method, route=route)
+            metrics.observe("http_response_size_bytes", size, method=method, route=route)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a sample of requests, plus any request whose profiling header carries the configured token; without
+    a token, the header is ignored. Profiled requests get a Server-Timing header with their phase breakdown and
+    leave a collapsed-stack file for flame graphs, keeping the newest `profiling_max_files`.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    def _should_profile(self, scope: Scope) -> bool:
+        requested = Headers(scope=scope).get(settings.profiling_header)
+        token = settings.profiling_header_token
+        if requested is not None and token is not None:
+            # compared as bytes, since the str form rejects non-ASCII header values
+            return secrets.compare_digest(requested.encode("latin-1"), token.encode())
+        return random.random() < settings.profiling_sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        timings: dict[str, float] = {}
+        start = time.perf_counter()
+
+        async def send_with_timings(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                timings["total"] = time.perf_counter() - start
+                MutableHeaders(scope=message).append("Server-Timing", server_timing(timings))
+            await send(message)
+
+        sampler = StackSampler(threading.get_ident(), settings.profiling_interval_seconds)
+        token = request_timings.set(timings)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_timings)
+
+        finally:
+            sampler.stop()
+            request_timings.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            path = profile_path(settings.profiling_dir, route, request_id_var.get() or uuid.uuid4().hex)
+            await asyncio.to_thread(write_profile, sampler, path, settings.profiling_max_files)
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from sqlalchemy.engine import make_url
+
+from app.core.settings import settings
+
+if TYPE_CHECKING:
+    import asyncpg
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_DELAY_SECONDS = 1.0
+
+
+@dataclass(frozen=True, slots=True)
+class _Channel:
+    on_notify: Callable[[str], None]
+    # notifications may have been missed from here on
+    on_lost: Callable[[], None]
+    # listening again after a loss
+    on_restored: Callable[[], None] | None
+
+
+class NotifyListener:
+    """
+    One dedicated LISTEN connection per worker, outside the SQLAlchemy pools, shared by every channel the
+    worker follows and dispatching notifications by channel.
+
+    The connection is opened with the first channel and closed with the last. When it drops, each channel is
+    told so, and it is re-established in the background, after which each channel is told again.
+    """
+
+    def __init__(self) -> None:
+        self._channels: dict[str, _Channel] = {}
+        self._connection: asyncpg.Connection | None = None
+        self._maintenance: asyncio.Task[None] | None = None
+        # asyncpg runs one operation at a time per connection
+        self._lock = asyncio.Lock()
+
+    def listening(self, channel: str) -> bool:
+        return self._connection is not None and channel in self._channels
+
+    async def listen(
+        self,
+        channel: str,
+        on_notify: Callable[[str], None],
+        on_lost: Callable[[], None],
+        on_restored: Callable[[], None] | None = None,
+    ) -> None:
+        async with self._lock:
+            self._channels[channel] = _Channel(on_notify, on_lost, on_restored)
+            try:
+                if self._connection is None:
+                    await self._connect()
+                else:
+                    await self._connection.add_listener(channel, self._on_notify)
+
+            except Exception:
+                del self._channels[channel]
+                raise
+
+            if self._maintenance is None:
+                self._maintenance = asyncio.create_task(self._maintain())
+        logger.info("Listening on channel %s", channel)
+
+    async def unlisten(self, channel: str) -> None:
+        async with self._lock:
+            if self._channels.pop(channel, None) is None:
+                return
+            if self._channels:
+                if self._connection is not None:
+                    await self._connection.remove_listener(channel, self._on_notify)
+                return
+
+            if self._maintenance is not None:
+                self._maintenance.cancel()
+                await asyncio.gather(self._maintenance, return_exceptions=True)
+                self._maintenance = None
+            if self._connection is not None:
+                connection, self._connection = self._connection, None
+                await connection.close()
+
+    async def execute(self, query: str, *args: Any) -> None:
+        """
+        Run a statement on the listening connection, for upkeep that should not take a pooled connection.
+        """
+        async with self._lock:
+            if self._connection is not None:
+                await self._connection.execute(query, *args)
+
+    async def _connect(self) -> None:
+        import asyncpg
+
+        url = make_url(settings.database_url).set(drivername="postgresql")
+        connection = await asyncpg.connect(url.render_as_string(hide_password=False))
+        try:
+            for channel in self._channels:
+                await connection.add_listener(channel, self._on_notify)
+
+        except Exception:
+            connection.terminate()
+            raise
+
+        connection.add_termination_listener(self._on_termination)
+        self._connection = connection
+
+    def _on_notify(self, connection: asyncpg.Connection, pid: int, channel: str, payload: str) -> None:
+        if (handler := self._channels.get(channel)) is not None:
+            handler.on_notify(payload)
+
+    def _on_termination(self, connection: asyncpg.Connection) -> None:
+        if connection is not self._connection:
+            return
+        self._connection = None
+        logger.warning("LISTEN connection lost, reconnecting")
+        for handler in list(self._channels.values()):
+            handler.on_lost()
+
+    async def _maintain(self) -> None:
+        while True:
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+            async with self._lock:
+                if self._connection is not None or not self._channels:
+                    continue
+                try:
+                    await self._connect()
+                except Exception as exc:  # asyncpg errors share no narrower base with OSError
+                    logger.warning("LISTEN reconnect failed: %s", exc)
+                    continue
+
+            logger.info("LISTEN connection restored")
+            for handler in list(self._channels.values()):
+                if handler.on_restored is not None:
+                    handler.on_restored()
+
+
+notify_listener = NotifyListener()
@@ -0,0 +1,158 @@
+import re
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+PARTITIONED_TABLE = "notes"
+# same storage target as the content tiering migration; partitioned parents cannot carry it themselves
+TOAST_TUPLE_TARGET = 256
+
+_BOUND = re.compile(r"FROM \((?P<lower>[^)]*)\) TO \((?P<upper>[^)]*)\)")
+
+
+@dataclass(frozen=True, slots=True)
+class Partition:
+    name: str
+    # None for MINVALUE and MAXVALUE
+    lower: datetime | None
+    upper: datetime | None
+
+
+def month_start(moment: datetime) -> datetime:
+    return moment.astimezone(UTC).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(moment: datetime, months: int) -> datetime:
+    index = moment.year * 12 + moment.month - 1 + months
+    return moment.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month: datetime, table: str = PARTITIONED_TABLE) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+def _parse_bound(value: str) -> datetime | None:
+    value = value.strip()
+    if value in ("MINVALUE", "MAXVALUE"):
+        return None
+    return datetime.fromisoformat(value.strip("'"))
+
+
+async def list_partitions(conn: AsyncConnection, table: str = PARTITIONED_TABLE) -> list[Partition]:
+    rows = await conn.execute(
+        text(
+            """
+            SELECT c.relname AS name, pg_get_expr(c.relpartbound, c.oid) AS bound
+              FROM pg_inherits i
+              JOIN pg_class c ON c.oid = i.inhrelid
+             WHERE i.inhparent = CAST(:table AS regclass)
+            """
+        ),
+        {"table": table},
+    )
+
+    partitions = []
+    for row in rows:
+        match = _BOUND.search(row.bound)
+        if match is None:
+            continue
+        partitions.append(Partition(row.name, _parse_bound(match["lower"]), _parse_bound(match["upper"])))
+    return sorted(partitions, key=lambda p: p.upper or datetime.max.replace(tzinfo=UTC))
+
+
+async def create_partitions(
+    conn: AsyncConnection,
+    months_ahead: int,
+    now: datetime,
+    table: str = PARTITIONED_TABLE,
+) -> list[str]:
+    """
+    Create the monthly partitions missing between the newest existing one and `months_ahead` months after the
+    month of `now`, and return their names. Inserts fail once rows outgrow the last partition, so run this well
+    ahead of time; creating a partition briefly locks the parent table.
+    """
+    # concurrent runs would race to create the same partitions
+    await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:table))"), {"table": f"{table}_partitions"})
+
+    partitions = await list_partitions(conn, table)
+    if partitions and partitions[-1].upper is None:
+        # a MAXVALUE partition already takes every future row
+        return []
+
+    target = add_months(month_start(now), months_ahead + 1)
+    newest = partitions[-1].upper if partitions else None
+    start = month_start(now) if newest is None else newest.astimezone(UTC)
+    created = []
+    while start < target:
+        end = add_months(month_start(start), 1)
+        name = partition_name(start, table)
+        await conn.execute(
+            text(
+                f"CREATE TABLE {name} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}') "
+                f"WITH (toast_tuple_target = {TOAST_TUPLE_TARGET})"
+            )
+        )
+        created.append(name)
+        start = end
+    return created
+
+
+async def extend_partitions(engine: AsyncEngine, months_ahead: int, now: datetime, lock_timeout_ms: int) -> list[str]:
+    """
+    `create_partitions` in a transaction of its own. It waits behind long queries for at most `lock_timeout_ms`,
+    instead of stalling every query queued behind it.
+    """
+    async with engine.begin() as conn:
+        await conn.execute(text(f"SET LOCAL lock_timeout = {lock_timeout_ms}"))
+        return await create_partitions(conn, months_ahead, now)
+
+
+class PartitionRunway:
+    """
+    End of the newest partition, as last seen by a `refresh`. Inserts fail once `created_at` passes it, so
+    the time left is reported as the db_partition_runway_seconds gauge.
+    """
+
+    def __init__(self, table: str = PARTITIONED_TABLE) -> None:
+        self.table = table
+        # None until refreshed, and for tables without partitions or with a MAXVALUE one
+        self.until: datetime | None = None
+
+    async def refresh(self, conn: AsyncConnection) -> timedelta | None:
+        partitions = await list_partitions(conn, self.table)
+        self.until = partitions[-1].upper if partitions else None
+        return self.remaining(datetime.now(UTC))
+
+    def remaining(self, now: datetime) -> timedelta | None:
+        return None if self.until is None else self.until - now
+
+    def metrics(self) -> dict[str, float]:
+        remaining = self.remaining(datetime.now(UTC))
+        return {} if remaining is None else {"db_partition_runway_seconds": remaining.total_seconds()}
+
+
+async def detach_partitions(
+    conn: AsyncConnection,
+    before: datetime,
+    concurrently: bool = True,
+    table: str = PARTITIONED_TABLE,
+) -> list[str]:
+    """
+    Detach every partition whose rows were all created before `before`, and return their names. Detached
+    partitions stay in place as plain tables, to archive or drop; their notes vanish from the API without
+    tombstones. `concurrently` avoids blocking queries but needs `conn` in autocommit mode.
+    """
+    detached = []
+    for partition in await list_partitions(conn, table):
+        if partition.upper is None or partition.upper > before:
+            continue
+        mode = " CONCURRENTLY" if concurrently else ""
+        await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {partition.name}{mode}"))
+        detached.append(partition.name)
+    return detached
+
+
+partition_runway = PartitionRunway()
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+from types import FrameType
+
+request_timings: ContextVar[dict[str, float] | None] = ContextVar("request_timings", default=None)
+
+
+def record_timing(name: str, seconds: float) -> None:
+    """
+    Add `seconds` to the named phase of the current request, when that request is being profiled.
+    """
+    timings = request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def server_timing(timings: dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items())
+
+
+def _collapse(frame: FrameType | None) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_qualname} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """
+    Statistical profiler that samples the stack of one thread at a fixed interval from a helper thread.
+
+    Samples are aggregated as collapsed stacks (`outer;inner count`), the input format of flamegraph.pl and
+    speedscope. The event loop runs every request on the same thread, so concurrent requests show up too.
+    """
+
+    def __init__(self, thread_id: int, interval_seconds: float) -> None:
+        self.stacks: Counter[str] = Counter()
+        self._thread_id = thread_id
+        self._interval_seconds = interval_seconds
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def write(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common()))
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self._interval_seconds):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                self.stacks[_collapse(frame)] += 1
+
+
+def write_profile(sampler: StackSampler, path: Path, max_files: int) -> None:
+    """
+    Write the profile to `path`, then delete the oldest profiles beyond `max_files` in its directory.
+    """
+    sampler.write(path)
+    # names start with a timestamp, so they sort oldest first
+    profiles = sorted(path.parent.glob("*.collapsed"))
+    for old in profiles[: max(0, len(profiles) - max_files)]:
+        old.unlink(missing_ok=True)
+
+
+def profile_path(directory: Path, route: str, request_id: str) -> Path:
+    name = route.strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+    return directory / f"{time.strftime('%Y%m%dT%H%M%S')}-{name}-{request_id}.collapsed"
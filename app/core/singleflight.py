@@ -0,0 +1,74 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable, Iterable
+from typing import Any
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical reads: while a call for a key is in flight, callers with the same key await
+    its result instead of running their own query. Results are shared between callers, so they must not be
+    mutated.
+    """
+
+    def __init__(self) -> None:
+        self.leaders = 0
+        self.coalesced = 0
+        self._flights: dict[Hashable, asyncio.Future[Any]] = {}
+
+    async def do[T](self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        while (flight := self._flights.get(key)) is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(flight)
+
+            except asyncio.CancelledError:
+                if not flight.cancelled():
+                    raise
+                # the leading request went away before finishing; retry, perhaps as the new leader
+
+        self.leaders += 1
+        flight = asyncio.get_running_loop().create_future()
+        self._flights[key] = flight
+        try:
+            result = await call()
+
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+
+        except Exception as exc:
+            # followers see the same error, e.g. a 404, which is what their own query would have found
+            flight.set_exception(exc)
+            # mark it retrieved, for flights no follower joined
+            flight.exception()
+            raise
+
+        else:
+            flight.set_result(result)
+            return result
+
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def forget(self, keys: Iterable[Hashable]) -> None:
+        """
+        Detach in-flight calls after a write, so later readers start a fresh query that sees it. Callers that
+        already joined a flight still get its result, which was current when they arrived.
+        """
+        for key in keys:
+            self._flights.pop(key, None)
+
+    def forget_all(self) -> None:
+        self._flights.clear()
+
+    def metrics(self, prefix: str) -> dict[str, float]:
+        return {
+            f"{prefix}_leaders_total": self.leaders,
+            f"{prefix}_coalesced_total": self.coalesced,
+            f"{prefix}_in_flight": len(self._flights),
+        }
+
+
+note_flights = SingleFlight()
+note_list_flights = SingleFlight()
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """
+    The write-behind queue stayed full for the whole enqueue timeout.
+    """
+
+
+class WriteBehindQueue[T, R]:
+    """
+    Buffers writes in a bounded in-process queue and hands them to `write` in batches of up to `max_batch`
+    items, at least every `interval_seconds` while items are waiting. `write` returns one result per item, in
+    order, and must be safe to retry.
+
+    A failed batch is retried `retries` times, `retry_delay_seconds` apart and doubling, then written one item at
+    a time so a bad item fails alone. Every item's future resolves with its result or its error, and items that
+    could not be written are passed to `on_failure`. The queue lives in process memory, so items still queued
+    when the process dies are lost.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[list[T]], Awaitable[list[R]]],
+        max_size: int,
+        max_batch: int,
+        interval_seconds: float,
+        retries: int = 0,
+        retry_delay_seconds: float = 0.1,
+        on_failure: Callable[[T, Exception], None] | None = None,
+    ) -> None:
+        self.batches = 0
+        self.items = 0
+        self.rejected = 0
+        self.retried = 0
+        self.failed = 0
+        self._write = write
+        self._max_batch = max_batch
+        self._interval = interval_seconds
+        self._retries = retries
+        self._retry_delay = retry_delay_seconds
+        self._on_failure = on_failure
+        self._queue: asyncio.Queue[tuple[T, asyncio.Future[R]]] = asyncio.Queue(max_size)
+        self._task: asyncio.Task[None] | None = None
+        # the batch being collected, and the write in progress, both finished by `stop`
+        self._batch: list[tuple[T, asyncio.Future[R]]] = []
+        self._flushing: asyncio.Future[None] | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def submit(self, item: T, timeout: float) -> asyncio.Future[R]:
+        """
+        Queue `item`, waiting up to `timeout` seconds for room, and return the future of its write.
+        """
+        future: asyncio.Future[R] = asyncio.get_running_loop().create_future()
+        # results nobody awaits, as with fire-and-forget clients, must not warn when the batch fails
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        try:
+            await asyncio.wait_for(self._queue.put((item, future)), timeout)
+
+        except TimeoutError:
+            self.rejected += 1
+            raise QueueFullError from None
+
+        return future
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop the flusher once everything queued so far is written.
+        """
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        if self._flushing is not None:
+            await self._flushing
+        batch, self._batch = self._batch, []
+        await self._flush(batch)
+        while not self._queue.empty():
+            await self._flush(self._take(self._max_batch))
+
+    def metrics(self, prefix: str) -> dict[str, float]:
+        return {
+            f"{prefix}_queue_size": self._queue.qsize(),
+            f"{prefix}_batches_total": self.batches,
+            f"{prefix}_items_total": self.items,
+            f"{prefix}_rejected_total": self.rejected,
+            f"{prefix}_retried_total": self.retried,
+            f"{prefix}_failed_total": self.failed,
+        }
+
+    def _take(self, limit: int) -> list[tuple[T, asyncio.Future[R]]]:
+        batch: list[tuple[T, asyncio.Future[R]]] = []
+        while len(batch) < limit and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._batch.append(await self._queue.get())
+            deadline = loop.time() + self._interval
+            while len(self._batch) < self._max_batch:
+                self._batch += self._take(self._max_batch - len(self._batch))
+                remaining = deadline - loop.time()
+                if len(self._batch) >= self._max_batch or remaining <= 0:
+                    break
+                try:
+                    self._batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+
+                except TimeoutError:
+                    break
+
+            batch, self._batch = self._batch, []
+            # shielded, so stopping mid-write neither loses the batch nor leaves its futures pending
+            self._flushing = asyncio.ensure_future(self._flush(batch))
+            await asyncio.shield(self._flushing)
+            self._flushing = None
+
+    async def _flush(self, batch: list[tuple[T, asyncio.Future[R]]]) -> None:
+        if not batch:
+            return
+
+        items = [item for item, _ in batch]
+        delay = self._retry_delay
+        error: Exception | None = None
+        for attempt in range(self._retries + 1):
+            if attempt:
+                self.retried += 1
+                await asyncio.sleep(delay)
+                delay *= 2
+            try:
+                results = await self._write(items)
+
+            except Exception as exc:
+                logger.warning("Write-behind batch of %s items failed (attempt %s): %s", len(batch), attempt + 1, exc)
+                error = exc
+                continue
+
+            self._resolve(batch, results)
+            return
+
+        assert error is not None
+        if len(batch) == 1:
+            self._fail(batch[0], error)
+            return
+
+        # one at a time, so a single bad item cannot take the rest of the batch down with it
+        for entry in batch:
+            try:
+                self._resolve([entry], await self._write([entry[0]]))
+
+            except Exception as item_exc:
+                self._fail(entry, item_exc)
+
+    def _resolve(self, batch: list[tuple[T, asyncio.Future[R]]], results: list[R]) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        for (_, future), result in zip(batch, results, strict=True):
+            if not future.done():
+                future.set_result(result)
+
+    def _fail(self, entry: tuple[T, asyncio.Future[R]], exc: Exception) -> None:
+        item, future = entry
+        self.failed += 1
+        if self._on_failure is not None:
+            self._on_failure(item, exc)
+        else:
+            logger.error("Write-behind item could not be written: %s", exc)
+        if not future.done():
+            future.set_exception(exc)
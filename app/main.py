@@ -1,16 +1,36 @@
+import importlib
 import logging
 import os
 from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
-from importlib.metadata import PackageMetadata, PackageNotFoundError, metadata, version
+from datetime import UTC, datetime
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
 
 from fastapi import FastAPI
+from sqlalchemy.exc import SQLAlchemyError
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
+from app.core.admission import rate_limiter
+from app.core.cache import CacheInvalidationListener, note_cache
+from app.core.change_feed import change_feed
+from app.core.db import dispose_engines, get_engine, warm_up_pool
+from app.core.lifecycle import lifecycle
+from app.core.log import JsonFormatter, RequestIdFilter, start_queue_logging, stop_queue_logging
+from app.core.metrics import MetricsFlusher, metrics, metrics_store
+from app.core.middleware import (
+    AdmissionMiddleware,
+    CompressionMiddleware,
+    DeadlineMiddleware,
+    MetricsMiddleware,
+    ProfilingMiddleware,
+    RequestIdMiddleware,
+)
+from app.core.partitions import extend_partitions, partition_runway
 from app.core.settings import settings
+from app.core.singleflight import note_flights, note_list_flights
+from app.service.note_service import NoteService, note_create_queue
 
 
 def configure_logging() -> None:
@@ -30,14 +50,37 @@ def configure_logging() -> None:
         )
         handlers.append(file_handler)
 
+    formatter = JsonFormatter() if settings.log_json else logging.Formatter(settings.log_format)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        handler.addFilter(RequestIdFilter())
+
+    if settings.log_queue_enabled:
+        handlers = [start_queue_logging(handlers, settings.log_queue_max_size, settings.log_queue_policy)]
+
     logging.basicConfig(
         level=level,
-        format=settings.log_format,
         handlers=handlers,
     )
 
 
 def get_project_metadata() -> dict[str, str]:
+    """
+    Read from app/_version.py, written by setuptools-scm at build time, so startup does not scan installed
+    distributions. Checkouts that were never built fall back to the package metadata.
+    """
+    try:
+        generated = importlib.import_module("app._version")
+        return {
+            "title": generated.__title__,
+            "description": generated.__description__,
+            "version": generated.__version__,
+        }
+    except ImportError:
+        pass
+
+    from importlib.metadata import PackageMetadata, PackageNotFoundError, metadata, version
+
     try:
         meta: PackageMetadata = metadata("fastapi-template")
         return {
@@ -64,12 +107,76 @@ async def lifespan(application: FastAPI) -> AsyncIterator[None]:
     logger.info("Starting application")
     logger.info("--------------------------------------------------------------------------------")
 
+    cache_listener = None
+    if settings.note_cache_enabled and settings.note_cache_notify_channel:
+        cache_listener = CacheInvalidationListener(
+            note_cache, settings.note_cache_notify_channel, (note_flights, note_list_flights)
+        )
+        await cache_listener.start()
+
+    if settings.change_feed_enabled:
+        await change_feed.start()
+
+    metrics_flusher = None
+    if settings.metrics_enabled and metrics_store is not None:
+        metrics_flusher = MetricsFlusher(metrics, metrics_store, settings.metrics_flush_interval_seconds)
+        metrics_flusher.start()
+
+    engine = get_engine()
+    if settings.partition_create_on_startup:
+        try:
+            created = await extend_partitions(
+                engine, settings.partition_months_ahead, datetime.now(UTC), settings.partition_lock_timeout_ms
+            )
+            for name in created:
+                logger.info("Created partition %s", name)
+            async with engine.connect() as conn:
+                await partition_runway.refresh(conn)
+
+        except (OSError, SQLAlchemyError) as exc:
+            # inserts only fail once the runway is used up, which db_partition_runway_seconds warns about
+            logger.warning("Creating partitions failed: %s", exc)
+
+    if settings.database_pool_warm_connections > 0:
+        try:
+            await warm_up_pool(settings.database_pool_warm_connections, NoteService().warm_up)
+
+        except (OSError, SQLAlchemyError) as exc:
+            # readiness reports the database state, so a cold pool should not block startup
+            logger.warning("Connection pool warm-up failed: %s", exc)
+
+    if settings.write_behind_enabled:
+        note_create_queue.start()
+
+    lifecycle.started = True
+
     yield
 
+    # the server has stopped accepting connections and drained in-flight requests by now
+    lifecycle.start_draining()
+
+    # queued creates are written before the pools close
+    await note_create_queue.stop()
+
+    if metrics_flusher is not None:
+        await metrics_flusher.stop()
+
+    if cache_listener is not None:
+        await cache_listener.stop()
+
+    if settings.change_feed_enabled:
+        await change_feed.stop()
+
+    await rate_limiter.close()
+
     logger.info("--------------------------------------------------------------------------------")
     logger.info("Shutting down application")
     logger.info("--------------------------------------------------------------------------------")
 
+    await dispose_engines()
+
+    stop_queue_logging()
+
 
 app = FastAPI(
     title=project_metadata["title"],
@@ -78,6 +185,19 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+if settings.request_cancel_on_disconnect or settings.request_deadline_seconds is not None or settings.route_deadlines:
+    app.add_middleware(DeadlineMiddleware)
+if settings.compression_enabled:
+    app.add_middleware(CompressionMiddleware)
+# inside metrics, so refused requests are counted with their status
+if settings.admission_enabled:
+    app.add_middleware(AdmissionMiddleware)
+# outside compression, so response sizes are the bytes actually sent
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+if settings.profiling_enabled:
+    app.add_middleware(ProfilingMiddleware)
+app.add_middleware(RequestIdMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors_origins,
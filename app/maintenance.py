@@ -0,0 +1,58 @@
+"""
+Database maintenance tasks, meant to run from cron or a scheduled job:
+
+    uv run python -m app.maintenance partitions
+"""
+
+import argparse
+import asyncio
+import logging
+from datetime import UTC, datetime
+
+from app.core.db import dispose_engines, get_engine
+from app.core.partitions import add_months, detach_partitions, extend_partitions, month_start
+from app.core.settings import settings
+
+logger = logging.getLogger("app.maintenance")
+
+
+async def maintain_partitions(months_ahead: int, retention_months: int | None) -> None:
+    now = datetime.now(UTC)
+    engine = get_engine()
+
+    for name in await extend_partitions(engine, months_ahead, now, settings.partition_lock_timeout_ms):
+        logger.info("Created partition %s", name)
+
+    if retention_months is None:
+        return
+
+    before = add_months(month_start(now), -retention_months)
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for name in await detach_partitions(conn, before):
+            logger.info("Detached partition %s", name)
+
+
+async def run(args: argparse.Namespace) -> None:
+    try:
+        if args.task == "partitions":
+            await maintain_partitions(args.months_ahead, args.retention_months)
+
+    finally:
+        await dispose_engines()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    tasks = parser.add_subparsers(dest="task", required=True)
+    partitions = tasks.add_parser("partitions", help="pre-create upcoming notes partitions, detach expired ones")
+    partitions.add_argument("--months-ahead", type=int, default=settings.partition_months_ahead)
+    partitions.add_argument("--retention-months", type=int, default=settings.partition_retention_months)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.log_level.upper(), format=settings.log_format)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
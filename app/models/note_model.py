@@ -1,22 +1,77 @@
 import uuid
+from datetime import UTC, datetime, timedelta
 
-from sqlalchemy import Column, DateTime, Integer, String, Text
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, Computed, DateTime, Index, Integer, String, Text
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 
 from app.core.db import Base
 
+SEARCH_CONFIG = "english"
+
+# how far created_at, stamped by the database, may drift from the time in a note's id, stamped by the app
+ID_CLOCK_SKEW = timedelta(hours=1)
+
+
+def new_note_id() -> uuid.UUID:
+    # UUIDv7 ids start with their creation time, so lookups by id can be narrowed to a created_at range
+    return uuid.uuid7()
+
+
+def note_id_time(note_id: uuid.UUID) -> datetime | None:
+    """
+    Creation time embedded in a UUIDv7 note id, or None for ids of other versions, such as older UUIDv4 ones, and
+    for timestamps datetime cannot represent.
+    """
+    if note_id.version != 7:
+        return None
+    try:
+        return datetime.fromtimestamp((note_id.int >> 80) / 1000, UTC)
+
+    except (ValueError, OverflowError, OSError):
+        return None
+
 
 class Note(Base):
     __tablename__ = "notes"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=new_note_id)
     optlock = Column(Integer, nullable=False, default=0)
     title = Column(String(255), nullable=False)
+    # stored compressed and out of line once large (see the content tiering migration); summary queries leave it
+    # out of their column lists
     content = Column(Text, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # the partition key, hence part of the table's primary key; the mapper still identifies notes by id alone
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    search_vector = deferred(
+        Column(
+            TSVECTOR,
+            Computed(
+                f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+                f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(content, '')), 'B')",
+                persisted=True,
+            ),
+        )
+    )
+
+    __table_args__ = (
+        Index("ix_notes_updated_at_id", "updated_at", "id"),
+        Index("ix_notes_search_vector", "search_vector", postgresql_using="gin"),
+        # monthly partitions, extended at startup and by `python -m app.maintenance partitions`
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
     __mapper_args__ = {
         "version_id_col": optlock,
+        "primary_key": [id],
     }
+
+
+# written by the notes_change_feed trigger, so change feed clients can resume past deletes
+class NoteTombstone(Base):
+    __tablename__ = "note_tombstones"
+
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
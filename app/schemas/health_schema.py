@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+
+
+class ReadinessDTO(BaseModel):
+    status: str
+    database: str
+    draining: bool
+    pool: dict[str, float]
+    # time until inserts outgrow the newest notes partition; None when unknown or unbounded
+    partition_runway_days: float | None = None
@@ -1,7 +1,8 @@
 import uuid
 from datetime import datetime
+from typing import Literal
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 
 
 class _FromORM(BaseModel):
@@ -18,15 +19,63 @@ class NoteUpdateDTO(BaseModel):
     content: str | None = None
 
 
+class NoteBulkUpdateDTO(NoteUpdateDTO):
+    id: uuid.UUID
+    version: int | None = None
+
+
 class NoteSummaryDTO(_FromORM):
     id: uuid.UUID
     title: str
     updatedAt: datetime = Field(validation_alias="updated_at")
 
 
+class NotePageDTO(BaseModel):
+    items: list[NoteSummaryDTO]
+    next: str | None = None
+
+
+class NoteSearchHitDTO(NoteSummaryDTO):
+    rank: float
+    snippet: str | None = None
+
+
+class NoteSearchPageDTO(BaseModel):
+    items: list[NoteSearchHitDTO]
+    next: str | None = None
+
+
 class NoteDTO(_FromORM):
     id: uuid.UUID
     title: str
     content: str | None = None
     createdAt: datetime = Field(validation_alias="created_at")
     updatedAt: datetime = Field(validation_alias="updated_at")
+
+
+class NoteAcceptedDTO(BaseModel):
+    id: uuid.UUID
+
+
+class NoteBulkResultDTO(BaseModel):
+    id: uuid.UUID
+    status: int
+    note: NoteDTO | None = None
+
+
+class NoteChangeDTO(BaseModel):
+    op: Literal["created", "updated", "deleted"]
+    id: uuid.UUID
+    updatedAt: datetime
+    version: int | None = None
+
+
+# built once, so hot paths can validate whole result sets and dump straight to JSON bytes
+note_adapter = TypeAdapter(NoteDTO)
+note_accepted_adapter = TypeAdapter(NoteAcceptedDTO)
+note_list_adapter = TypeAdapter(list[NoteDTO])
+note_summary_list_adapter = TypeAdapter(list[NoteSummaryDTO])
+note_search_hit_list_adapter = TypeAdapter(list[NoteSearchHitDTO])
+note_page_adapter = TypeAdapter(NotePageDTO)
+note_search_page_adapter = TypeAdapter(NoteSearchPageDTO)
+note_bulk_result_list_adapter = TypeAdapter(list[NoteBulkResultDTO])
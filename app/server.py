@@ -0,0 +1,219 @@
+import asyncio
+import contextlib
+import logging
+import math
+import os
+import random
+import signal
+import socket
+import time
+from pathlib import Path
+from types import FrameType
+
+import uvicorn
+
+from app.core.lifecycle import lifecycle
+from app.core.metrics import metrics_store
+from app.core.settings import settings
+from app.main import app
+
+logger = logging.getLogger(__name__)
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+
+# exit code of a worker whose application failed to start; replacing it would only crash-loop
+STARTUP_FAILED_EXIT_CODE = 3
+
+
+def cpu_quota(cgroup_root: Path = CGROUP_ROOT) -> float | None:
+    """
+    CPUs granted by the container's cgroup quota (v2 `cpu.max`, or v1 `cfs_quota_us`/`cfs_period_us`),
+    or None when the cgroup sets no limit.
+    """
+    try:
+        quota, period = (cgroup_root / "cpu.max").read_text().split()
+        return None if quota == "max" else int(quota) / int(period)
+
+    except (OSError, ValueError):
+        pass
+
+    try:
+        quota_us = int((cgroup_root / "cpu" / "cpu.cfs_quota_us").read_text())
+        period_us = int((cgroup_root / "cpu" / "cpu.cfs_period_us").read_text())
+        return None if quota_us <= 0 else quota_us / period_us
+
+    except (OSError, ValueError):
+        return None
+
+
+def worker_count() -> int:
+    if settings.app_workers is not None:
+        return max(1, settings.app_workers)
+
+    cpus = os.process_cpu_count() or 1
+    quota = cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
+
+
+def _config() -> uvicorn.Config:
+    return uvicorn.Config(
+        app,
+        host=settings.app_host,
+        port=settings.app_port,
+        loop=settings.app_loop,
+        http=settings.app_http,
+        backlog=settings.app_backlog,
+        timeout_keep_alive=settings.app_keepalive_timeout,
+        timeout_graceful_shutdown=settings.app_graceful_timeout,
+        limit_max_requests=settings.app_limit_max_requests,
+        access_log=settings.app_access_log,
+        proxy_headers=settings.app_proxy_headers,
+        # logging is configured by app.main; keep uvicorn's loggers flowing into the same handlers
+        log_config=None,
+    )
+
+
+class DrainingServer(uvicorn.Server):
+    """
+    On the first SIGTERM or SIGINT, flag the app as draining and keep serving for `app_shutdown_delay_seconds`,
+    so load balancers see the readiness probe fail before the listener closes. uvicorn then stops accepting
+    connections and waits up to the graceful timeout for in-flight requests. A second signal exits at once.
+    """
+
+    def __init__(self, config: uvicorn.Config) -> None:
+        super().__init__(config)
+        self._exit_at: float | None = None
+
+    def handle_exit(self, sig: int, frame: FrameType | None) -> None:
+        self._start_draining()
+        if self._exit_at is not None or settings.app_shutdown_delay_seconds <= 0:
+            super().handle_exit(sig, frame)
+            return
+
+        self._exit_at = time.monotonic() + settings.app_shutdown_delay_seconds
+
+    def _start_draining(self) -> None:
+        # signal handlers may interrupt the event loop mid-step, so drain callbacks run on the loop instead
+        try:
+            asyncio.get_running_loop().call_soon_threadsafe(lifecycle.start_draining)
+
+        except RuntimeError:
+            lifecycle.start_draining()
+
+    async def on_tick(self, counter: int) -> bool:
+        if self._exit_at is not None and time.monotonic() >= self._exit_at:
+            self.should_exit = True
+        return await super().on_tick(counter)
+
+
+class Supervisor:
+    """
+    Pre-fork process manager: the app is imported and the listening socket bound once in the parent, then
+    workers are forked and share both. Workers that exit, such as those recycled after
+    `app_limit_max_requests`, are replaced until the supervisor receives SIGTERM or SIGINT, which it forwards
+    to every worker before waiting up to the graceful timeout. Exited workers' metrics are folded into the
+    multiprocess store's retired totals.
+    """
+
+    def __init__(self, config: uvicorn.Config, workers: int) -> None:
+        self.config = config
+        self.workers = workers
+        self.children: set[int] = set()
+        self.stopping = False
+        self.failed = False
+        self._socket: socket.socket | None = None
+
+    def run(self) -> None:
+        self._socket = self.config.bind_socket()
+        signal.signal(signal.SIGTERM, self._on_signal)
+        signal.signal(signal.SIGINT, self._on_signal)
+        logger.info("Starting %s workers on %s:%s", self.workers, self.config.host, self.config.port)
+
+        for _ in range(self.workers):
+            self._spawn()
+
+        deadline: float | None = None
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                if self.stopping and deadline is None:
+                    deadline = (
+                        time.monotonic() + settings.app_shutdown_delay_seconds + settings.app_graceful_timeout + 5
+                    )
+                if deadline is not None and time.monotonic() > deadline:
+                    logger.warning("Killing %s workers that outlived the graceful timeout", len(self.children))
+                    self._signal_children(signal.SIGKILL)
+                    deadline = math.inf
+                time.sleep(0.1)
+                continue
+
+            self.children.discard(pid)
+            if metrics_store is not None:
+                # the worker flushed its final snapshot on shutdown
+                metrics_store.retire(pid)
+            if self.stopping:
+                continue
+            if os.waitstatus_to_exitcode(status) == STARTUP_FAILED_EXIT_CODE:
+                logger.error("Worker %s exited during startup, stopping", pid)
+                self.failed = True
+                self._on_signal(signal.SIGTERM, None)
+                continue
+
+            logger.info("Worker %s exited; starting a replacement", pid)
+            self._spawn()
+
+        self._socket.close()
+        logger.info("All workers stopped")
+
+    def _spawn(self) -> None:
+        pid = os.fork()
+        if pid:
+            self.children.add(pid)
+            return
+
+        # worker: uvicorn installs its own signal handling for graceful shutdown
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        exit_code = 0
+        try:
+            if self.config.limit_max_requests is not None and settings.app_limit_max_requests_jitter:
+                # spread recycling so workers do not all restart at once
+                self.config.limit_max_requests += random.randint(0, settings.app_limit_max_requests_jitter)
+            assert self._socket is not None
+            server = DrainingServer(self.config)
+            server.run(sockets=[self._socket])
+            exit_code = 0 if server.started else STARTUP_FAILED_EXIT_CODE
+
+        except BaseException:
+            logger.exception("Worker %s failed", os.getpid())
+            exit_code = 1
+
+        finally:
+            os._exit(exit_code)
+
+    def _on_signal(self, signum: int, frame: FrameType | None) -> None:
+        if not self.stopping:
+            logger.info("Received %s, stopping workers", signal.Signals(signum).name)
+        self.stopping = True
+        self._signal_children(signal.SIGTERM)
+
+    def _signal_children(self, signum: int) -> None:
+        for pid in self.children:
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signum)
+
+
+def main() -> None:
+    config = _config()
+    workers = worker_count()
+
+    if workers == 1:
+        DrainingServer(config).run()
+        return
+
+    supervisor = Supervisor(config, workers)
+    supervisor.run()
+    if supervisor.failed:
+        raise SystemExit(1)
@@ -1,53 +1,469 @@
+import asyncio
+import base64
+import contextlib
+import hashlib
+import json
 import logging
 import uuid
+from collections.abc import AsyncGenerator, AsyncIterator, Awaitable, Callable, Hashable, Iterable
+from dataclasses import replace
+from datetime import UTC, datetime, timedelta
+from typing import Any, Literal, NoReturn
 
 from fastapi import HTTPException, status
-from sqlalchemy import select
-from sqlalchemy.exc import NoResultFound
+from sqlalchemy import (
+    Boolean,
+    ColumnElement,
+    Integer,
+    and_,
+    any_,
+    bindparam,
+    case,
+    cast,
+    column,
+    delete,
+    func,
+    insert,
+    literal,
+    null,
+    or_,
+    select,
+    true,
+    tuple_,
+    union_all,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, REAL, REGCONFIG
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models.note_model import Note
-from app.schemas.note_schema import NoteCreateDTO, NoteSummaryDTO, NoteUpdateDTO
+from app.core.cache import CachedResponse, note_cache
+from app.core.change_feed import ChangeEvent, change_feed
+from app.core.compression import compress_async
+from app.core.db import async_session_factory, get_engine
+from app.core.etag import NotModified, etag_matches, parse_etags
+from app.core.settings import settings
+from app.core.singleflight import SingleFlight, note_flights, note_list_flights
+from app.core.write_behind import QueueFullError, WriteBehindQueue
+from app.models.note_model import ID_CLOCK_SKEW, SEARCH_CONFIG, Note, NoteTombstone, new_note_id, note_id_time
+from app.schemas.note_schema import (
+    NoteBulkResultDTO,
+    NoteBulkUpdateDTO,
+    NoteChangeDTO,
+    NoteCreateDTO,
+    NoteDTO,
+    NotePageDTO,
+    NoteSearchPageDTO,
+    NoteSummaryDTO,
+    NoteUpdateDTO,
+    note_search_hit_list_adapter,
+    note_summary_list_adapter,
+)
 
 logger = logging.getLogger(__name__)
 
+_NOTE_COLUMNS: tuple[Any, ...] = (Note.id, Note.title, Note.content, Note.created_at, Note.updated_at)
+_SUMMARY_COLUMNS: tuple[Any, ...] = (Note.id, Note.title, Note.updated_at)
+
+# NOTIFY payloads are capped at 8000 bytes
+_NOTIFY_IDS_PER_PAYLOAD = 200
+
+# expected version for If-Match: *, which any version satisfies as long as the note exists
+ANY_VERSION = 0
+
+
+def note_etag(note_id: uuid.UUID, optlock: int) -> str:
+    return f'"{note_id.hex}.{optlock}"'
+
+
+def page_etag(page: NotePageDTO) -> str:
+    digest = hashlib.sha1(usedforsecurity=False)
+    for item in page.items:
+        digest.update(f"{item.id.hex}{item.updatedAt.isoformat()}".encode())
+    digest.update((page.next or "").encode())
+    return f'W/"{digest.hexdigest()}"'
+
+
+def if_match_version(header: str, note_id: uuid.UUID) -> int | None:
+    """
+    Expected optlock for `note_id` from an If-Match header, or None if no strong tag names this note.
+    """
+    for weak, tag in parse_etags(header):
+        tag_id, _, optlock = tag.partition(".")
+        if not weak and tag_id == note_id.hex and optlock.isdigit():
+            return int(optlock)
+    return None
+
+
+def _encode_cursor(*parts: object) -> str:
+    raw = json.dumps(parts, default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, *parsers: Callable[[Any], Any]) -> list[Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        parts = json.loads(raw)
+        return [parse(part) for parse, part in zip(parsers, parts, strict=True)]
+
+    except (ValueError, TypeError) as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor") from exc
+
+
+def _created_window(note_ids: Iterable[uuid.UUID]) -> ColumnElement[bool] | None:
+    """
+    Range of created_at, the partition key, that holds the notes with these ids, so Postgres only scans the
+    partitions that can contain them. None when some id is not a UUIDv7 and tells nothing about its note's age,
+    or when the window would fall outside what datetime can represent.
+    """
+    times = [note_id_time(note_id) for note_id in note_ids]
+    known = [t for t in times if t is not None]
+    if not known or len(known) < len(times):
+        return None
+    try:
+        return Note.created_at.between(min(known) - ID_CLOCK_SKEW, max(known) + ID_CLOCK_SKEW)
+
+    except OverflowError:
+        return None
+
+
+def _by_id(note_id: uuid.UUID) -> ColumnElement[bool]:
+    window = _created_window([note_id])
+    return Note.id == note_id if window is None else and_(Note.id == note_id, window)
+
+
+def _any_id(ids: list[uuid.UUID]) -> ColumnElement[bool]:
+    # a single array parameter keeps one prepared statement for any batch size
+    clause = Note.id == any_(bindparam("ids", ids, type_=ARRAY(Note.id.type)))
+    window = _created_window(ids)
+    return clause if window is None else and_(clause, window)
+
 
 class NoteService:
+    async def _read[T](
+        self,
+        flights: SingleFlight,
+        key: Hashable,
+        coalesce: bool,
+        call: Callable[[], Awaitable[T]],
+    ) -> T:
+        if coalesce and settings.read_coalescing_enabled:
+            return await flights.do(key, call)
+        return await call()
+
     async def list_notes(
         self,
         db: AsyncSession,
-    ) -> list[NoteSummaryDTO]:
-        logger.info("list_notes")
+        limit: int,
+        cursor: str | None = None,
+        coalesce: bool = False,
+    ) -> NotePageDTO:
+        """
+        With `coalesce`, concurrent identical requests share one query and one page.
+        """
+        logger.info("list_notes: limit=%s", limit)
+
+        return await self._read(
+            note_list_flights, (limit, cursor), coalesce, lambda: self._list_notes(db, limit, cursor)
+        )
+
+    async def _list_notes(self, db: AsyncSession, limit: int, cursor: str | None) -> NotePageDTO:
+        # only the summary columns, ordered to match ix_notes_updated_at_id
+        stmt = select(*_SUMMARY_COLUMNS).order_by(Note.updated_at.desc(), Note.id.desc()).limit(limit + 1)
+        if cursor:
+            updated_at, note_id = _decode_cursor(cursor, datetime.fromisoformat, uuid.UUID)
+            after = tuple_(literal(updated_at, Note.updated_at.type), literal(note_id, Note.id.type))
+            # a note is never updated before it is created, so partitions created after the cursor are skipped
+            stmt = stmt.where(tuple_(Note.updated_at, Note.id) < after, Note.created_at <= updated_at)
+
+        rows = (await db.execute(stmt)).all()
+        items = note_summary_list_adapter.validate_python(rows[:limit], from_attributes=True)
+
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = _encode_cursor(last.updated_at, last.id)
+
+        return NotePageDTO(items=items, next=next_cursor)
+
+    async def warm_up(self, db: AsyncSession) -> None:
+        """
+        Run the hot read statements once, so the session's connection has them prepared.
+        """
+        await self.list_notes(db, settings.page_size_default)
+        for if_none_match in (None, '"warm-up"'):
+            with contextlib.suppress(HTTPException):
+                await self.get_note_by_id(db, uuid.UUID(int=0), if_none_match)
+
+    async def search_notes(
+        self,
+        db: AsyncSession,
+        query: str,
+        limit: int,
+        cursor: str | None = None,
+    ) -> NoteSearchPageDTO:
+        logger.info("search_notes: limit=%s", limit)
+
+        ts_query = func.websearch_to_tsquery(literal(SEARCH_CONFIG, REGCONFIG), query)
+        match: ColumnElement[bool] = Note.search_vector.op("@@")(ts_query)
+        rank = func.ts_rank_cd(Note.search_vector, ts_query, type_=REAL)
+        if settings.search_trigram_enabled:
+            # pg_trgm similarity catches prefixes and typos in titles that the stemmer misses
+            match = or_(match, Note.title.op("%")(query))
+            rank = func.greatest(rank, func.similarity(Note.title, query), type_=REAL)
+
+        # rank and page on the GIN-indexed vector first, only then read content for the snippets
+        page = select(Note.id, rank.label("rank")).where(match)
+        if cursor:
+            last_rank, note_id = _decode_cursor(cursor, float, uuid.UUID)
+            after = tuple_(literal(last_rank, REAL), literal(note_id, Note.id.type))
+            page = page.where(tuple_(rank, Note.id) < after)
+        ranked = page.order_by(rank.desc(), Note.id.desc()).limit(limit + 1).subquery()
+
+        snippet = func.ts_headline(SEARCH_CONFIG, Note.content, ts_query, settings.search_snippet_options)
+        stmt = (
+            select(*_SUMMARY_COLUMNS, ranked.c.rank, snippet.label("snippet"))
+            .join(ranked, ranked.c.id == Note.id)
+            .order_by(ranked.c.rank.desc(), Note.id.desc())
+        )
+
+        rows = (await db.execute(stmt)).all()
+        items = note_search_hit_list_adapter.validate_python(rows[:limit], from_attributes=True)
+
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = _encode_cursor(last.rank, last.id)
+
+        return NoteSearchPageDTO(items=items, next=next_cursor)
+
+    async def export_notes(
+        self,
+        db: AsyncSession,
+        fmt: Literal["ndjson", "json"],
+        full: bool = False,
+        updated_since: datetime | None = None,
+        updated_until: datetime | None = None,
+    ) -> AsyncIterator[bytes]:
+        logger.info("export_notes: format=%s full=%s", fmt, full)
+
+        dto: type[NoteDTO] | type[NoteSummaryDTO] = NoteDTO if full else NoteSummaryDTO
+        columns = _NOTE_COLUMNS if full else _SUMMARY_COLUMNS
+
+        stmt = select(*columns).order_by(Note.updated_at, Note.id)
+        if updated_since is not None:
+            stmt = stmt.where(Note.updated_at >= updated_since)
+        if updated_until is not None:
+            stmt = stmt.where(Note.updated_at < updated_until, Note.created_at < updated_until)
+
+        # server-side cursor, fetched and flushed one batch at a time
+        result = await db.stream(stmt.execution_options(yield_per=settings.export_batch_size))
+
+        separator = b"\n" if fmt == "ndjson" else b","
+        first = True
+        if fmt == "json":
+            yield b"["
+
+        async for rows in result.partitions():
+            chunk = separator.join(dto.model_validate(r).model_dump_json().encode() for r in rows)
+            if fmt == "ndjson":
+                yield chunk + separator
+            else:
+                yield chunk if first else separator + chunk
+            first = False
+
+        if fmt == "json":
+            yield b"]"
 
-        result = await db.execute(select(Note).order_by(Note.updated_at.desc()))
-        return [NoteSummaryDTO.model_validate(r) for r in result.scalars()]
+    def note_changes(self, db: AsyncSession, since: datetime | None = None) -> AsyncGenerator[ChangeEvent | None]:
+        """
+        Changes made at or after `since`, replayed from the table, followed by live changes from the feed.
+
+        Event ids are the time a change's transaction started, while events go out in commit order, so a change
+        can be delivered after one with a later id. Replay therefore starts `change_feed_replay_margin_seconds`
+        before `since`, which catches changes from any transaction shorter than the margin. Replayed and live
+        events overlap, so delivery is at-least-once and clients dedupe by id and version. The stream yields None
+        when idle for `change_feed_heartbeat_seconds` and raises SubscriptionClosedError when the feed cuts it off.
+        """
+        logger.info("note_changes: since=%s", since)
+
+        if not change_feed.running:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Change feed unavailable")
+
+        if since is not None:
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=UTC)
+            since -= timedelta(seconds=settings.change_feed_replay_margin_seconds)
+        retention = timedelta(seconds=settings.change_feed_retention_seconds)
+        if since is not None and since < datetime.now(UTC) - retention:
+            raise HTTPException(
+                status_code=status.HTTP_410_GONE, detail="Resume point is older than the change feed retention"
+            )
+
+        return self._follow_changes(db, since)
+
+    async def _follow_changes(self, db: AsyncSession, since: datetime | None) -> AsyncGenerator[ChangeEvent | None]:
+        # subscribe before replaying, so nothing committed in between is missed
+        subscription = change_feed.subscribe()
+        try:
+            if since is not None:
+                async for event in self._replay_changes(db, since):
+                    yield event
+
+            # the live part can run for hours; it must not hold a pooled connection
+            await db.close()
+
+            while True:
+                yield await subscription.get(settings.change_feed_heartbeat_seconds)
+
+        finally:
+            change_feed.unsubscribe(subscription)
+
+    async def _replay_changes(self, db: AsyncSession, since: datetime) -> AsyncIterator[ChangeEvent]:
+        op = case((Note.created_at >= since, literal("created")), else_=literal("updated"))
+        upserts = select(op.label("op"), Note.id, Note.updated_at.label("at"), Note.optlock.label("version")).where(
+            Note.updated_at >= since
+        )
+        deletes = select(
+            literal("deleted").label("op"),
+            NoteTombstone.id,
+            NoteTombstone.deleted_at.label("at"),
+            null().label("version"),
+        ).where(NoteTombstone.deleted_at >= since)
+        changes = union_all(upserts, deletes).subquery()
+
+        stmt = select(changes).order_by(changes.c.at, changes.c.id)
+        result = await db.stream(stmt.execution_options(yield_per=settings.export_batch_size))
+        async for rows in result.partitions():
+            for r in rows:
+                data = NoteChangeDTO(op=r.op, id=r.id, updatedAt=r.at, version=r.version).model_dump_json()
+                yield ChangeEvent.build(data, r.op, r.at.isoformat())
 
     async def get_note_by_id(
         self,
         db: AsyncSession,
         note_id: uuid.UUID,
-    ) -> Note:
+        if_none_match: str | None = None,
+        encoding: str | None = None,
+        coalesce: bool = False,
+    ) -> CachedResponse | NotModified:
+        """
+        Serialized note with its ETag, or NotModified when `if_none_match` already names the current version.
+        With an `encoding`, large bodies also carry a copy compressed with it, kept in the cache for reuse.
+        With `coalesce`, concurrent requests for the same note share one query.
+        """
         logger.info("get_note_by_id: %s", note_id)
 
-        result = await db.execute(select(Note).where(Note.id == note_id))
+        generation = note_cache.generation
+        cached = note_cache.get(note_id) if settings.note_cache_enabled else None
+        if cached is not None:
+            if etag_matches(if_none_match, cached.etag):
+                return NotModified(cached.etag)
+            response = await self._precompress(cached, encoding)
+            if response is not cached:
+                note_cache.set(note_id, response, generation)
+            return response
 
-        try:
-            return result.scalar_one()
+        if if_none_match:
+            # version-only probe, so an unchanged note never loads or serializes its content
+            optlock = await self._read(
+                note_flights,
+                ("optlock", note_id),
+                coalesce,
+                lambda: db.scalar(select(Note.optlock).where(_by_id(note_id))),
+            )
+            if optlock is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Note not found")
+            etag = note_etag(note_id, optlock)
+            if etag_matches(if_none_match, etag):
+                return NotModified(etag)
+
+        response = await self._read(note_flights, note_id, coalesce, lambda: self._load_note(db, note_id))
+        response = await self._precompress(response, encoding)
+        if settings.note_cache_enabled:
+            note_cache.set(note_id, response, generation)
+        return response
+
+    async def _load_note(self, db: AsyncSession, note_id: uuid.UUID) -> CachedResponse:
+        row = (await db.execute(select(Note.optlock, *_NOTE_COLUMNS).where(_by_id(note_id)))).one_or_none()
+        if row is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Note not found")
 
-        except NoResultFound:
+        return CachedResponse(
+            etag=note_etag(note_id, row.optlock),
+            body=NoteDTO.model_validate(row).model_dump_json().encode(),
+        )
+
+    async def get_note_content(
+        self,
+        db: AsyncSession,
+        note_id: uuid.UUID,
+        if_none_match: str | None = None,
+    ) -> tuple[str, int, AsyncIterator[bytes]] | NotModified:
+        """
+        ETag, UTF-8 size and chunks of the raw note body, or NotModified when `if_none_match` names the current
+        version.
+        The body is decompressed once and fetched `content_chunk_bytes` bytes at a time through a server-side
+        cursor, so memory per request stays flat for large notes.
+        """
+        logger.info("get_note_content: %s", note_id)
+
+        # one snapshot for every chunk, so a concurrent update cannot splice two versions together
+        await db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        # octet_length reads the stored size without decompressing the body
+        stmt = select(Note.optlock, func.coalesce(func.octet_length(Note.content), 0).label("size"))
+        row = (await db.execute(stmt.where(_by_id(note_id)))).one_or_none()
+        if row is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Note not found")
 
+        etag = note_etag(note_id, row.optlock)
+        if etag_matches(if_none_match, etag):
+            return NotModified(etag)
+        return etag, row.size, self._content_chunks(db, note_id)
+
+    async def _content_chunks(self, db: AsyncSession, note_id: uuid.UUID) -> AsyncIterator[bytes]:
+        size = settings.content_chunk_bytes
+        # substr on the stored value would decompress it from the start for every chunk, and count characters from
+        # the start even when uncompressed; the materialized CTE detoasts it once and slices it by byte offset
+        body = (
+            select(func.convert_to(Note.content, "UTF8").label("body"))
+            .where(_by_id(note_id))
+            .cte("body")
+            .prefix_with("MATERIALIZED", dialect="postgresql")
+        )
+        offsets = func.generate_series(1, func.octet_length(body.c.body), size).table_valued("offset").render_derived()
+        stmt = (
+            select(func.substr(body.c.body, offsets.c.offset, size))
+            .select_from(body.join(offsets, true()))
+            .order_by(offsets.c.offset)
+        )
+        chunks = await db.stream_scalars(stmt, execution_options={"yield_per": 1})
+        async for chunk in chunks:
+            yield chunk
+
+    async def _precompress(self, response: CachedResponse, encoding: str | None) -> CachedResponse:
+        if encoding is None or encoding in response.encoded or len(response.body) < settings.compression_min_size:
+            return response
+
+        compressed = await compress_async(response.body, encoding)
+        return replace(response, encoded={**response.encoded, encoding: compressed})
+
     async def create_note(
         self,
         db: AsyncSession,
         payload: NoteCreateDTO,
-    ) -> Note:
-        logger.info("create_note: %s", payload)
+    ) -> NoteDTO:
+        logger.info("create_note: title=%r", payload.title)
 
-        note = Note(title=payload.title, content=payload.content)
-        db.add(note)
+        stmt = (
+            insert(Note)
+            .values(id=new_note_id(), optlock=1, title=payload.title, content=payload.content)
+            .returning(*_NOTE_COLUMNS)
+        )
+        note = NoteDTO.model_validate((await db.execute(stmt)).one())
         await db.commit()
-        await db.refresh(note)
+        self._invalidate([note.id])
         return note
 
     async def update_note(
@@ -55,35 +471,266 @@ class NoteService:
         db: AsyncSession,
         note_id: uuid.UUID,
         payload: NoteUpdateDTO,
-    ) -> Note:
+        version: int | None = None,
+    ) -> tuple[NoteDTO, str]:
+        """
+        Updated note and the ETag of its new version.
+        """
         logger.info("update_note: %s", note_id)
 
-        result = await db.execute(select(Note).where(Note.id == note_id))
-        try:
-            note = result.scalar_one()
-            data = payload.model_dump(exclude_unset=True)
-            for k, v in data.items():
-                setattr(note, k, v)
+        data = payload.model_dump(exclude_unset=True)
+        if data.get("title", "") is None:
+            del data["title"]
 
-            await db.commit()
-            await db.refresh(note)
-            return note
+        if not data:
+            # nothing to change, so the version, the caches and the feed stay as they are
+            query = select(Note.optlock, *_NOTE_COLUMNS).where(_by_id(note_id))
+            if version not in (None, ANY_VERSION):
+                query = query.where(Note.optlock == version)
+            current = (await db.execute(query)).one_or_none()
+            if current is None:
+                await self._raise_not_written(db, note_id, version)
+            return NoteDTO.model_validate(current), note_etag(note_id, current.optlock)
 
-        except NoResultFound:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Note not found")
+        stmt = update(Note).where(_by_id(note_id))
+        if version not in (None, ANY_VERSION):
+            stmt = stmt.where(Note.optlock == version)
+
+        result = await db.execute(
+            stmt.values(**data, optlock=Note.optlock + 1)
+            .returning(Note.optlock, *_NOTE_COLUMNS)
+            .execution_options(synchronize_session=False)
+        )
+        row = result.one_or_none()
+        if row is None:
+            await self._raise_not_written(db, note_id, version)
+
+        await self._publish_invalidation(db, [note_id])
+        await db.commit()
+        self._invalidate([note_id])
+        return NoteDTO.model_validate(row), note_etag(note_id, row.optlock)
 
     async def delete_note(
         self,
         db: AsyncSession,
         note_id: uuid.UUID,
+        version: int | None = None,
     ) -> None:
         logger.info("delete_note: %s", note_id)
 
-        result = await db.execute(select(Note).where(Note.id == note_id))
+        stmt = delete(Note).where(_by_id(note_id))
+        if version not in (None, ANY_VERSION):
+            stmt = stmt.where(Note.optlock == version)
+
+        result = await db.execute(stmt.returning(Note.id).execution_options(synchronize_session=False))
+        if result.one_or_none() is None:
+            await self._raise_not_written(db, note_id, version)
+
+        await self._publish_invalidation(db, [note_id])
+        await db.commit()
+        self._invalidate([note_id])
+
+    async def _publish_invalidation(
+        self,
+        db: AsyncSession,
+        note_ids: list[uuid.UUID],
+    ) -> None:
+        # NOTIFY is transactional, so other workers only evict once the write is committed
+        channel = settings.note_cache_notify_channel
+        if not settings.note_cache_enabled or not channel or not note_ids:
+            return
+
+        for i in range(0, len(note_ids), _NOTIFY_IDS_PER_PAYLOAD):
+            payload = ",".join(str(note_id) for note_id in note_ids[i : i + _NOTIFY_IDS_PER_PAYLOAD])
+            await db.execute(select(func.pg_notify(channel, payload)))
+
+    def _invalidate(
+        self,
+        note_ids: Iterable[uuid.UUID],
+    ) -> None:
+        ids = list(note_ids)
+        if settings.note_cache_enabled:
+            note_cache.invalidate(ids)
+        # later reads must not join a query that may have started before the write committed
+        note_flights.forget([*ids, *(("optlock", note_id) for note_id in ids)])
+        note_list_flights.forget_all()
+
+    async def _raise_not_written(
+        self,
+        db: AsyncSession,
+        note_id: uuid.UUID,
+        version: int | None,
+    ) -> NoReturn:
+        # a guarded write touched no row: the note is gone, or its optlock moved on
+        await db.rollback()
+        if version == ANY_VERSION:
+            # RFC 9110 13.1.1: If-Match: * fails when there is no current representation
+            raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Note does not exist")
+        if version is not None and await db.scalar(select(Note.id).where(_by_id(note_id))) is not None:
+            raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Note version does not match")
+
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Note not found")
+
+    async def bulk_create_notes(
+        self,
+        db: AsyncSession,
+        payloads: list[NoteCreateDTO],
+    ) -> list[NoteDTO]:
+        logger.info("bulk_create_notes: %s notes", len(payloads))
+
+        rows = [{"id": new_note_id(), "optlock": 1, "title": p.title, "content": p.content} for p in payloads]
+        return await self._insert_notes(db, rows)
+
+    async def _insert_notes(self, db: AsyncSession, rows: list[dict[str, Any]]) -> list[NoteDTO]:
+        # one multi-row INSERT and one commit, so a batch costs a single WAL flush
+        stmt = pg_insert(Note).values(rows).on_conflict_do_nothing().returning(*_NOTE_COLUMNS)
+        created = {r.id: NoteDTO.model_validate(r) for r in await db.execute(stmt)}
+        # rows with a preset created_at conflict when a retried batch was already committed, but unacknowledged
+        skipped = [row["id"] for row in rows if row["id"] not in created]
+        if skipped:
+            existing = await db.execute(select(*_NOTE_COLUMNS).where(_any_id(skipped)))
+            created.update({r.id: NoteDTO.model_validate(r) for r in existing})
+        await db.commit()
+        self._invalidate(created)
+
+        return [created[row["id"]] for row in rows]
+
+    async def enqueue_note(self, payload: NoteCreateDTO) -> tuple[uuid.UUID, asyncio.Future[NoteDTO]]:
+        """
+        Queue a create for the write-behind flusher. Returns the new note's id at once, and a future that
+        resolves with the note once its batch is committed. Raises 503 when the queue stays full.
+        """
+        logger.info("enqueue_note: title=%r", payload.title)
+
+        if not note_create_queue.running:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Write-behind is not running")
+
+        note_id = new_note_id()
+        # fixed here rather than by the database, so a retried batch conflicts with rows it already wrote
+        created_at = note_id_time(note_id)
+        row = {
+            "id": note_id,
+            "optlock": 1,
+            "title": payload.title,
+            "content": payload.content,
+            "created_at": created_at,
+        }
         try:
-            note = result.scalar_one()
-            await db.delete(note)
-            await db.commit()
+            return note_id, await note_create_queue.submit(row, settings.write_behind_enqueue_timeout_seconds)
 
-        except NoResultFound:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Note not found")
+        except QueueFullError:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many pending writes",
+                headers={"Retry-After": "1"},
+            ) from None
+
+    async def write_batch(self, rows: list[dict[str, Any]]) -> list[NoteDTO]:
+        logger.info("write_batch: %s notes", len(rows))
+
+        get_engine()
+        async with async_session_factory() as db:
+            return await self._insert_notes(db, rows)
+
+    async def bulk_update_notes(
+        self,
+        db: AsyncSession,
+        payloads: list[NoteBulkUpdateDTO],
+    ) -> list[NoteBulkResultDTO]:
+        logger.info("bulk_update_notes: %s notes", len(payloads))
+
+        ids = [p.id for p in payloads]
+        if len(set(ids)) != len(ids):
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_CONTENT, detail="Duplicate note ids")
+
+        changes = values(
+            column("id", Note.id.type),
+            column("title", Note.title.type),
+            column("content", Note.content.type),
+            column("set_title", Boolean()),
+            column("set_content", Boolean()),
+            column("version", Integer()),
+            name="changes",
+        ).data(
+            [
+                (p.id, p.title, p.content, p.title is not None, "content" in p.model_fields_set, p.version)
+                for p in payloads
+            ]
+        )
+        matched = Note.id == changes.c.id
+        window = _created_window(ids)
+        if window is not None:
+            matched = and_(matched, window)
+        stmt = (
+            update(Note)
+            .where(matched)
+            # an all-NULL VALUES column is typed text by Postgres, so pin it to the optlock type
+            .where(or_(changes.c.version.is_(None), Note.optlock == cast(changes.c.version, Integer)))
+            .values(
+                title=case((changes.c.set_title, changes.c.title), else_=Note.title),
+                content=case((changes.c.set_content, changes.c.content), else_=Note.content),
+                optlock=Note.optlock + 1,
+            )
+            .returning(*_NOTE_COLUMNS)
+            .execution_options(synchronize_session=False)
+        )
+        updated = {r.id: NoteDTO.model_validate(r) for r in await db.execute(stmt)}
+
+        # rows that were not updated either do not exist or failed the optlock check
+        missing = [i for i in ids if i not in updated]
+        conflicts = set()
+        if missing:
+            conflicts = set((await db.execute(select(Note.id).where(_any_id(missing)))).scalars())
+
+        await self._publish_invalidation(db, list(updated))
+        await db.commit()
+        self._invalidate(updated)
+
+        results = []
+        for note_id in ids:
+            if note_id in updated:
+                results.append(NoteBulkResultDTO(id=note_id, status=status.HTTP_200_OK, note=updated[note_id]))
+            elif note_id in conflicts:
+                results.append(NoteBulkResultDTO(id=note_id, status=status.HTTP_409_CONFLICT))
+            else:
+                results.append(NoteBulkResultDTO(id=note_id, status=status.HTTP_404_NOT_FOUND))
+        return results
+
+    async def bulk_delete_notes(
+        self,
+        db: AsyncSession,
+        note_ids: list[uuid.UUID],
+    ) -> list[NoteBulkResultDTO]:
+        logger.info("bulk_delete_notes: %s notes", len(note_ids))
+
+        result = await db.execute(
+            delete(Note).where(_any_id(note_ids)).returning(Note.id).execution_options(synchronize_session=False)
+        )
+        deleted = set(result.scalars())
+        await self._publish_invalidation(db, list(deleted))
+        await db.commit()
+        self._invalidate(deleted)
+
+        return [
+            NoteBulkResultDTO(
+                id=note_id,
+                status=status.HTTP_204_NO_CONTENT if note_id in deleted else status.HTTP_404_NOT_FOUND,
+            )
+            for note_id in note_ids
+        ]
+
+
+def _log_dropped_note(row: dict[str, Any], exc: Exception) -> None:
+    # the only trace of a note whose create was already acknowledged with 202
+    logger.error("Write-behind dropped note %s: %s", row["id"], exc)
+
+
+note_create_queue: WriteBehindQueue[dict[str, Any], NoteDTO] = WriteBehindQueue(
+    NoteService().write_batch,
+    max_size=settings.write_behind_queue_size,
+    max_batch=settings.write_behind_max_batch,
+    interval_seconds=settings.write_behind_flush_interval_seconds,
+    retries=settings.write_behind_retries,
+    retry_delay_seconds=settings.write_behind_retry_delay_seconds,
+    on_failure=_log_dropped_note,
+)
@@ -0,0 +1,68 @@
+"""
+Cold import time of the application, from `python -X importtime`, with the slowest imports it pulls in.
+
+Each sample runs in a fresh interpreter; the run fails when the median exceeds `--budget-ms`:
+
+    uv run python -m benchmarks.import_benchmark --samples 10 --budget-ms 1500
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from dataclasses import dataclass
+
+
+@dataclass
+class ImportSample:
+    total_us: int
+    # module -> (self time, cumulative time) in microseconds
+    modules: dict[str, tuple[int, int]]
+
+
+def sample(module: str = "app.main") -> ImportSample:
+    # PYTHONDONTWRITEBYTECODE is left alone so, like a deployed image, bytecode caches are used
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=os.environ | {"LOG_FILE": os.devnull},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+
+    return ImportSample(total_us=modules[module][1], modules=modules)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float)
+    args = parser.parse_args()
+
+    samples = [sample(args.module) for _ in range(args.samples)]
+    median_ms = statistics.median(s.total_us for s in samples) / 1000
+
+    last = samples[-1].modules
+    print(f"{args.module}: median {median_ms:.1f} ms over {args.samples} cold imports, {len(last)} modules")
+    print(f"{'self ms':>9} {'cumul ms':>9}  module")
+    for name, (self_us, cumulative_us) in sorted(last.items(), key=lambda item: -item[1][0])[: args.top]:
+        print(f"{self_us / 1000:9.1f} {cumulative_us / 1000:9.1f}  {name}")
+
+    if args.budget_ms is not None and median_ms > args.budget_ms:
+        print(f"over budget: {median_ms:.1f} ms > {args.budget_ms:.1f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,276 @@
+"""
+Drive every note endpoint with concurrent clients and compare RPS, latency percentiles and peak memory
+against a stored baseline.
+
+Migrates and seeds the notes table in `settings.database_url` up to `--rows` notes, so point it at a scratch
+database. By default the app runs in-process behind an ASGI transport, so a local Postgres is all it needs:
+
+    DATABASE_URL=postgresql+asyncpg://... uv run python -m benchmarks.load_benchmark --rows 100000 --save-baseline
+    DATABASE_URL=postgresql+asyncpg://... uv run python -m benchmarks.load_benchmark --rows 100000
+
+The second run exits non-zero when an endpoint's p95 grew, or its RPS dropped, by more than `--tolerance`, or
+when it failed more often than in the baseline; without a baseline, any failed request fails the run. Pass `--url`
+to load a running server instead; peak memory is then not reported.
+
+The committed benchmarks/baseline.json was recorded with the defaults against a local Postgres, so latency and RPS
+only compare on similar hardware. On another machine or CI runner, record a baseline from the base branch first
+with `--save-baseline --baseline <path>`, then run the branch under test with the same `--baseline`.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import resource
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from httpx import ASGITransport, AsyncClient, Response
+from sqlalchemy import text
+
+from app.core.db import dispose_engines, get_engine
+from app.main import app
+from benchmarks.search_benchmark import QUERIES, seed
+
+BASELINE = Path(__file__).with_name("baseline.json")
+BULK_SIZE = 50
+
+
+@dataclass
+class Result:
+    endpoint: str
+    requests: int
+    errors: int
+    rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    peak_rss_mb: float | None
+
+
+@dataclass
+class Endpoint:
+    name: str
+    call: Callable[[AsyncClient, int], Awaitable[Response]]
+    # expensive endpoints run a fraction of the requested load
+    share: float = 1.0
+
+
+def _percentile(samples: list[float], fraction: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def _reset_peak_rss() -> None:
+    # writing 5 to clear_refs resets VmHWM (Linux 4.0+), which gives a per-endpoint high-water mark;
+    # elsewhere the peak is the process lifetime maximum
+    with contextlib.suppress(OSError):
+        Path("/proc/self/clear_refs").write_text("5")
+
+
+def _peak_rss_mb() -> float:
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+
+    except OSError:
+        pass
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run_endpoint(
+    client: AsyncClient, endpoint: Endpoint, requests: int, concurrency: int, in_process: bool
+) -> Result:
+    total = max(1, int(requests * endpoint.share))
+    counter = iter(range(total))
+    latencies: list[float] = []
+    errors = 0
+
+    async def worker() -> None:
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            response = await endpoint.call(client, i)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    if in_process:
+        _reset_peak_rss()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return Result(
+        endpoint=endpoint.name,
+        requests=total,
+        errors=errors,
+        rps=total / elapsed,
+        p50_ms=_percentile(latencies, 0.50),
+        p95_ms=_percentile(latencies, 0.95),
+        p99_ms=_percentile(latencies, 0.99),
+        peak_rss_mb=_peak_rss_mb() if in_process else None,
+    )
+
+
+async def sample_ids(count: int) -> list[str]:
+    async with get_engine().connect() as conn:
+        rows = await conn.execute(text("SELECT id FROM notes LIMIT :count"), {"count": count})
+        return [str(row.id) for row in rows]
+
+
+def endpoints(ids: list[str], limit: int) -> list[Endpoint]:
+    created: list[str] = []
+    bulk_created: list[list[str]] = []
+    cursors: list[str] = []
+
+    def note_id(i: int) -> str:
+        return ids[i % len(ids)]
+
+    async def list_first(client: AsyncClient, i: int) -> Response:
+        response = await client.get("/api/v1/note", params={"limit": limit})
+        if not cursors and response.status_code == 200 and response.json()["next"]:
+            cursors.append(response.json()["next"])
+        return response
+
+    async def list_next(client: AsyncClient, i: int) -> Response:
+        return await client.get("/api/v1/note", params={"limit": limit, "cursor": cursors[0] if cursors else None})
+
+    async def search(client: AsyncClient, i: int) -> Response:
+        return await client.get("/api/v1/note/search", params={"q": QUERIES[i % len(QUERIES)], "limit": limit})
+
+    async def export(client: AsyncClient, i: int) -> Response:
+        return await client.get("/api/v1/note/export")
+
+    async def get(client: AsyncClient, i: int) -> Response:
+        return await client.get(f"/api/v1/note/{note_id(i)}")
+
+    async def create(client: AsyncClient, i: int) -> Response:
+        response = await client.post("/api/v1/note", json={"title": f"bench {i}", "content": "load benchmark"})
+        if response.status_code == 201:
+            created.append(response.json()["id"])
+        return response
+
+    async def update(client: AsyncClient, i: int) -> Response:
+        return await client.patch(f"/api/v1/note/{note_id(i)}", json={"content": f"updated {i}"})
+
+    async def delete(client: AsyncClient, i: int) -> Response:
+        return await client.delete(f"/api/v1/note/{created.pop() if created else uuid.uuid4()}")
+
+    async def bulk_create(client: AsyncClient, i: int) -> Response:
+        notes = [{"title": f"bench {i}.{j}", "content": "load benchmark"} for j in range(BULK_SIZE)]
+        response = await client.post("/api/v1/note/bulk", json=notes)
+        if response.status_code == 201:
+            bulk_created.append([note["id"] for note in response.json()])
+        return response
+
+    async def bulk_update(client: AsyncClient, i: int) -> Response:
+        notes = [{"id": note_id(i * BULK_SIZE + j), "content": f"bulk {i}"} for j in range(BULK_SIZE)]
+        return await client.patch("/api/v1/note/bulk", json=notes)
+
+    async def bulk_delete(client: AsyncClient, i: int) -> Response:
+        batch = bulk_created.pop() if bulk_created else [str(uuid.uuid4())]
+        return await client.request("DELETE", "/api/v1/note/bulk", json=batch)
+
+    # writes run after reads, and deletes after creates, so each phase removes what the previous one added
+    return [
+        Endpoint("list", list_first),
+        Endpoint("list_next", list_next),
+        Endpoint("search", search),
+        Endpoint("get", get),
+        Endpoint("export", export, share=0.005),
+        Endpoint("create", create),
+        Endpoint("update", update),
+        Endpoint("delete", delete),
+        Endpoint("bulk_create", bulk_create, share=0.1),
+        Endpoint("bulk_update", bulk_update, share=0.1),
+        Endpoint("bulk_delete", bulk_delete, share=0.1),
+    ]
+
+
+def compare(results: list[Result], baseline: dict[str, dict[str, float]], tolerance: float) -> list[str]:
+    regressions = []
+    for result in results:
+        previous = baseline.get(result.endpoint)
+        # an endpoint that fails fast would otherwise pass on its latency
+        error_rate = previous["errors"] / previous["requests"] if previous else 0.0
+        if result.errors > result.requests * error_rate:
+            before = f"{previous['errors']:.0f}/{previous['requests']:.0f}" if previous else "none"
+            regressions.append(f"{result.endpoint}: errors {before} -> {result.errors}/{result.requests}")
+        if previous is None:
+            continue
+        if result.p95_ms > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{result.endpoint}: p95 {previous['p95_ms']:.2f} -> {result.p95_ms:.2f} ms")
+        if result.rps < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{result.endpoint}: rps {previous['rps']:.0f} -> {result.rps:.0f}")
+    return regressions
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per endpoint, before its share")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--only", nargs="*", help="endpoint names to run")
+    parser.add_argument("--url", help="load a running server instead of the in-process app")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    await asyncio.to_thread(command.upgrade, Config("alembic.ini"), "head")
+    await seed(args.rows)
+    ids = await sample_ids(max(1000, BULK_SIZE))
+
+    lifespan: contextlib.AbstractAsyncContextManager[object] = contextlib.nullcontext()
+    if args.url:
+        client = AsyncClient(base_url=args.url, timeout=None)
+    else:
+        client = AsyncClient(transport=ASGITransport(app=app), base_url="http://bench", timeout=None)
+        # ASGITransport sends no lifespan events; run it so warm-up and background workers match a server
+        lifespan = app.router.lifespan_context(app)
+
+    results = []
+    async with lifespan, client:
+        for endpoint in endpoints(ids, args.limit):
+            if args.only and endpoint.name not in args.only:
+                continue
+            result = await run_endpoint(client, endpoint, args.requests, args.concurrency, not args.url)
+            results.append(result)
+            peak = f"{result.peak_rss_mb:8.1f} MiB" if result.peak_rss_mb is not None else "       n/a"
+            print(
+                f"{result.endpoint:<12} n={result.requests:<6} err={result.errors:<4} rps={result.rps:8.1f}  "
+                f"p50={result.p50_ms:8.2f}  p95={result.p95_ms:8.2f}  p99={result.p99_ms:8.2f} ms  peak={peak}"
+            )
+    await dispose_engines()
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps({r.endpoint: asdict(r) for r in results}, indent=2) + "\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    baseline = {}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+    else:
+        print(f"no baseline at {args.baseline}; rerun with --save-baseline to record one")
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))
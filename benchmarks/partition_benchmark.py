@@ -0,0 +1,171 @@
+"""
+Compare list and point-lookup latency on a plain notes table and on one partitioned by month of created_at.
+
+Builds both tables in a `partition_benchmark` schema of `settings.database_url`, with `--rows` notes created over
+the last `--months` months, so point it at a scratch database. Tables already seeded to `--rows` are reused:
+
+    DATABASE_URL=postgresql+asyncpg://... uv run python -m benchmarks.partition_benchmark --rows 10000000
+    DATABASE_URL=postgresql+asyncpg://... uv run python -m benchmarks.partition_benchmark --rows 100000000
+
+p50 on PG 16, one CPU and 5 GB of RAM, over 36 months:
+
+    rows    point lookup         first page           next page
+            plain  partitioned   plain  partitioned   plain  partitioned
+    10M     0.24   0.48 ms       0.54   1.41 ms       1.08   2.10 ms
+    100M    0.47   0.67 ms       0.57   1.48 ms       3.21   5.52 ms
+
+Partitioning is slower on every path at both sizes, mostly from executor startup across partitions, and the
+list_notes sort still merges every partition's updated_at index. It pays off in maintenance instead: vacuum and
+index rebuilds work one month at a time, and expired months are detached rather than deleted.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import UTC, datetime
+from typing import Any
+
+from sqlalchemy import text
+
+from app.core.db import dispose_engines, get_engine
+from app.core.partitions import add_months, month_start
+from app.models.note_model import ID_CLOCK_SKEW, note_id_time
+
+SCHEMA = "partition_benchmark"
+TABLES = {"plain": f"{SCHEMA}.notes_plain", "partitioned": f"{SCHEMA}.notes_partitioned"}
+SEED_BATCH = 1_000_000
+SAMPLE_IDS = 1000
+PAGE_SIZE = 50
+
+COLUMNS = """
+    id uuid NOT NULL,
+    optlock integer NOT NULL,
+    title varchar(255) NOT NULL,
+    content text,
+    created_at timestamptz NOT NULL,
+    updated_at timestamptz NOT NULL
+"""
+
+# UUIDv7 ids carrying created_at, like the ones new_note_id() hands out
+SEED = """
+    WITH batch AS (
+        SELECT CAST(
+                   lpad(to_hex(CAST(floor(extract(epoch FROM created_at) * 1000) AS bigint)), 12, '0') || '7'
+                   || substr(md5(random()::text), 1, 3) || '8' || substr(md5(random()::text), 1, 15) AS uuid
+               ) AS id,
+               1 AS optlock, 'note ' || i AS title, 'content of note ' || i AS content,
+               created_at, created_at + (now() - created_at) * random() * random() AS updated_at
+          FROM generate_series(CAST(:start AS bigint), CAST(:stop AS bigint) - 1) AS i,
+               LATERAL (SELECT CAST(:oldest AS timestamptz) + (now() - CAST(:oldest AS timestamptz)) * random()
+                         WHERE i >= 0) AS t(created_at)
+    ), plain AS (
+        INSERT INTO partition_benchmark.notes_plain SELECT * FROM batch
+    )
+    INSERT INTO partition_benchmark.notes_partitioned SELECT * FROM batch
+"""
+
+POINT_LOOKUP = """
+    SELECT id, title, content, created_at, updated_at FROM {table}
+     WHERE id = :id AND created_at BETWEEN :created_from AND :created_to
+"""
+FIRST_PAGE = "SELECT id, title, updated_at FROM {table} ORDER BY updated_at DESC, id DESC LIMIT :limit"
+# the shape NoteService.list_notes sends for later pages, with its created_at bound
+NEXT_PAGE = """
+    SELECT id, title, updated_at FROM {table}
+     WHERE (updated_at, id) < (:updated_at, :id) AND created_at <= :updated_at
+     ORDER BY updated_at DESC, id DESC LIMIT :limit
+"""
+
+
+async def create_tables(months: int) -> datetime:
+    oldest = add_months(month_start(datetime.now(UTC)), -months)
+    async with get_engine().begin() as conn:
+        await conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA}"))
+        await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {TABLES['plain']} ({COLUMNS})"))
+        await conn.execute(
+            text(f"CREATE TABLE IF NOT EXISTS {TABLES['partitioned']} ({COLUMNS}) PARTITION BY RANGE (created_at)")
+        )
+        for offset in range(months + 2):
+            start = add_months(oldest, offset)
+            await conn.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {TABLES['partitioned']}_p{start:%Y%m} "
+                    f"PARTITION OF {TABLES['partitioned']} "
+                    f"FOR VALUES FROM ('{start.isoformat()}') TO ('{add_months(start, 1).isoformat()}')"
+                )
+            )
+    return oldest
+
+
+async def seed(rows: int, months: int) -> None:
+    oldest = await create_tables(months)
+    async with get_engine().begin() as conn:
+        existing = await conn.scalar(text(f"SELECT count(*) FROM {TABLES['plain']}"))
+
+    for start in range(existing or 0, rows, SEED_BATCH):
+        stop = min(start + SEED_BATCH, rows)
+        async with get_engine().begin() as conn:
+            await conn.execute(text(SEED), {"start": start, "stop": stop, "oldest": oldest})
+        print(f"seeded {stop:,} / {rows:,}")
+
+    # built once the rows are in, which is much faster than maintaining them during the load
+    async with get_engine().begin() as conn:
+        for name, primary_key in (("plain", "id"), ("partitioned", "id, created_at")):
+            table = TABLES[name]
+            await conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS notes_{name}_pkey ON {table} ({primary_key})"))
+            await conn.execute(
+                text(f"CREATE INDEX IF NOT EXISTS notes_{name}_updated_at_id ON {table} (updated_at, id)")
+            )
+
+    async with get_engine().connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text(f"VACUUM ANALYZE {TABLES['plain']}, {TABLES['partitioned']}"))
+
+
+async def measure(label: str, query: str, params: list[dict[str, Any]]) -> None:
+    for name, table in TABLES.items():
+        statement = text(query.format(table=table))
+        timings = []
+        async with get_engine().connect() as conn:
+            for values in params:
+                start = time.perf_counter()
+                (await conn.execute(statement, values)).all()
+                timings.append((time.perf_counter() - start) * 1000)
+
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(f"{label:<12} {name:<12} p50={statistics.median(timings):9.3f} ms  p95={p95:9.3f} ms")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--months", type=int, default=36)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    await seed(args.rows, args.months)
+
+    async with get_engine().connect() as conn:
+        sample = (
+            await conn.execute(
+                text(f"SELECT id, updated_at FROM {TABLES['plain']} TABLESAMPLE SYSTEM (1) LIMIT {SAMPLE_IDS}")
+            )
+        ).all()
+
+    lookups = []
+    for row in sample[: args.repeat]:
+        created = note_id_time(row.id)
+        assert created is not None
+        lookups.append({"id": row.id, "created_from": created - ID_CLOCK_SKEW, "created_to": created + ID_CLOCK_SKEW})
+    pages = [{"limit": PAGE_SIZE + 1, "updated_at": row.updated_at, "id": row.id} for row in sample[: args.repeat]]
+
+    await measure("point lookup", POINT_LOOKUP, lookups)
+    await measure("first page", FIRST_PAGE, [{"limit": PAGE_SIZE + 1}] * args.repeat)
+    await measure("next page", NEXT_PAGE, pages)
+    await dispose_engines()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+"""
+Compare full-text search against ILIKE scanning on a seeded notes table.
+
+Seeds the notes table in `settings.database_url` up to `--rows` notes, so point it at a scratch database:
+
+    DATABASE_URL=postgresql+asyncpg://... uv run python -m benchmarks.search_benchmark --rows 1000000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from collections.abc import Awaitable, Callable
+
+from sqlalchemy import func, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.db import async_session_factory, dispose_engines, get_engine
+from app.models.note_model import Note
+from app.service.note_service import NoteService
+
+WORDS = [
+    "apple", "budget", "meeting", "travel", "invoice", "recipe", "garden", "project", "deadline", "review",
+    "holiday", "dentist", "groceries", "release", "migration", "database", "birthday", "workout", "report", "ticket",
+]  # fmt: skip
+
+# every note gets one topic word in its title and one in its content, padded with filler tokens "w0".."w4999"
+VOCABULARY = 5000
+SEED_BATCH = 100_000
+QUERIES = ["apple", "travel budget", "w4242", "w17 w23", "quarterly report"]
+
+
+async def seed(rows: int) -> None:
+    async with get_engine().begin() as conn:
+        existing = await conn.scalar(select(func.count()).select_from(Note))
+
+    for start in range(existing or 0, rows, SEED_BATCH):
+        stop = min(start + SEED_BATCH, rows)
+        async with get_engine().begin() as conn:
+            await conn.execute(
+                text(
+                    """
+                    WITH words AS (SELECT CAST(:words AS text[]) AS w)
+                    INSERT INTO notes (id, optlock, title, content)
+                    SELECT gen_random_uuid(), 1,
+                           'note ' || i || ' ' || w[1 + floor(random() * cardinality(w))::int],
+                           w[1 + floor(random() * cardinality(w))::int] || ' ' || array_to_string(ARRAY(
+                               SELECT 'w' || floor(random() * :vocabulary)::int
+                                 FROM generate_series(1, 60) WHERE i > 0
+                           ), ' ')
+                      FROM words, generate_series(CAST(:start AS int), CAST(:stop AS int) - 1) AS i
+                    """
+                ),
+                {"words": WORDS, "vocabulary": VOCABULARY, "start": start, "stop": stop},
+            )
+        print(f"seeded {stop:,} / {rows:,}")
+
+    async with get_engine().begin() as conn:
+        await conn.execute(text("ANALYZE notes"))
+
+
+async def measure(label: str, repeat: int, run: Callable[[AsyncSession, str], Awaitable[object]]) -> None:
+    for query in QUERIES:
+        timings = []
+        for _ in range(repeat):
+            async with async_session_factory() as db:
+                start = time.perf_counter()
+                await run(db, query)
+                timings.append((time.perf_counter() - start) * 1000)
+
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(f"{label:<8} {query:<20} p50={statistics.median(timings):9.2f} ms  p95={p95:9.2f} ms")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    await seed(args.rows)
+    service = NoteService()
+
+    async def fts(db: AsyncSession, query: str) -> object:
+        return await service.search_notes(db, query, args.limit)
+
+    async def ilike(db: AsyncSession, query: str) -> object:
+        pattern = f"%{query}%"
+        stmt = (
+            select(Note.id, Note.title, Note.updated_at)
+            .where(or_(Note.title.ilike(pattern), Note.content.ilike(pattern)))
+            .order_by(Note.updated_at.desc())
+            .limit(args.limit)
+        )
+        return (await db.execute(stmt)).all()
+
+    await measure("fts", args.repeat, fts)
+    await measure("ilike", args.repeat, ilike)
+    await dispose_engines()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+"""
+Per-request CPU of the note list route with and without fast_json_responses.
+
+The service is replaced by an in-memory page of `--items` summaries, so the numbers isolate validation,
+serialization and framework overhead from database time:
+
+    uv run python -m benchmarks.serialization_benchmark --items 1000
+"""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+import uuid
+from datetime import UTC, datetime
+from types import SimpleNamespace
+
+from httpx import ASGITransport, AsyncClient
+
+from app.api.routes import note_router
+from app.core.settings import settings
+from app.main import app
+from app.schemas.note_schema import NotePageDTO, note_summary_list_adapter
+
+
+async def measure(client: AsyncClient, requests: int) -> float:
+    await client.get("/api/v1/note")
+
+    start = time.process_time()
+    for _ in range(requests):
+        response = await client.get("/api/v1/note")
+        response.raise_for_status()
+    return (time.process_time() - start) / requests * 1000
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    now = datetime.now(UTC)
+    rows = [SimpleNamespace(id=uuid.uuid4(), title=f"Note {i}", updated_at=now) for i in range(args.items)]
+
+    async def list_notes(*_: object) -> NotePageDTO:
+        return NotePageDTO(items=note_summary_list_adapter.validate_python(rows, from_attributes=True))
+
+    note_router.note_service.list_notes = list_notes  # type: ignore[method-assign,assignment]
+
+    transport = ASGITransport(app=app)
+    timings: dict[bool, list[float]] = {False: [], True: []}
+    async with AsyncClient(transport=transport, base_url="http://bench") as client:
+        # alternate modes so warm-up and drift hit both equally
+        for _ in range(args.rounds):
+            for mode, samples in timings.items():
+                settings.fast_json_responses = mode
+                samples.append(await measure(client, args.requests))
+
+    default = statistics.median(timings[False])
+    fast = statistics.median(timings[True])
+
+    print(f"{args.items} summaries per response, {args.requests} requests")
+    print(f"response_model   {default:8.3f} ms CPU/request")
+    print(f"fast_json        {fast:8.3f} ms CPU/request  ({(1 - fast / default) * 100:.0f}% less)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+"""
+Startup time, throughput scaling and shutdown time of the `python -m app` server across worker counts.
+
+Each run starts the server on a free local port with APP_WORKERS set, times how long it takes to answer
+`--path`, loads it from `--clients` client processes for `--duration` seconds, then sends SIGTERM and times
+the drain. Uses `settings.database_url` when `--path` touches the database:
+
+    uv run python -m benchmarks.server_benchmark --workers 1 2 4 --path /api/ping
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+
+from app.server import worker_count
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+def wait_ready(url: str, timeout: float) -> float:
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            if httpx.get(url).status_code < 500:
+                return time.perf_counter() - start
+
+        except httpx.TransportError:
+            pass
+
+        time.sleep(0.01)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+async def _load(url: str, duration: float, concurrency: int) -> int:
+    done = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits) as client:
+
+        async def worker() -> None:
+            nonlocal done
+            while time.perf_counter() < deadline:
+                (await client.get(url)).raise_for_status()
+                done += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return done
+
+
+def load(url: str, duration: float, concurrency: int) -> int:
+    return asyncio.run(_load(url, duration, concurrency))
+
+
+def run(workers: int, args: argparse.Namespace) -> tuple[float, float, float]:
+    port = free_port()
+    env = os.environ | {"APP_WORKERS": str(workers), "APP_HOST": "127.0.0.1", "APP_PORT": str(port)}
+    server = subprocess.Popen(  # noqa: S603
+        [sys.executable, "-m", "app"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{port}{args.path}"
+
+    try:
+        startup = wait_ready(url, timeout=60)
+        with ProcessPoolExecutor(args.clients) as pool:
+            futures = [pool.submit(load, url, args.duration, args.concurrency) for _ in range(args.clients)]
+            rps = sum(future.result() for future in futures) / args.duration
+
+    finally:
+        start = time.perf_counter()
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=120)
+        shutdown = time.perf_counter() - start
+
+    return startup, rps, shutdown
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, worker_count()}))
+    parser.add_argument("--path", default="/api/ping")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--clients", type=int, default=os.process_cpu_count() or 1, help="load generator processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="connections per client process")
+    args = parser.parse_args()
+
+    single: float | None = None
+    for workers in args.workers:
+        startup, rps, shutdown = run(workers, args)
+        single = single or rps / workers
+        print(
+            f"workers={workers:<3} startup={startup * 1000:8.1f} ms  rps={rps:10.1f}  "
+            f"scaling={rps / (single * workers):6.0%}  shutdown={shutdown * 1000:8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Revision ID: a3c9e5f27b18
+Revises: d72abd1c4e91
+Create Date: 2026-10-18 16:05:42.518305
+Message: notes change feed
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision: str = "a3c9e5f27b18"
+down_revision: str | Sequence[str] | None = "d72abd1c4e91"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """
+    Upgrade schema.
+    """
+    op.create_table(
+        "note_tombstones",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("deleted_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_note_tombstones_deleted_at", "note_tombstones", ["deleted_at"], unique=False)
+
+    # the payload matches NoteChangeDTO, so app.core.change_feed forwards it to clients without re-serializing
+    op.execute(
+        """
+        CREATE FUNCTION notes_change_feed() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                INSERT INTO note_tombstones (id) VALUES (OLD.id)
+                    ON CONFLICT (id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+                PERFORM pg_notify('note_changes', json_build_object(
+                    'op', 'deleted', 'id', OLD.id, 'updatedAt', now(), 'version', NULL
+                )::text);
+                RETURN OLD;
+            END IF;
+
+            PERFORM pg_notify('note_changes', json_build_object(
+                'op', CASE TG_OP WHEN 'INSERT' THEN 'created' ELSE 'updated' END,
+                'id', NEW.id, 'updatedAt', NEW.updated_at, 'version', NEW.optlock
+            )::text);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        "CREATE TRIGGER notes_change_feed AFTER INSERT OR UPDATE OR DELETE ON notes "
+        "FOR EACH ROW EXECUTE FUNCTION notes_change_feed()"
+    )
+
+
+def downgrade() -> None:
+    """
+    Downgrade schema.
+    """
+    op.execute("DROP TRIGGER IF EXISTS notes_change_feed ON notes")
+    op.execute("DROP FUNCTION IF EXISTS notes_change_feed()")
+    op.drop_index("ix_note_tombstones_deleted_at", table_name="note_tombstones")
+    op.drop_table("note_tombstones")
@@ -0,0 +1,97 @@
+"""
+Revision ID: b7d2f4a9c3e1
+Revises: a3c9e5f27b18
+Create Date: 2026-10-18 18:12:27.604158
+Message: notes content tiering
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "b7d2f4a9c3e1"
+down_revision: str | Sequence[str] | None = "a3c9e5f27b18"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+# rows wider than this get their content compressed and moved out of line, into the TOAST table (minimum 128)
+TOAST_TUPLE_TARGET = 256
+BACKFILL_BATCH_SIZE = 1000
+
+NOTIFY_CHANGE = """
+            PERFORM pg_notify('note_changes', json_build_object(
+                'op', CASE TG_OP WHEN 'INSERT' THEN 'created' ELSE 'updated' END,
+                'id', NEW.id, 'updatedAt', NEW.updated_at, 'version', NEW.optlock
+            )::text);
+            RETURN NEW;
+"""
+
+
+def _change_feed_function(skip_unchanged: bool) -> str:
+    # the backfill rewrites rows without changing them, which must not reach change feed clients
+    unchanged = "IF TG_OP = 'UPDATE' AND NEW IS NOT DISTINCT FROM OLD THEN RETURN NEW; END IF;"
+    return f"""
+        CREATE OR REPLACE FUNCTION notes_change_feed() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                INSERT INTO note_tombstones (id) VALUES (OLD.id)
+                    ON CONFLICT (id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+                PERFORM pg_notify('note_changes', json_build_object(
+                    'op', 'deleted', 'id', OLD.id, 'updatedAt', now(), 'version', NULL
+                )::text);
+                RETURN OLD;
+            END IF;
+            {unchanged if skip_unchanged else ""}
+{NOTIFY_CHANGE}
+        END;
+        $$ LANGUAGE plpgsql
+        """
+
+
+def upgrade() -> None:
+    """
+    Upgrade schema.
+    """
+    bind = op.get_bind()
+    op.execute(_change_feed_function(skip_unchanged=True))
+
+    # lz4 compresses and decompresses several times faster than the default pglz; it needs a server built with it
+    lz4 = bind.scalar(sa.text("SELECT 'lz4' = ANY(enumvals) FROM pg_settings WHERE name = 'default_toast_compression'"))
+    if lz4:
+        op.execute("ALTER TABLE notes ALTER COLUMN content SET COMPRESSION lz4")
+    op.execute(f"ALTER TABLE notes SET (toast_tuple_target = {TOAST_TUPLE_TARGET})")
+
+    # storage settings only apply to values written from now on, so rewrite existing bodies in small batches
+    with op.get_context().autocommit_block():
+        last_id = None
+        while True:
+            last_id = bind.scalar(
+                sa.text(
+                    """
+                    WITH batch AS (
+                        SELECT id FROM notes
+                        WHERE (CAST(:last_id AS uuid) IS NULL OR id > CAST(:last_id AS uuid))
+                            AND pg_column_size(content) > :target
+                        ORDER BY id
+                        LIMIT :batch_size
+                    ), rewritten AS (
+                        UPDATE notes SET content = content || '' FROM batch WHERE notes.id = batch.id
+                        RETURNING notes.id
+                    )
+                    SELECT max(id::text) FROM rewritten
+                    """
+                ),
+                {"last_id": last_id, "target": TOAST_TUPLE_TARGET, "batch_size": BACKFILL_BATCH_SIZE},
+            )
+            if last_id is None:
+                break
+
+
+def downgrade() -> None:
+    """
+    Downgrade schema.
+    """
+    op.execute("ALTER TABLE notes RESET (toast_tuple_target)")
+    op.execute("ALTER TABLE notes ALTER COLUMN content SET COMPRESSION DEFAULT")
+    op.execute(_change_feed_function(skip_unchanged=False))
@@ -0,0 +1,41 @@
+"""
+Revision ID: c577b77e04ba
+Revises: d5ba7a44fec4
+Create Date: 2026-10-18 09:12:31.418204
+Message: notes updated_at index
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+revision: str = "c577b77e04ba"
+down_revision: str | Sequence[str] | None = "d5ba7a44fec4"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """
+    Upgrade schema.
+    """
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_notes_updated_at_id",
+            "notes",
+            ["updated_at", "id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """
+    Downgrade schema.
+    """
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_notes_updated_at_id",
+            table_name="notes",
+            postgresql_concurrently=True,
+        )
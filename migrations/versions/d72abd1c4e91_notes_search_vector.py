@@ -0,0 +1,69 @@
+"""
+Revision ID: d72abd1c4e91
+Revises: c577b77e04ba
+Create Date: 2026-10-18 11:40:05.271839
+Message: notes search vector
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision: str = "d72abd1c4e91"
+down_revision: str | Sequence[str] | None = "c577b77e04ba"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """
+    Upgrade schema.
+    """
+    op.add_column(
+        "notes",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed(
+                "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+                "setweight(to_tsvector('english', coalesce(content, '')), 'B')",
+                persisted=True,
+            ),
+            nullable=True,
+        ),
+    )
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_notes_search_vector",
+            "notes",
+            ["search_vector"],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+        )
+
+        # trigram matching on titles is optional, pg_trgm is not shipped with every postgres build
+        available = op.get_bind().scalar(sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"))
+        if available:
+            op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            op.execute(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_notes_title_trgm ON notes USING gin (title gin_trgm_ops)"
+            )
+
+
+def downgrade() -> None:
+    """
+    Downgrade schema.
+    """
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_notes_title_trgm")
+        op.drop_index(
+            "ix_notes_search_vector",
+            table_name="notes",
+            postgresql_concurrently=True,
+        )
+
+    op.drop_column("notes", "search_vector")
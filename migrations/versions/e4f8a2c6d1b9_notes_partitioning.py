@@ -0,0 +1,108 @@
+"""
+Revision ID: e4f8a2c6d1b9
+Revises: b7d2f4a9c3e1
+Create Date: 2026-10-18 19:36:10.284519
+Message: notes partitioning
+"""
+
+from collections.abc import Sequence
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "e4f8a2c6d1b9"
+down_revision: str | Sequence[str] | None = "b7d2f4a9c3e1"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+# monthly partitions created for the months after the current one; app startup and app.maintenance keep extending them
+PREMAKE_MONTHS = 3
+TOAST_TUPLE_TARGET = 256
+
+CHANGE_FEED_TRIGGER = (
+    "CREATE TRIGGER notes_change_feed AFTER INSERT OR UPDATE OR DELETE ON notes "
+    "FOR EACH ROW EXECUTE FUNCTION notes_change_feed()"
+)
+# the columns, defaults, generated search vector and storage of the existing table, without its keys and indexes
+LIKE_NOTES = "INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING COMPRESSION INCLUDING STORAGE"
+
+
+def _next_month(moment: datetime) -> datetime:
+    return (moment.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def upgrade() -> None:
+    """
+    Upgrade schema.
+
+    Rows are not copied: the existing table becomes the notes_legacy partition, holding everything created
+    before the start of next month, and new months get partitions of their own. On a large table, build the
+    notes_legacy_pkey index on notes (id, created_at) with CREATE UNIQUE INDEX CONCURRENTLY first, so this
+    migration only has to validate the created_at bound while it holds its lock.
+
+    This is for maintenance, not read latency: lookups and list pages are slower than on the plain table at
+    10M and 100M rows (see benchmarks/partition_benchmark.py).
+    """
+    bind = op.get_bind()
+    cutover: datetime = bind.scalar(sa.text("SELECT date_trunc('month', now(), 'UTC') + interval '1 month'"))
+
+    op.execute("DROP TRIGGER notes_change_feed ON notes")
+    op.execute("ALTER TABLE notes RENAME TO notes_legacy")
+    op.execute("ALTER INDEX ix_notes_updated_at_id RENAME TO notes_legacy_updated_at_id_idx")
+    op.execute("ALTER INDEX ix_notes_search_vector RENAME TO notes_legacy_search_vector_idx")
+    # swapped for a primary key that includes created_at, which ATTACH adopts as the partition's share of the parent's
+    op.execute("CREATE UNIQUE INDEX IF NOT EXISTS notes_legacy_pkey ON notes_legacy (id, created_at)")
+    op.execute("ALTER TABLE notes_legacy DROP CONSTRAINT notes_pkey")
+    op.execute("ALTER TABLE notes_legacy ADD CONSTRAINT notes_legacy_pkey PRIMARY KEY USING INDEX notes_legacy_pkey")
+
+    # the primary key of a partitioned table has to include the partition key
+    op.execute(f"CREATE TABLE notes (LIKE notes_legacy {LIKE_NOTES}) PARTITION BY RANGE (created_at)")
+    op.execute("ALTER TABLE notes ADD CONSTRAINT notes_pkey PRIMARY KEY (id, created_at)")
+    op.create_index("ix_notes_updated_at_id", "notes", ["updated_at", "id"], unique=False)
+    op.create_index("ix_notes_search_vector", "notes", ["search_vector"], unique=False, postgresql_using="gin")
+
+    # matching indexes and a constraint implying the bound let ATTACH adopt the table without rebuilding or scanning
+    op.execute(
+        f"ALTER TABLE notes_legacy ADD CONSTRAINT notes_legacy_created_at_check "
+        f"CHECK (created_at < '{cutover.isoformat()}')"
+    )
+    op.execute(
+        f"ALTER TABLE notes ATTACH PARTITION notes_legacy FOR VALUES FROM (MINVALUE) TO ('{cutover.isoformat()}')"
+    )
+    op.execute("ALTER TABLE notes_legacy DROP CONSTRAINT notes_legacy_created_at_check")
+
+    start = cutover
+    for _ in range(PREMAKE_MONTHS):
+        end = _next_month(start)
+        op.execute(
+            f"CREATE TABLE notes_p{start:%Y%m} PARTITION OF notes "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}') "
+            f"WITH (toast_tuple_target = {TOAST_TUPLE_TARGET})"
+        )
+        start = end
+
+    # created on the parent, the trigger is cloned onto every partition, present and future
+    op.execute(CHANGE_FEED_TRIGGER)
+
+
+def downgrade() -> None:
+    """
+    Downgrade schema.
+
+    Copies every attached partition back into a single table. Partitions detached since the upgrade are left
+    as they are.
+    """
+    op.execute("DROP TRIGGER notes_change_feed ON notes")
+    op.execute(f"CREATE TABLE notes_unpartitioned (LIKE notes {LIKE_NOTES})")
+    op.execute(
+        "INSERT INTO notes_unpartitioned (id, optlock, title, content, created_at, updated_at) "
+        "SELECT id, optlock, title, content, created_at, updated_at FROM notes"
+    )
+    op.execute("DROP TABLE notes")
+    op.execute("ALTER TABLE notes_unpartitioned RENAME TO notes")
+    op.execute("ALTER TABLE notes ADD CONSTRAINT notes_pkey PRIMARY KEY (id)")
+    op.create_index("ix_notes_updated_at_id", "notes", ["updated_at", "id"], unique=False)
+    op.create_index("ix_notes_search_vector", "notes", ["search_vector"], unique=False, postgresql_using="gin")
+    op.execute(f"ALTER TABLE notes SET (toast_tuple_target = {TOAST_TUPLE_TARGET})")
+    op.execute(CHANGE_FEED_TRIGGER)
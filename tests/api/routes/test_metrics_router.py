@@ -0,0 +1,22 @@
+from fastapi.testclient import TestClient
+
+
+def test_metrics(client: TestClient) -> None:
+    response = client.get("/api/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE db_pool_in_use gauge" in response.text
+    assert 'db_pool_checkouts_total{engine="primary"} ' in response.text
+
+
+def test_metrics_records_routes(client: TestClient) -> None:
+    client.get("/api/ping")
+    client.get("/api/missing")
+
+    text = client.get("/api/metrics").text
+
+    assert 'http_requests_total{method="GET",route="/api/ping",status="200"}' in text
+    assert 'http_requests_total{method="GET",route="<unmatched>",status="404"}' in text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/api/ping",le="+Inf"}' in text
+    assert 'http_response_size_bytes_sum{method="GET",route="/api/ping"}' in text
+    assert "# TYPE http_requests_in_flight gauge" in text
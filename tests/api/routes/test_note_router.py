@@ -1,10 +1,21 @@
+import asyncio
+import json
+import uuid
 from collections.abc import AsyncGenerator
 
 import pytest
 import pytest_asyncio
+from fastapi.testclient import TestClient
 from httpx import ASGITransport, AsyncClient
+from starlette.websockets import WebSocketDisconnect
 
+from app.core.cache import note_cache
+from app.core.db import LAST_WRITE_COOKIE, LAST_WRITE_HEADER
+from app.core.settings import settings
+from app.core.singleflight import note_flights
 from app.main import app
+from app.models.note_model import new_note_id, note_id_time
+from app.service.note_service import NoteService, note_create_queue
 
 
 @pytest_asyncio.fixture
@@ -20,13 +31,139 @@ async def test_note_listing(client: AsyncClient) -> None:
 
     assert response.status_code == 200
     data = response.json()
-    assert len(data) == 3
-    ids = [item["id"] for item in data]
+    assert len(data["items"]) == 3
+    assert data["next"] is None
+    ids = [item["id"] for item in data["items"]]
     assert "3282249b-19ee-4c5e-9be2-b9f714610aa6" in ids
     assert "1d7539f9-e9b7-4a06-9e6c-d5d6cf74d87a" in ids
     assert "e969ffd7-b4ce-47e1-8f43-8811ae576392" in ids
 
 
+@pytest.mark.asyncio
+async def test_note_listing_paginated(client: AsyncClient) -> None:
+    response = await client.get("/api/v1/note", params={"limit": 2})
+
+    assert response.status_code == 200
+    first = response.json()
+    assert len(first["items"]) == 2
+    assert first["next"]
+
+    response = await client.get("/api/v1/note", params={"limit": 2, "cursor": first["next"]})
+
+    assert response.status_code == 200
+    second = response.json()
+    assert len(second["items"]) == 1
+    assert second["next"] is None
+    ids = {item["id"] for item in first["items"] + second["items"]}
+    assert len(ids) == 3
+
+
+@pytest.mark.asyncio
+async def test_note_listing_invalid_cursor(client: AsyncClient) -> None:
+    response = await client.get("/api/v1/note", params={"cursor": "not-a-cursor"})
+
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_note_search(client: AsyncClient) -> None:
+    await client.patch(
+        "/api/v1/note/1d7539f9-e9b7-4a06-9e6c-d5d6cf74d87a",
+        json={"title": "Groceries", "content": "Buy apples and oranges before the weekend"},
+    )
+    await client.patch(
+        "/api/v1/note/e969ffd7-b4ce-47e1-8f43-8811ae576392",
+        json={"title": "Apple pie recipe"},
+    )
+
+    response = await client.get("/api/v1/note/search", params={"q": "apples"})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [item["id"] for item in data["items"]] == [
+        "e969ffd7-b4ce-47e1-8f43-8811ae576392",
+        "1d7539f9-e9b7-4a06-9e6c-d5d6cf74d87a",
+    ]
+    assert "<mark>apples</mark>" in data["items"][1]["snippet"]
+    assert data["next"] is None
+
+
+@pytest.mark.asyncio
+async def test_note_search_paginated(client: AsyncClient) -> None:
+    response = await client.get("/api/v1/note/search", params={"q": "content", "limit": 2})
+
+    assert response.status_code == 200
+    first = response.json()
+    assert len(first["items"]) == 2
+
+    response = await client.get("/api/v1/note/search", params={"q": "content", "limit": 2, "cursor": first["next"]})
+
+    assert response.status_code == 200
+    second = response.json()
+    assert len(second["items"]) == 1
+    assert second["next"] is None
+
+
+@pytest.mark.asyncio
+async def test_note_export_ndjson(client: AsyncClient) -> None:
+    response = await client.get("/api/v1/note/export")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 3
+    assert all("content" not in line for line in lines)
+
+
+@pytest.mark.asyncio
+async def test_note_export_json_full(client: AsyncClient) -> None:
+    response = await client.get("/api/v1/note/export", params={"format": "json", "full": True})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) == 3
+    assert {item["content"] for item in data} == {"Content 1", "Content 2", "Content 3"}
+
+
+@pytest.mark.asyncio
+async def test_note_export_filtered(client: AsyncClient) -> None:
+    response = await client.get(
+        "/api/v1/note/export",
+        params={"format": "json", "updated_since": "2999-01-01T00:00:00Z"},
+    )
+
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+@pytest.mark.asyncio
+async def test_note_listing_fast_json(client: AsyncClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    expected = await client.get("/api/v1/note")
+    monkeypatch.setattr(settings, "fast_json_responses", True)
+
+    response = await client.get("/api/v1/note")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.headers["etag"] == expected.headers["etag"]
+    assert response.json() == expected.json()
+
+
+@pytest.mark.asyncio
+async def test_note_creation_fast_json(client: AsyncClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "fast_json_responses", True)
+
+    response = await client.post(
+        "/api/v1/note",
+        json={"title": "Test note title", "content": "Test note description"},
+    )
+
+    assert response.status_code == 201
+    data = response.json()
+    assert data["title"] == "Test note title"
+    assert set(data) == {"id", "title", "content", "createdAt", "updatedAt"}
+
+
 @pytest.mark.asyncio
 async def test_note_get_by_id(client: AsyncClient) -> None:
     response = await client.get("/api/v1/note/1d7539f9-e9b7-4a06-9e6c-d5d6cf74d87a")
@@ -37,6 +174,261 @@ async def test_note_get_by_id(client: AsyncClient) -> None:
     assert data["content"] == "Content 2"
 
 
+@pytest.mark.asyncio
+async def test_note_get_by_id_not_modified(client: AsyncClient) -> None:
+    response = await client.get("/api/v1/note/1d7539f9-e9b7-4a06-9e6c-d5d6cf74d87a")
+    etag = response.headers["etag"]
+
+    response = await client.get(
+        "/api/v1/note/1d7539f9-e9b7-4a06-9e6c-d5d6cf74d87a",
+        headers={"If-None-Match": etag},
+    )
+
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+    # the 304 names the current version, not whatever the client listed
+    response = await client.get(
+        "/api/v1/note/1d7539f9-e9b7-4a06-9e6c-d5d6cf74d87a",
+        headers={"If-None-Match": f'"stale", W/{etag}'},
+    )
+
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+
+@pytest.mark.asyncio
+async def test_note_listing_not_modified(client: AsyncClient) -> None:
+    response = await client.get("/api/v1/note")
+    etag = response.headers["etag"]
+
+    response = await client.get("/api/v1/note", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    await client.delete("/api/v1/note/1d7539f9-e9b7-4a06-9e6c-d5d6cf74d87a")
+
+    response = await client.get("/api/v1/note", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_note_update_if_match(client: AsyncClient) -> None:
+    response = await client.get("/api/v1/note/1d7539f9-e9b7-4a06-9e6c-d5d6cf74d87a")
+    etag = response.headers["etag"]
+
+    response = await client.patch(
+        "/api/v1/note/1d7539f9-e9b7-4a06-9e6c-d5d6cf74d87a",
+        json={"title": "First writer"},
+        headers={"If-Match": etag},
+    )
+    assert response.status_code == 200
+    assert response.headers["etag"] == '"1d7539f9e9b74a069e6cd5d6cf74d87a.2"'
+
+    response = await client.patch(
+        "/api/v1/note/1d7539f9-e9b7-4a06-9e6c-d5d6cf74d87a",
+        json={"title": "Second writer"},
+        headers={"If-Match": etag},
+    )
+    assert response.status_code == 412
+
+
+@pytest.mark.asyncio
+async def test_note_if_match_any_requires_existing_note(client: AsyncClient) -> None:
+    response = await client.patch(
+        "/api/v1/note/1d7539f9-e9b7-4a06-9e6c-d5d6cf74d87a",
+        json={"title": "Any version"},
+        headers={"If-Match": "*"},
+    )
+    assert response.status_code == 200
+
+    response = await client.patch(
+        "/api/v1/note/8aba169f-f901-4d71-94e2-1251690aa0c9",
+        json={"title": "Any version"},
+        headers={"If-Match": "*"},
+    )
+    assert response.status_code == 412
+
+    response = await client.patch(
+        "/api/v1/note/8aba169f-f901-4d71-94e2-1251690aa0c9",
+        json={},
+        headers={"If-Match": "*"},
+    )
+    assert response.status_code == 412
+
+    response = await client.delete("/api/v1/note/8aba169f-f901-4d71-94e2-1251690aa0c9", headers={"If-Match": "*"})
+    assert response.status_code == 412
+
+
+@pytest.mark.asyncio
+async def test_note_deletion_if_match_mismatch(client: AsyncClient) -> None:
+    response = await client.delete(
+        "/api/v1/note/1d7539f9-e9b7-4a06-9e6c-d5d6cf74d87a",
+        headers={"If-Match": '"3282249b19ee4c5e9be2b9f714610aa6.1"'},
+    )
+
+    assert response.status_code == 412
+
+
+@pytest.mark.asyncio
+async def test_note_get_by_id_cached(client: AsyncClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "note_cache_enabled", True)
+    note_cache.clear()
+    hits = note_cache.hits
+
+    first = await client.get("/api/v1/note/1d7539f9-e9b7-4a06-9e6c-d5d6cf74d87a")
+    second = await client.get("/api/v1/note/1d7539f9-e9b7-4a06-9e6c-d5d6cf74d87a")
+
+    assert second.status_code == 200
+    assert second.content == first.content
+    assert note_cache.hits == hits + 1
+
+    await client.patch(
+        "/api/v1/note/1d7539f9-e9b7-4a06-9e6c-d5d6cf74d87a",
+        json={"title": "Test updated title"},
+    )
+    response = await client.get("/api/v1/note/1d7539f9-e9b7-4a06-9e6c-d5d6cf74d87a")
+
+    assert response.json()["title"] == "Test updated title"
+    note_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_note_get_by_id_coalesced(client: AsyncClient) -> None:
+    url = "/api/v1/note/1d7539f9-e9b7-4a06-9e6c-d5d6cf74d87a"
+    coalesced = note_flights.coalesced
+
+    responses = await asyncio.gather(*(client.get(url) for _ in range(20)))
+
+    assert {response.status_code for response in responses} == {200}
+    assert len({response.content for response in responses}) == 1
+    assert note_flights.coalesced > coalesced
+
+    coalesced = note_flights.coalesced
+    await asyncio.gather(*(client.get(url, headers={"Cache-Control": "no-cache"}) for _ in range(5)))
+
+    assert note_flights.coalesced == coalesced
+
+
+@pytest.mark.asyncio
+async def test_note_get_by_id_precompressed(client: AsyncClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "note_cache_enabled", True)
+    note_cache.clear()
+    created = await client.post("/api/v1/note", json={"title": "Large note", "content": "lorem ipsum " * 1000})
+    note_id = uuid.UUID(created.json()["id"])
+
+    response = await client.get(f"/api/v1/note/{note_id}", headers={"Accept-Encoding": "gzip"})
+    cached = note_cache.get(note_id)
+
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.headers["ETag"] == f'"{note_id.hex}.1-gzip"'
+    assert response.json()["content"] == "lorem ipsum " * 1000
+    assert cached is not None
+    assert int(response.headers["Content-Length"]) == len(cached.encoded["gzip"]) < len(cached.body)
+
+    response = await client.get(f"/api/v1/note/{note_id}", headers={"Accept-Encoding": "identity"})
+
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["ETag"] == f'"{note_id.hex}.1"'
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.content == cached.body
+
+    response = await client.get(
+        f"/api/v1/note/{note_id}", headers={"Accept-Encoding": "gzip", "If-None-Match": f'"{note_id.hex}.1-gzip"'}
+    )
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == f'"{note_id.hex}.1-gzip"'
+    note_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_note_export_compressed_while_streaming(client: AsyncClient) -> None:
+    response = await client.get("/api/v1/note/export", headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in response.headers
+    assert len(response.text.splitlines()) == 3
+
+
+@pytest.mark.asyncio
+async def test_note_creation_write_behind(client: AsyncClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "write_behind_enabled", True)
+    monkeypatch.setattr(settings, "write_behind_respond_async", True)
+    monkeypatch.setattr(settings, "database_replica_urls", ["postgresql+asyncpg://replica@127.0.0.1:1/replica"])
+    note_create_queue.start()
+    batches = note_create_queue.batches
+
+    try:
+        created = await asyncio.gather(
+            *(client.post("/api/v1/note", json={"title": f"Queued {i}", "content": None}) for i in range(20))
+        )
+        accepted = await client.post(
+            "/api/v1/note", json={"title": "Accepted", "content": None}, headers={"Prefer": "respond-async"}
+        )
+
+    finally:
+        await note_create_queue.stop()
+
+    assert {response.status_code for response in created} == {201}
+    assert note_create_queue.batches - batches < 20
+    assert accepted.status_code == 202
+    assert accepted.headers["Location"] == f"/api/v1/note/{accepted.json()['id']}"
+    assert LAST_WRITE_HEADER in accepted.headers
+    assert accepted.cookies[LAST_WRITE_COOKIE] == accepted.headers[LAST_WRITE_HEADER]
+
+    response = await client.get(accepted.headers["Location"])
+
+    assert response.status_code == 200
+    assert response.json()["title"] == "Accepted"
+
+
+@pytest.mark.asyncio
+async def test_write_behind_batch_is_safe_to_retry(client: AsyncClient) -> None:
+    rows = []
+    for title in ("First", "Second"):
+        note_id = new_note_id()
+        rows.append({"id": note_id, "optlock": 1, "title": title, "content": None, "created_at": note_id_time(note_id)})
+    service = NoteService()
+
+    written = await service.write_batch(rows[:1])
+    # the first row was committed by an attempt whose acknowledgement was lost
+    retried = await service.write_batch(rows)
+
+    assert retried[0] == written[0]
+    assert [note.title for note in retried] == ["First", "Second"]
+    response = await client.get("/api/v1/note")
+    assert [item["title"] for item in response.json()["items"]].count("First") == 1
+
+
+@pytest.mark.asyncio
+async def test_note_content_streamed_in_chunks(client: AsyncClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "content_chunk_bytes", 1000)
+    content = "naïve café ☕ " * 500
+    created = await client.post("/api/v1/note", json={"title": "Large note", "content": content})
+    url = f"/api/v1/note/{created.json()['id']}/content"
+
+    response = await client.get(url, headers={"Accept-Encoding": "identity"})
+
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "text/plain; charset=utf-8"
+    assert response.headers["Content-Length"] == str(len(content.encode()))
+    assert response.text == content
+
+    response = await client.get(url, headers={"If-None-Match": f'"other", {response.headers["ETag"]}'})
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == f'"{created.json()["id"].replace("-", "")}.1"'
+
+    response = await client.get("/api/v1/note/00000000-0000-0000-0000-000000000000/content")
+
+    assert response.status_code == 404
+
+
 @pytest.mark.asyncio
 async def test_note_creation(client: AsyncClient) -> None:
     response = await client.post(
@@ -85,6 +477,44 @@ async def test_note_update_content(client: AsyncClient) -> None:
     assert data["content"] == "Test updated content"
 
 
+@pytest.mark.asyncio
+async def test_note_update_null_title_is_ignored(client: AsyncClient) -> None:
+    response = await client.patch(
+        "/api/v1/note/1d7539f9-e9b7-4a06-9e6c-d5d6cf74d87a",
+        json={"title": None, "content": "Test updated content"},
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["title"] == "Note 2"
+    assert data["content"] == "Test updated content"
+
+
+@pytest.mark.asyncio
+async def test_note_update_empty_body_keeps_version(client: AsyncClient) -> None:
+    response = await client.get("/api/v1/note/1d7539f9-e9b7-4a06-9e6c-d5d6cf74d87a")
+    etag = response.headers["etag"]
+
+    response = await client.patch(
+        "/api/v1/note/1d7539f9-e9b7-4a06-9e6c-d5d6cf74d87a",
+        json={},
+        headers={"If-Match": etag},
+    )
+    assert response.status_code == 200
+    assert response.headers["etag"] == etag
+    assert response.json()["title"] == "Note 2"
+
+    response = await client.patch(
+        "/api/v1/note/1d7539f9-e9b7-4a06-9e6c-d5d6cf74d87a",
+        json={"title": None},
+        headers={"If-Match": '"1d7539f9e9b74a069e6cd5d6cf74d87a.7"'},
+    )
+    assert response.status_code == 412
+
+    response = await client.patch("/api/v1/note/8aba169f-f901-4d71-94e2-1251690aa0c9", json={})
+    assert response.status_code == 404
+
+
 @pytest.mark.asyncio
 async def test_note_update_does_not_exist(client: AsyncClient) -> None:
     response = await client.patch(
@@ -111,3 +541,121 @@ async def test_note_deletion_does_not_exist(client: AsyncClient) -> None:
     )
 
     assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_note_bulk_creation(client: AsyncClient) -> None:
+    response = await client.post(
+        "/api/v1/note/bulk",
+        json=[{"title": f"Bulk {i}", "content": None} for i in range(5)],
+    )
+
+    assert response.status_code == 201
+    data = response.json()
+    assert [item["title"] for item in data] == [f"Bulk {i}" for i in range(5)]
+
+    response = await client.get("/api/v1/note")
+    assert len(response.json()["items"]) == 8
+
+
+@pytest.mark.asyncio
+async def test_note_bulk_update(client: AsyncClient) -> None:
+    response = await client.patch(
+        "/api/v1/note/bulk",
+        json=[
+            {"id": "3282249b-19ee-4c5e-9be2-b9f714610aa6", "title": "Bulk title"},
+            {"id": "1d7539f9-e9b7-4a06-9e6c-d5d6cf74d87a", "content": None},
+            {"id": "e969ffd7-b4ce-47e1-8f43-8811ae576392", "title": "Stale", "version": 99},
+            {"id": "8aba169f-f901-4d71-94e2-1251690aa0c9", "title": "Does not matter"},
+        ],
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [item["status"] for item in data] == [200, 200, 409, 404]
+    assert data[0]["note"]["title"] == "Bulk title"
+    assert data[0]["note"]["content"] == "Content 1"
+    assert data[1]["note"]["title"] == "Note 2"
+    assert data[1]["note"]["content"] is None
+    assert data[2]["note"] is None
+
+
+@pytest.mark.asyncio
+async def test_note_bulk_update_without_versions(client: AsyncClient) -> None:
+    response = await client.patch(
+        "/api/v1/note/bulk",
+        json=[
+            {"id": "3282249b-19ee-4c5e-9be2-b9f714610aa6", "content": "One"},
+            {"id": "1d7539f9-e9b7-4a06-9e6c-d5d6cf74d87a", "content": "Two"},
+        ],
+    )
+
+    assert response.status_code == 200
+    assert [item["status"] for item in response.json()] == [200, 200]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "note_id",
+    [
+        # timestamp past year 9999
+        "ffffffff-ffff-7fff-bfff-ffffffffffff",
+        # 9999-12-31T23:30Z, where the clock skew window passes datetime.max
+        "e677d204-64c0-7000-8000-000000000000",
+    ],
+)
+async def test_note_ids_beyond_datetime_range_are_not_found(client: AsyncClient, note_id: str) -> None:
+    assert (await client.get(f"/api/v1/note/{note_id}")).status_code == 404
+    assert (await client.get(f"/api/v1/note/{note_id}/content")).status_code == 404
+    assert (await client.patch(f"/api/v1/note/{note_id}", json={"title": "Nope"})).status_code == 404
+    assert (await client.delete(f"/api/v1/note/{note_id}")).status_code == 404
+
+    response = await client.request("DELETE", "/api/v1/note/bulk", json=[note_id])
+
+    assert response.status_code == 200
+    assert [item["status"] for item in response.json()] == [404]
+
+
+@pytest.mark.asyncio
+async def test_note_bulk_update_duplicate_ids(client: AsyncClient) -> None:
+    response = await client.patch(
+        "/api/v1/note/bulk",
+        json=[
+            {"id": "3282249b-19ee-4c5e-9be2-b9f714610aa6", "title": "One"},
+            {"id": "3282249b-19ee-4c5e-9be2-b9f714610aa6", "title": "Two"},
+        ],
+    )
+
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_note_bulk_deletion(client: AsyncClient) -> None:
+    response = await client.request(
+        "DELETE",
+        "/api/v1/note/bulk",
+        json=["1d7539f9-e9b7-4a06-9e6c-d5d6cf74d87a", "8aba169f-f901-4d71-94e2-1251690aa0c9"],
+    )
+
+    assert response.status_code == 200
+    assert [item["status"] for item in response.json()] == [204, 404]
+
+    response = await client.get("/api/v1/note")
+    assert len(response.json()["items"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_note_changes_unavailable_without_feed(client: AsyncClient) -> None:
+    response = await client.get("/api/v1/note/changes")
+
+    assert response.status_code == 503
+
+
+def test_note_changes_websocket_refused_without_feed() -> None:
+    with (
+        TestClient(app).websocket_connect("/api/v1/note/changes/ws") as websocket,
+        pytest.raises(WebSocketDisconnect) as exc_info,
+    ):
+        websocket.receive_text()
+
+    assert exc_info.value.code == 4503
@@ -5,3 +5,14 @@ def test_ping(client: TestClient) -> None:
     response = client.get("/api/ping")
     assert response.status_code == 200
     assert response.text == "pong\n"
+
+
+def test_request_id_is_echoed(client: TestClient) -> None:
+    response = client.get("/api/ping", headers={"X-Request-ID": "req-42"})
+    assert response.headers["X-Request-ID"] == "req-42"
+
+
+def test_invalid_request_id_is_replaced(client: TestClient) -> None:
+    response = client.get("/api/ping", headers={"X-Request-ID": "bad id!"})
+    assert response.headers["X-Request-ID"] != "bad id!"
+    assert len(response.headers["X-Request-ID"]) == 32
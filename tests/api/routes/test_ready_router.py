@@ -0,0 +1,49 @@
+from collections.abc import AsyncGenerator
+
+import pytest
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient
+
+from app.core.lifecycle import lifecycle
+from app.main import app
+
+
+@pytest_asyncio.fixture
+async def client() -> AsyncGenerator[AsyncClient]:
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        yield c
+
+
+@pytest.mark.asyncio
+async def test_ready(client: AsyncClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(lifecycle, "started", True)
+
+    response = await client.get("/api/ready")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "ready"
+    assert data["database"] == "ok"
+    assert "db_pool_in_use" in data["pool"]
+    # the migration creates partitions for the months after the current one
+    assert data["partition_runway_days"] > 28
+
+
+@pytest.mark.asyncio
+async def test_not_ready_before_startup(client: AsyncClient) -> None:
+    response = await client.get("/api/ready")
+
+    assert response.status_code == 503
+    assert response.json()["status"] == "unavailable"
+
+
+@pytest.mark.asyncio
+async def test_not_ready_while_draining(client: AsyncClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(lifecycle, "started", True)
+    monkeypatch.setattr(lifecycle, "draining", True)
+
+    response = await client.get("/api/ready")
+
+    assert response.status_code == 503
+    assert response.json()["draining"] is True
@@ -16,7 +16,7 @@ from sqlalchemy.ext.asyncio import (
 )
 from testcontainers.postgres import PostgresContainer
 
-from app.core.db import get_db
+from app.core.db import get_db, get_read_db
 from app.core.settings import settings
 from app.main import app
 from app.models.note_model import Note
@@ -73,6 +73,7 @@ async def override_get_db(
             yield session
 
     app.dependency_overrides[get_db] = _get_db
+    app.dependency_overrides[get_read_db] = _get_db
     yield
     app.dependency_overrides.clear()
 
@@ -0,0 +1,92 @@
+from typing import Any
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.admission import ConcurrencyLimiter, InMemoryRateLimiter, RedisRateLimiter
+from app.core.db import pool_stats
+from app.core.middleware import AdmissionMiddleware
+from app.core.settings import settings
+
+
+def test_token_bucket_allows_burst_then_refills() -> None:
+    limiter = InMemoryRateLimiter(max_keys=10)
+
+    assert [limiter.take("client", 2.0, 3.0, 100.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.take("client", 2.0, 3.0, 100.0) == pytest.approx(0.5)
+    assert limiter.take("other", 2.0, 3.0, 100.0) == 0.0
+    assert limiter.take("client", 2.0, 3.0, 100.5) == 0.0
+
+
+class FailingRedis:
+    async def eval(self, *args: Any) -> str:
+        raise ConnectionError("redis is down")
+
+
+@pytest.mark.asyncio
+async def test_shared_limiter_falls_back_to_process_buckets() -> None:
+    limiter = RedisRateLimiter(FailingRedis(), InMemoryRateLimiter(max_keys=10))
+
+    assert await limiter.acquire("client", 1.0, 1.0) == 0.0
+    assert await limiter.acquire("client", 1.0, 1.0) > 0
+
+
+def test_admission_rate_limits_and_caps_concurrency(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "rate_limit_per_second", 1.0)
+    monkeypatch.setattr(settings, "rate_limit_burst_seconds", 2.0)
+    monkeypatch.setattr(settings, "rate_limit_routes", {"GET /slow": 100.0})
+    monkeypatch.setattr(settings, "concurrency_limits", {"GET /slow": 1})
+    monkeypatch.setattr(settings, "shed_pool_wait_seconds", None)
+
+    application = FastAPI()
+    concurrency = ConcurrencyLimiter()
+
+    @application.get("/work")
+    async def work() -> dict[str, str]:
+        return {"status": "ok"}
+
+    @application.get("/slow")
+    async def slow() -> dict[str, bool]:
+        return {"slot_held": not concurrency.try_acquire("GET /slow", 1)}
+
+    application.add_middleware(AdmissionMiddleware, limiter=InMemoryRateLimiter(10), concurrency=concurrency)
+    client = TestClient(application)
+
+    assert [client.get("/work").status_code for _ in range(2)] == [200, 200]
+    response = client.get("/work")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+    # another API key has its own bucket
+    assert client.get("/work", headers={"X-API-Key": "other"}).status_code == 200
+
+    assert client.get("/slow").json() == {"slot_held": True}
+    # a request still in flight leaves no room for another
+    concurrency.try_acquire("GET /slow", 1)
+    response = client.get("/slow")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_admission_sheds_load_while_pool_waits_are_high(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "rate_limit_per_second", None)
+    monkeypatch.setattr(settings, "shed_pool_wait_seconds", 0.5)
+    monkeypatch.setattr(pool_stats, "recent_wait", lambda now: 2.0)
+
+    application = FastAPI()
+
+    @application.get("/work")
+    async def work() -> dict[str, str]:
+        return {"status": "ok"}
+
+    @application.get("/api/ping")
+    async def ping() -> dict[str, str]:
+        return {"status": "ok"}
+
+    application.add_middleware(AdmissionMiddleware)
+    client = TestClient(application)
+
+    response = client.get("/work")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "2"
+    assert client.get("/api/ping").status_code == 200
@@ -0,0 +1,117 @@
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core import notify
+from app.core.cache import CacheInvalidationListener, LRUCache
+from app.core.notify import notify_listener
+from app.core.singleflight import SingleFlight
+
+
+def test_cache_evicts_least_recently_used() -> None:
+    cache = LRUCache(max_entries=2, max_bytes=1024, ttl_seconds=60, sizeof=len)
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    assert cache.get("a") == b"1"
+
+    cache.set("c", b"3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1"
+    assert cache.get("c") == b"3"
+    assert cache.evictions == 1
+
+
+def test_cache_evicts_over_byte_budget() -> None:
+    cache = LRUCache(max_entries=10, max_bytes=8, ttl_seconds=60, sizeof=len)
+    cache.set("a", b"12345")
+    cache.set("b", b"12345")
+
+    assert len(cache) == 1
+    assert cache.get("b") == b"12345"
+
+
+def test_cache_expires_entries() -> None:
+    cache = LRUCache(max_entries=10, max_bytes=1024, ttl_seconds=0, sizeof=len)
+    cache.set("a", b"1")
+
+    assert cache.get("a") is None
+    assert cache.misses == 1
+
+
+def test_cache_drops_fill_that_raced_invalidation() -> None:
+    cache = LRUCache(max_entries=10, max_bytes=1024, ttl_seconds=60, sizeof=len)
+    generation = cache.generation
+    cache.invalidate(["a"])
+    cache.set("a", b"stale", generation)
+
+    assert cache.get("a") is None
+
+
+@pytest.mark.asyncio
+async def test_cache_listener_applies_notifications(async_session_maker: async_sessionmaker[AsyncSession]) -> None:
+    note_id = uuid.uuid4()
+    cache = LRUCache(max_entries=10, max_bytes=1024, ttl_seconds=60, sizeof=len)
+    cache.set(note_id, b"{}")
+    listener = CacheInvalidationListener(cache, "note_cache_test")
+    await listener.start()
+
+    try:
+        async with async_session_maker() as session:
+            await session.execute(text(f"NOTIFY note_cache_test, '{note_id}'"))
+            await session.commit()
+
+        for _ in range(50):
+            if cache.get(note_id) is None:
+                break
+            await asyncio.sleep(0.01)
+
+        assert cache.get(note_id) is None
+
+    finally:
+        await listener.stop()
+
+
+@pytest.mark.asyncio
+async def test_cache_listener_reconnects_and_clears_cache(
+    async_session_maker: async_sessionmaker[AsyncSession], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(notify, "RECONNECT_DELAY_SECONDS", 0.01)
+    cache = LRUCache(max_entries=10, max_bytes=1024, ttl_seconds=60, sizeof=len)
+    flights = SingleFlight()
+    listener = CacheInvalidationListener(cache, "note_cache_test", (flights,))
+    await listener.start()
+
+    try:
+        assert notify_listener._connection is not None
+        pid = notify_listener._connection.get_server_pid()
+        cache.set("stale", b"{}")
+        async with async_session_maker() as session:
+            await session.execute(text("SELECT pg_terminate_backend(:pid)"), {"pid": pid})
+
+        for _ in range(200):
+            if notify_listener._connection is not None and notify_listener._connection.get_server_pid() != pid:
+                break
+            await asyncio.sleep(0.01)
+
+        assert cache.get("stale") is None
+        assert notify_listener._connection is not None
+
+        note_id = uuid.uuid4()
+        cache.set(note_id, b"{}")
+        async with async_session_maker() as session:
+            await session.execute(text(f"NOTIFY note_cache_test, '{note_id}'"))
+            await session.commit()
+
+        for _ in range(50):
+            if cache.get(note_id) is None:
+                break
+            await asyncio.sleep(0.01)
+
+        assert cache.get(note_id) is None
+
+    finally:
+        await listener.stop()
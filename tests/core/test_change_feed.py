@@ -0,0 +1,116 @@
+import asyncio
+import json
+import uuid
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.change_feed import CHANGE_FEED_CHANNEL, ChangeEvent, ChangeFeed, SubscriptionClosedError, change_feed
+from app.core.settings import settings
+from app.models.note_model import Note
+from app.service.note_service import NoteService
+
+NOTE_ID = uuid.UUID("3282249b-19ee-4c5e-9be2-b9f714610aa6")
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_is_cut_off() -> None:
+    feed = ChangeFeed(CHANGE_FEED_CHANNEL, queue_size=1)
+    slow = feed.subscribe()
+    event = ChangeEvent.from_json(json.dumps({"op": "updated", "id": str(NOTE_ID), "updatedAt": "t", "version": 1}))
+
+    feed.publish(event)
+    fast = feed.subscribe()
+    feed.publish(event)
+
+    assert await fast.get(timeout=1) == event
+    with pytest.raises(SubscriptionClosedError, match="overflow"):
+        await slow.get(timeout=1)
+    assert feed.metrics()["change_feed_overflows_total"] == 1
+    assert event.sse.startswith(b"id: t\nevent: updated\ndata: {")
+
+
+@pytest.mark.asyncio
+async def test_feed_publishes_trigger_notifications(async_session_maker: async_sessionmaker[AsyncSession]) -> None:
+    feed = ChangeFeed(CHANGE_FEED_CHANNEL, queue_size=10)
+    await feed.start()
+    subscription = feed.subscribe()
+
+    try:
+        async with async_session_maker() as session:
+            await session.execute(
+                update(Note).where(Note.id == NOTE_ID).values(title="changed", optlock=Note.optlock + 1)
+            )
+            await session.commit()
+
+        event = await subscription.get(timeout=5)
+
+        assert event is not None
+        change = json.loads(event.data)
+        assert change["op"] == "updated"
+        assert change["id"] == str(NOTE_ID)
+        assert change["version"] == 2
+
+    finally:
+        await feed.stop()
+
+
+@pytest.mark.asyncio
+async def test_note_changes_replays_updates_and_deletes(
+    async_session_maker: async_sessionmaker[AsyncSession], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # no margin, so the notes seeded just before are not replayed
+    monkeypatch.setattr(settings, "change_feed_replay_margin_seconds", 0.0)
+    since = datetime.now(UTC)
+    async with async_session_maker() as session:
+        await session.execute(delete(Note).where(Note.id == NOTE_ID))
+        await session.commit()
+
+    await change_feed.start()
+    try:
+        async with async_session_maker() as session:
+            with pytest.raises(HTTPException) as exc_info:
+                NoteService().note_changes(session, since - timedelta(days=30))
+            assert exc_info.value.status_code == 410
+
+            changes = NoteService().note_changes(session, since)
+            event = await anext(changes)
+            await changes.aclose()
+
+        assert event is not None
+        assert json.loads(event.data)["op"] == "deleted"
+        assert json.loads(event.data)["id"] == str(NOTE_ID)
+
+    finally:
+        await change_feed.stop()
+
+
+@pytest.mark.asyncio
+async def test_note_changes_replay_covers_transactions_committed_late(
+    async_session_maker: async_sessionmaker[AsyncSession], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "change_feed_replay_margin_seconds", 60.0)
+    monkeypatch.setattr(settings, "change_feed_heartbeat_seconds", 0.05)
+    async with async_session_maker() as slow, async_session_maker() as session:
+        # stamped with its transaction's start time, before the resume point, but committed after it
+        await slow.execute(update(Note).where(Note.id == NOTE_ID).values(title="Late", optlock=Note.optlock + 1))
+        await asyncio.sleep(0.01)
+        since = datetime.now(UTC)
+        await slow.commit()
+
+        await change_feed.start()
+        try:
+            changes = NoteService().note_changes(session, since)
+            replayed = []
+            # replay ends with the first heartbeat
+            while (event := await anext(changes)) is not None:
+                replayed.append(json.loads(event.data))
+            await changes.aclose()
+
+        finally:
+            await change_feed.stop()
+
+    assert {"id": str(NOTE_ID), "version": 2}.items() <= replayed[-1].items()
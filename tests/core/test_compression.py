@@ -0,0 +1,92 @@
+import gzip
+
+import pytest
+from starlette.types import Message, Receive, Scope, Send
+
+from app.core.compression import available_encodings, negotiate
+from app.core.etag import etag_matches, parse_etags
+from app.core.middleware import CompressionMiddleware
+
+
+def test_negotiate_honours_client_qvalues_and_server_preference() -> None:
+    assert negotiate(None) is None
+    assert negotiate("identity") is None
+    assert negotiate("gzip;q=0") is None
+    assert negotiate("gzip, deflate") == "gzip"
+    assert negotiate("*") == available_encodings[0]
+    assert negotiate("*, gzip;q=0") != "gzip"
+    assert negotiate("gzip, *;q=0.5") == "gzip"
+
+
+async def _run(
+    body: bytes,
+    content_type: bytes,
+    accept_encoding: bytes = b"gzip",
+    status: int = 200,
+    request_headers: list[tuple[bytes, bytes]] | None = None,
+) -> list[Message]:
+    async def app(scope: Scope, receive: Receive, send: Send) -> None:
+        headers = [(b"content-type", content_type), (b"etag", b'"abc.1"')]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    sent: list[Message] = []
+
+    async def send(message: Message) -> None:
+        sent.append(message)
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b""}
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", accept_encoding), *(request_headers or [])]}
+    await CompressionMiddleware(app)(scope, receive, send)
+    return sent
+
+
+@pytest.mark.asyncio
+async def test_compresses_only_large_compressible_bodies() -> None:
+    large = b'{"content": "' + b"x" * 4096 + b'"}'
+
+    start, body = await _run(large, b"application/json")
+    headers = dict(start["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert int(headers[b"content-length"]) == len(body["body"])
+    assert gzip.decompress(body["body"]) == large
+
+    start, body = await _run(b"{}", b"application/json")
+    assert b"content-encoding" not in dict(start["headers"])
+    assert body["body"] == b"{}"
+
+    start, body = await _run(large, b"text/event-stream")
+    assert b"content-encoding" not in dict(start["headers"])
+
+
+@pytest.mark.asyncio
+async def test_compressed_representations_get_their_own_etag() -> None:
+    large = b'{"content": "' + b"x" * 4096 + b'"}'
+
+    start, _ = await _run(large, b"application/json")
+    headers = dict(start["headers"])
+    assert headers[b"etag"] == b'"abc.1-gzip"'
+    assert headers[b"vary"] == b"Accept-Encoding"
+
+    # sent as is, but still negotiated
+    for accept_encoding in (b"gzip", b"identity"):
+        start, _ = await _run(b"{}", b"application/json", accept_encoding)
+        headers = dict(start["headers"])
+        assert headers[b"etag"] == b'"abc.1"'
+        assert headers[b"vary"] == b"Accept-Encoding"
+
+    # a 304 keeps the tag of the representation the client holds
+    for held, expected in ((b'"abc.1-gzip"', b'"abc.1-gzip"'), (b'"abc.1"', b'"abc.1"')):
+        start, _ = await _run(b"", b"application/json", status=304, request_headers=[(b"if-none-match", held)])
+        headers = dict(start["headers"])
+        assert headers[b"etag"] == expected
+        assert headers[b"vary"] == b"Accept-Encoding"
+
+
+def test_etags_match_across_encodings() -> None:
+    assert etag_matches('"abc.1-gzip"', '"abc.1"')
+    assert etag_matches('W/"abc.1-zstd", "other"', '"abc.1"')
+    assert not etag_matches('"abc.2-gzip"', '"abc.1"')
+    assert parse_etags('"abc.1-gzip", "a-b"') == [(False, "abc.1"), (False, "a-b")]
@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from starlette.types import Message
+
+from app.core.db import apply_deadline
+from app.core.middleware import DeadlineMiddleware
+from app.core.settings import settings
+
+
+@pytest.mark.asyncio
+async def test_session_deadline_cancels_queries(async_session_maker: async_sessionmaker[AsyncSession]) -> None:
+    async with async_session_maker() as session:
+        apply_deadline(session, time.monotonic() + 0.2)
+        with pytest.raises(DBAPIError) as exc_info:
+            await session.execute(text("SELECT pg_sleep(5)"))
+
+    assert getattr(exc_info.value.orig, "sqlstate", None) == "57014"
+
+    # the timeout was local to that transaction
+    async with async_session_maker() as session:
+        assert (await session.execute(text("SHOW statement_timeout"))).scalar() == "0"
+
+
+def test_request_past_deadline_gets_504(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "request_deadline_seconds", 5.0)
+    monkeypatch.setattr(settings, "route_deadlines", {"GET /slow": 0.05})
+
+    application = FastAPI()
+
+    @application.get("/slow")
+    async def slow() -> dict[str, str]:
+        await asyncio.sleep(5)
+        return {"status": "ok"}
+
+    application.add_middleware(DeadlineMiddleware)
+    client = TestClient(application)
+
+    response = client.get("/slow")
+
+    assert response.status_code == 504
+    assert response.json() == {"detail": "Request deadline exceeded"}
+
+
+def test_write_past_deadline_is_not_cancelled(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "request_deadline_seconds", 0.05)
+
+    application = FastAPI()
+
+    @application.patch("/slow")
+    async def slow() -> dict[str, str]:
+        await asyncio.sleep(0.2)
+        return {"status": "ok"}
+
+    application.add_middleware(DeadlineMiddleware)
+    client = TestClient(application)
+
+    response = client.patch("/slow")
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(("method", "cancels"), [("GET", True), ("POST", False)])
+async def test_client_disconnect_cancels_reads_only(
+    monkeypatch: pytest.MonkeyPatch, method: str, cancels: bool
+) -> None:
+    monkeypatch.setattr(settings, "request_deadline_seconds", None)
+    monkeypatch.setattr(settings, "request_cancel_on_disconnect", True)
+    cancelled = asyncio.Event()
+
+    application = FastAPI()
+
+    @application.api_route("/slow", methods=["GET", "POST"])
+    async def slow() -> None:
+        try:
+            await asyncio.sleep(0.3)
+
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    application.add_middleware(DeadlineMiddleware)
+    messages = [{"type": "http.request", "body": b"", "more_body": False}, {"type": "http.disconnect"}]
+    sent: list[Message] = []
+
+    async def receive() -> Message:
+        if len(messages) == 1:
+            await asyncio.sleep(0.05)
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message: Message) -> None:
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": "/slow",
+        "raw_path": b"/slow",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [],
+        "server": ("test", 80),
+        "client": ("127.0.0.1", 1234),
+    }
+    await asyncio.wait_for(application(scope, receive, send), 1)
+
+    assert cancelled.is_set() is cancels
+    assert (sent == []) is cancels
@@ -0,0 +1,62 @@
+import json
+import logging
+import queue
+import sys
+
+from app.core.log import BoundedQueueHandler, JsonFormatter, RequestIdFilter, request_id_var
+
+
+def _record(message: str) -> logging.LogRecord:
+    return logging.LogRecord("test", logging.INFO, __file__, 1, message, None, None)
+
+
+def test_queue_handler_drops_and_counts_when_full() -> None:
+    log_queue: queue.Queue[logging.LogRecord] = queue.Queue(maxsize=1)
+    handler = BoundedQueueHandler(log_queue, policy="drop")
+
+    handler.handle(_record("first"))
+    handler.handle(_record("second"))
+
+    assert log_queue.qsize() == 1
+    assert log_queue.get_nowait().getMessage() == "first"
+    assert handler.dropped == 1
+
+
+def test_queue_handler_formats_records_eagerly() -> None:
+    log_queue: queue.Queue[logging.LogRecord] = queue.Queue()
+    handler = BoundedQueueHandler(log_queue, policy="block")
+    items = ["a"]
+    record = _record("items: %s")
+    record.args = (items,)
+    try:
+        raise ValueError("boom")
+
+    except ValueError:
+        record.exc_info = sys.exc_info()
+
+    handler.handle(record)
+    items.append("b")
+    queued = log_queue.get_nowait()
+
+    assert queued.getMessage() == "items: ['a']"
+    assert queued.args is None
+    assert queued.exc_info is None
+    assert "ValueError: boom" in json.loads(JsonFormatter().format(queued))["exc_info"]
+    assert "ValueError: boom" in logging.Formatter().format(queued)
+
+
+def test_json_formatter_includes_request_id() -> None:
+    record = _record("hello %s")
+    record.args = ("world",)
+    token = request_id_var.set("abc123")
+    try:
+        RequestIdFilter().filter(record)
+
+    finally:
+        request_id_var.reset(token)
+
+    payload = json.loads(JsonFormatter().format(record))
+
+    assert payload["message"] == "hello world"
+    assert payload["request_id"] == "abc123"
+    assert payload["level"] == "INFO"
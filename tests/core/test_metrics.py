@@ -0,0 +1,81 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.db import instrument_engine
+from app.core.metrics import MetricsRegistry, MultiprocessStore, merge_snapshots, metrics, render
+
+
+def test_histogram_renders_cumulative_buckets() -> None:
+    registry = MetricsRegistry()
+    registry.histogram("latency_seconds", (0.1, 1.0))
+    registry.observe("latency_seconds", 0.05, route="/a")
+    registry.observe("latency_seconds", 0.5, route="/a")
+    registry.observe("latency_seconds", 5.0, route="/a")
+
+    text = render(registry.snapshot())
+
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1.0' in text
+    assert 'latency_seconds_bucket{route="/a",le="1.0"} 2.0' in text
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3.0' in text
+    assert 'latency_seconds_count{route="/a"} 3.0' in text
+    assert 'latency_seconds_sum{route="/a"} 5.55' in text
+
+
+def test_multiprocess_snapshots_are_summed(tmp_path: Path) -> None:
+    store = MultiprocessStore(tmp_path)
+    first = MetricsRegistry()
+    first.inc("requests_total", route="/a")
+    first.add("in_flight", 2)
+    store.write(first.snapshot())
+
+    # a worker that has exited keeps its counters but not its gauges
+    second = MetricsRegistry()
+    second.inc("requests_total", 2, route="/a")
+    second.add("in_flight", 5)
+    (tmp_path / "metrics_999999999.json").write_text(json.dumps(second.snapshot()))
+
+    merged = merge_snapshots(store.read_all())
+
+    assert merged["counters"]["requests_total"]['route="/a"'] == 3.0
+    assert merged["gauges"]["in_flight"][""] == 2.0
+    assert store.path.name == f"metrics_{os.getpid()}.json"
+    assert not (tmp_path / "metrics_999999999.json").exists()
+
+
+def test_retired_workers_are_folded_into_one_snapshot(tmp_path: Path) -> None:
+    store = MultiprocessStore(tmp_path)
+    for pid, count in ((999999998, 2), (999999999, 3)):
+        registry = MetricsRegistry()
+        registry.inc("requests_total", count)
+        registry.add("in_flight", 1)
+        (tmp_path / f"metrics_{pid}.json").write_text(json.dumps(registry.snapshot()))
+        store.retire(pid)
+
+    # a new worker reusing a retired pid starts from zero without losing the old counts
+    registry = MetricsRegistry()
+    registry.inc("requests_total")
+    (tmp_path / "metrics_999999999.json").write_text(json.dumps(registry.snapshot()))
+    store.retire(999999999)
+    store.retire(999999999)
+
+    assert sorted(path.name for path in tmp_path.glob("*.json")) == ["retired.json"]
+    merged = merge_snapshots(store.read_all())
+    assert merged["counters"]["requests_total"][""] == 6.0
+    assert merged["gauges"] == {}
+
+
+@pytest.mark.asyncio
+async def test_statements_are_timed(db_engine: AsyncEngine) -> None:
+    instrument_engine(db_engine)
+    before = metrics.snapshot()["histograms"]["db_statement_duration_seconds"]["series"].get('operation="SELECT"')
+
+    async with db_engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+
+    after = metrics.snapshot()["histograms"]["db_statement_duration_seconds"]["series"]['operation="SELECT"']
+    assert sum(after[:-1]) == (sum(before[:-1]) if before else 0) + 1
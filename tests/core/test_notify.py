@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.notify import NotifyListener
+
+
+@pytest.mark.asyncio
+async def test_channels_share_one_connection(async_session_maker: async_sessionmaker[AsyncSession]) -> None:
+    listener = NotifyListener()
+    received: list[tuple[str, str]] = []
+    await listener.listen("notify_test_a", lambda payload: received.append(("a", payload)), lambda: None)
+    connection = listener._connection
+    await listener.listen("notify_test_b", lambda payload: received.append(("b", payload)), lambda: None)
+
+    try:
+        assert listener._connection is connection
+        assert listener.listening("notify_test_a")
+        assert listener.listening("notify_test_b")
+
+        async with async_session_maker() as session:
+            await session.execute(text("NOTIFY notify_test_a, '1'"))
+            await session.execute(text("NOTIFY notify_test_b, '2'"))
+            await session.commit()
+
+        for _ in range(50):
+            if len(received) == 2:
+                break
+            await asyncio.sleep(0.01)
+
+        assert sorted(received) == [("a", "1"), ("b", "2")]
+
+        await listener.unlisten("notify_test_a")
+        assert listener._connection is connection
+        assert not listener.listening("notify_test_a")
+
+    finally:
+        await listener.unlisten("notify_test_a")
+        await listener.unlisten("notify_test_b")
+
+    assert listener._connection is None
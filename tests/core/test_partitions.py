@@ -0,0 +1,87 @@
+import uuid
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.partitions import (
+    PartitionRunway,
+    add_months,
+    create_partitions,
+    detach_partitions,
+    extend_partitions,
+    list_partitions,
+    month_start,
+)
+from app.models.note_model import Note, note_id_time
+from app.service.note_service import _by_id
+
+
+def _uuid7_at(moment: datetime) -> uuid.UUID:
+    return uuid.UUID(int=(int(moment.timestamp() * 1000) << 80) | (0x7 << 76) | (0b10 << 62))
+
+
+def test_note_id_time() -> None:
+    moment = datetime(2026, 10, 15, 12, 30, tzinfo=UTC)
+
+    assert note_id_time(_uuid7_at(moment)) == moment
+    assert note_id_time(uuid.UUID("3282249b-19ee-4c5e-9be2-b9f714610aa6")) is None
+
+
+@pytest.mark.asyncio
+async def test_create_and_detach_partitions(db_engine: AsyncEngine) -> None:
+    async with db_engine.connect() as conn:
+        transaction = await conn.begin()
+        partitions = await list_partitions(conn)
+        legacy, *monthly = partitions
+        assert legacy.name == "notes_legacy"
+        assert legacy.lower is None
+        newest = monthly[-1].upper
+        assert newest is not None
+
+        now = add_months(newest, -1)
+        assert await create_partitions(conn, months_ahead=1, now=now) == [f"notes_p{newest:%Y%m}"]
+        assert await create_partitions(conn, months_ahead=1, now=now) == []
+
+        assert await detach_partitions(conn, before=monthly[0].upper, concurrently=False) == [
+            "notes_legacy",
+            monthly[0].name,
+        ]
+        await transaction.rollback()
+
+
+@pytest.mark.asyncio
+async def test_lookup_by_id_prunes_partitions(db_engine: AsyncEngine) -> None:
+    note_id = _uuid7_at(month_start(datetime.now(UTC)).replace(day=15))
+
+    async with db_engine.connect() as conn:
+        stmt = select(Note.id).where(_by_id(note_id)).compile(compile_kwargs={"literal_binds": True})
+        plan = "\n".join((await conn.execute(text(f"EXPLAIN {stmt}"))).scalars())
+
+    assert "notes_legacy" in plan
+    assert "notes_p" not in plan
+
+
+@pytest.mark.asyncio
+async def test_extend_partitions_is_idempotent_and_extends_the_runway(db_engine: AsyncEngine) -> None:
+    runway = PartitionRunway()
+    async with db_engine.connect() as conn:
+        before = await runway.refresh(conn)
+    assert runway.until is not None and before is not None
+    now = add_months(runway.until, -1)
+
+    created = await extend_partitions(db_engine, months_ahead=1, now=now, lock_timeout_ms=1000)
+    try:
+        assert created == [f"notes_p{runway.until:%Y%m}"]
+        assert await extend_partitions(db_engine, months_ahead=1, now=now, lock_timeout_ms=1000) == []
+
+        async with db_engine.connect() as conn:
+            after = await runway.refresh(conn)
+        assert after is not None and after > before + timedelta(days=27)
+        assert runway.metrics()["db_partition_runway_seconds"] > after.total_seconds() - 60
+
+    finally:
+        async with db_engine.begin() as conn:
+            for name in created:
+                await conn.execute(text(f"DROP TABLE {name}"))
@@ -0,0 +1,90 @@
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.middleware import ProfilingMiddleware
+from app.core.profiling import StackSampler, record_timing, request_timings, server_timing, write_profile
+from app.core.settings import settings
+
+
+def _busy_wait(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_sampler_collects_collapsed_stacks(tmp_path: Path) -> None:
+    sampler = StackSampler(threading.get_ident(), 0.001)
+    sampler.start()
+    _busy_wait(0.05)
+    sampler.stop()
+
+    path = tmp_path / "profile.collapsed"
+    sampler.write(path)
+
+    assert any("_busy_wait" in line for line in path.read_text().splitlines())
+
+
+def test_record_timing_is_noop_outside_profiled_request() -> None:
+    record_timing("db", 1.0)
+    assert request_timings.get() is None
+
+    assert server_timing({"db": 0.0125, "total": 0.02}) == "db;dur=12.50, total;dur=20.00"
+
+
+def test_profiled_request_gets_server_timing(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "profiling_dir", tmp_path)
+    monkeypatch.setattr(settings, "profiling_sample_rate", 0.0)
+    monkeypatch.setattr(settings, "profiling_header_token", "secret")
+
+    application = FastAPI()
+
+    @application.get("/work")
+    async def work() -> dict[str, str]:
+        record_timing("db", 0.004)
+        return {"status": "ok"}
+
+    application.add_middleware(ProfilingMiddleware)
+    client = TestClient(application)
+
+    assert "Server-Timing" not in client.get("/work").headers
+    assert "Server-Timing" not in client.get("/work", headers={"X-Profile": "wrong"}).headers
+
+    assert "Server-Timing" not in client.get("/work", headers={"X-Profile": "sécret".encode("latin-1")}).headers
+
+    response = client.get("/work", headers={"X-Profile": "secret"})
+
+    assert response.headers["Server-Timing"].startswith("db;dur=4.00, total;dur=")
+    assert len(list(tmp_path.glob("*-work-*.collapsed"))) == 1
+
+
+def test_profiling_header_needs_a_token(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "profiling_dir", tmp_path)
+    monkeypatch.setattr(settings, "profiling_sample_rate", 0.0)
+    monkeypatch.setattr(settings, "profiling_header_token", None)
+
+    application = FastAPI()
+
+    @application.get("/work")
+    async def work() -> dict[str, str]:
+        return {"status": "ok"}
+
+    application.add_middleware(ProfilingMiddleware)
+    client = TestClient(application)
+
+    assert "Server-Timing" not in client.get("/work", headers={"X-Profile": "1"}).headers
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_write_profile_keeps_the_newest_files(tmp_path: Path) -> None:
+    for name in ("20260101T000000-a-1", "20260102T000000-a-2", "20260103T000000-a-3"):
+        (tmp_path / f"{name}.collapsed").write_text("")
+    sampler = StackSampler(threading.get_ident(), 0.001)
+
+    write_profile(sampler, tmp_path / "20260104T000000-a-4.collapsed", max_files=2)
+
+    assert sorted(path.stem for path in tmp_path.iterdir()) == ["20260103T000000-a-3", "20260104T000000-a-4"]
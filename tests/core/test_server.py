@@ -0,0 +1,34 @@
+from pathlib import Path
+
+import pytest
+
+from app import server
+from app.core.settings import settings
+from app.server import cpu_quota, worker_count
+
+
+def test_cpu_quota_cgroup_v2(tmp_path: Path) -> None:
+    (tmp_path / "cpu.max").write_text("250000 100000\n")
+    assert cpu_quota(tmp_path) == 2.5
+
+    (tmp_path / "cpu.max").write_text("max 100000\n")
+    assert cpu_quota(tmp_path) is None
+
+
+def test_cpu_quota_cgroup_v1(tmp_path: Path) -> None:
+    (tmp_path / "cpu").mkdir()
+    (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("150000\n")
+    (tmp_path / "cpu" / "cpu.cfs_period_us").write_text("100000\n")
+    assert cpu_quota(tmp_path) == 1.5
+
+    (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("-1\n")
+    assert cpu_quota(tmp_path) is None
+
+
+def test_worker_count(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(server.os, "process_cpu_count", lambda: 8)
+    monkeypatch.setattr(server, "cpu_quota", lambda: 2.5)
+    assert worker_count() == 3
+
+    monkeypatch.setattr(settings, "app_workers", 2)
+    assert worker_count() == 2
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from app.core.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_flight() -> None:
+    flights = SingleFlight()
+    calls = 0
+    release = asyncio.Event()
+
+    async def query() -> list[int]:
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return [calls]
+
+    waiters = [asyncio.create_task(flights.do("key", query)) for _ in range(10)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters)
+
+    assert calls == 1
+    assert all(result is results[0] for result in results)
+    assert flights.metrics("reads") == {"reads_leaders_total": 1, "reads_coalesced_total": 9, "reads_in_flight": 0}
+
+
+@pytest.mark.asyncio
+async def test_forget_starts_a_fresh_flight_and_errors_are_shared() -> None:
+    flights = SingleFlight()
+    release = asyncio.Event()
+    calls = 0
+
+    async def query() -> int:
+        nonlocal calls
+        calls += 1
+        call = calls
+        await release.wait()
+        raise LookupError(call)
+
+    before = [asyncio.create_task(flights.do("key", query)) for _ in range(2)]
+    await asyncio.sleep(0)
+    flights.forget(["key"])
+    after = asyncio.create_task(flights.do("key", query))
+    await asyncio.sleep(0)
+    release.set()
+
+    results = await asyncio.gather(*before, after, return_exceptions=True)
+
+    assert calls == 2
+    assert [exc.args for exc in results if isinstance(exc, LookupError)] == [(1,), (1,), (2,)]
+
+
+@pytest.mark.asyncio
+async def test_followers_take_over_when_the_leader_is_cancelled() -> None:
+    flights = SingleFlight()
+    release = asyncio.Event()
+
+    async def query() -> str:
+        await release.wait()
+        return "done"
+
+    leader = asyncio.create_task(flights.do("key", query))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(flights.do("key", query))
+    await asyncio.sleep(0)
+    leader.cancel()
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await follower == "done"
+    assert flights.leaders == 2
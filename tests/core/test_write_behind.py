@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from app.core.write_behind import QueueFullError, WriteBehindQueue
+
+
+@pytest.mark.asyncio
+async def test_items_are_written_in_batches_and_flushed_on_stop() -> None:
+    batches: list[list[int]] = []
+
+    async def write(items: list[int]) -> list[int]:
+        batches.append(items)
+        return [item * 10 for item in items]
+
+    queue = WriteBehindQueue(write, max_size=100, max_batch=4, interval_seconds=0.05)
+    queue.start()
+    futures = [await queue.submit(i, timeout=1) for i in range(10)]
+
+    assert await asyncio.gather(*futures) == [i * 10 for i in range(10)]
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+
+    pending = await queue.submit(10, timeout=1)
+    await queue.stop()
+
+    assert pending.result() == 100
+    assert queue.metrics("notes")["notes_items_total"] == 11
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_and_failed_batches_fail_every_item() -> None:
+    async def write(items: list[int]) -> list[int]:
+        raise ConnectionError("database went away")
+
+    queue = WriteBehindQueue(write, max_size=1, max_batch=10, interval_seconds=0.01)
+    first = await queue.submit(1, timeout=1)
+
+    with pytest.raises(QueueFullError):
+        await queue.submit(2, timeout=0.01)
+
+    queue.start()
+    with pytest.raises(ConnectionError):
+        await first
+    await queue.stop()
+
+    assert queue.rejected == 1
+    assert queue.failed == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_batches_are_retried_then_written_item_by_item() -> None:
+    attempts: list[list[int]] = []
+    dropped: list[int] = []
+
+    async def write(items: list[int]) -> list[int]:
+        attempts.append(items)
+        # the first attempt fails transiently, and item 3 never fits
+        if len(attempts) == 1 or 3 in items:
+            raise ValueError("rejected")
+        return [item * 10 for item in items]
+
+    queue = WriteBehindQueue(
+        write,
+        max_size=10,
+        max_batch=10,
+        interval_seconds=0.01,
+        retries=1,
+        retry_delay_seconds=0.001,
+        on_failure=lambda item, exc: dropped.append(item),
+    )
+    futures = [await queue.submit(i, timeout=1) for i in range(1, 5)]
+    queue.start()
+    results = await asyncio.gather(*futures, return_exceptions=True)
+    await queue.stop()
+
+    assert results[:2] == [10, 20] and results[3] == 40
+    assert isinstance(results[2], ValueError)
+    assert dropped == [3]
+    assert attempts[:2] == [[1, 2, 3, 4]] * 2
+    assert queue.retried == 1
+    assert queue.failed == 1
+    assert queue.items == 3
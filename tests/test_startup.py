@@ -0,0 +1,20 @@
+import os
+import statistics
+
+from benchmarks.import_benchmark import sample
+
+# generous enough for shared CI runners; tighten locally with IMPORT_TIME_BUDGET_MS
+IMPORT_TIME_BUDGET_MS = float(os.environ.get("IMPORT_TIME_BUDGET_MS", "2500"))
+
+# loaded on first use, not when the app is imported
+DEFERRED_MODULES = ["asyncpg", "uvicorn", "app.server"]
+
+
+def test_import_time_within_budget() -> None:
+    samples = [sample("app.main") for _ in range(3)]
+
+    median_ms = statistics.median(s.total_us for s in samples) / 1000
+    assert median_ms < IMPORT_TIME_BUDGET_MS
+
+    for module in DEFERRED_MODULES:
+        assert module not in samples[-1].modules